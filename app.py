@@ -5,6 +5,9 @@ from extensions import mail, db
 from routes.auth_routes import auth_routes
 from routes.goals_routes import goals_routes
 from routes.ai_routes import ai_routes
+from cli import register_commands
+from utils.identity import register_identity_loader
+from utils.email_outbox import init_email_dispatcher
 
 def create_app():
     app = Flask(__name__)
@@ -28,6 +31,8 @@ def create_app():
     db.init_app(app)
     mail.init_app(app)
     jwt = JWTManager(app)
+    # current_user — Identity: id из токена без запроса к БД, учётная запись из кэша по требованию
+    register_identity_loader(jwt)
     @jwt.expired_token_loader
 
     def my_expired_token_callback(jwt_header, jwt_payload):
@@ -35,15 +40,22 @@ def create_app():
         "message": "Token has expired"
    	 }), 401
 
-    # Создание таблиц
-    with app.app_context():
-        db.create_all()
+    # Создание таблиц (только для разработки, схема в продакшене — через `flask db-upgrade`)
+    if settings.DB_AUTO_CREATE:
+        with app.app_context():
+            db.create_all()
 
     # Регистрация маршрутов
     app.register_blueprint(auth_routes, url_prefix='/auth')
     app.register_blueprint(goals_routes, url_prefix='/api')
     app.register_blueprint(ai_routes, url_prefix='/api')
 
+    # CLI-команды (flask rebuild-day-load и т.п.)
+    register_commands(app)
+
+    # Фоновая отправка писем из email_outbox: сразу после старта, а не с первым новым письмом
+    init_email_dispatcher(app)
+
     @app.route('/')
     def home():
         return "Welcome to WhatIamToDo server!"
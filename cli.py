@@ -0,0 +1,859 @@
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+
+import click
+from flask import Flask, current_app
+from flask.cli import with_appcontext
+from flask_jwt_extended import create_access_token
+from sqlalchemy.orm import contains_eager
+
+from config.settings import EMAIL_OUTBOX_BACKOFF_SECONDS
+from extensions import db, mail
+from migrations import upgrade, migration_status
+from models.goal_model import Goal
+from models.step_model import Step
+from models.day_load_model import DayLoad
+from models.email_outbox_model import OutboxEmail
+from models.user_model import User
+from routes.ai_routes import parse_busy_period_with_llm, schedule_with_llm
+from routes.goals_routes import steps_in_range_query
+from utils.busy_phrase_corpus import BUSY_PHRASES, CORPUS_TODAY
+from utils.date_phrases import parse_busy_period
+from utils.day_load import rebuild_day_load, get_day_load, find_day_under, bump_day_loads, count_days, to_day
+from utils.email_outbox import dispatch_batch, drain_outbox, enqueue_email
+from utils.goal_counters import reconcile_goal_counters, bump_step_counters
+from utils.openai_stub import stub_completion
+from utils.query_counter import count_queries
+from utils.query_plans import hot_queries, seq_scans
+from utils import passwords
+from utils.rate_limit import rate_limiter
+from utils.identity import invalidate_identity
+from utils.reschedule_corpus import RESCHEDULE_CASES, RESCHEDULE_TODAY
+from utils.response_cache import response_cache
+from utils.scheduler import plan_range_shift, range_shift_violations
+from utils.step_import import IMPORT_STEP_TITLE, import_steps, parse_import_events, parse_event_date
+from utils import serializers
+
+
+def _timeit(fn, repeat):
+    """
+    Среднее время одного вызова fn в миллисекундах.
+    """
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) * 1000 / repeat
+
+
+def _seed_bench_user(n_steps, n_goals=10, spread_days=365):
+    """
+    Создаёт временного пользователя с n_steps шагами, раскиданными по ±spread_days от сегодня.
+    Ничего не коммитит: бенчмарки откатывают транзакцию в конце.
+    """
+    user = User(email=f"bench-{uuid.uuid4().hex}@example.invalid", name="bench")
+    user.password_hash = "!"
+    db.session.add(user)
+    db.session.flush()
+
+    goals = [Goal(user_id=user.id, title=f"Bench goal {i}") for i in range(n_goals)]
+    db.session.add_all(goals)
+    db.session.flush()
+
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    rows = [
+        {
+            "goal_id": goals[i % n_goals].id,
+            "title": f"Bench step {i}",
+            "status": "planned",
+            "date": today + timedelta(days=random.randint(-spread_days, spread_days))
+        }
+        for i in range(n_steps)
+    ]
+    if rows:
+        db.session.execute(db.insert(Step), rows)
+    rebuild_day_load(user.id)
+    return user
+
+
+@click.command('db-upgrade')
+@with_appcontext
+def db_upgrade_command():
+    """Применяет непримененные миграции схемы (migrations/versions)."""
+    applied = upgrade(echo=click.echo)
+    click.echo(f"applied {len(applied)} migrations" if applied else "schema is up to date")
+
+
+@click.command('db-status')
+@with_appcontext
+def db_status_command():
+    """Показывает применённые и ожидающие миграции."""
+    for version, description, applied_at in migration_status():
+        state = applied_at.isoformat(timespec="seconds") if applied_at else "pending"
+        click.echo(f"{version:<32} {state:<20} {description}")
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN горячих запросов; ненулевой код выхода, если какой-то из них сканирует таблицу целиком."""
+    failed = False
+    for name, statement in hot_queries().items():
+        scans = seq_scans(statement)
+        failed = failed or bool(scans)
+        click.echo(f"{'FAIL' if scans else 'ok  '} {name:<24} {'seq scan on ' + ', '.join(scans) if scans else 'no seq scan'}")
+    if failed:
+        raise click.ClickException("sequential scans in hot queries (run `flask db-upgrade`?)")
+
+
+@click.command('rebuild-day-load')
+@click.option('--user-id', type=int, default=None, help="Пересобрать только для одного пользователя.")
+@with_appcontext
+def rebuild_day_load_command(user_id):
+    """Пересобирает таблицу day_loads из steps (backfill / исправление расхождений)."""
+    written = rebuild_day_load(user_id)
+    db.session.commit()
+    click.echo(f"day_loads rebuilt: {written} day rows")
+
+
+@click.command('reconcile-goal-counters')
+@click.option('--goal-id', type=int, default=None, help="Проверить только одну цель.")
+@with_appcontext
+def reconcile_goal_counters_command(goal_id):
+    """Пересчитывает goals.total_steps/done_steps по шагам там, где счётчики разошлись."""
+    fixed = reconcile_goal_counters(goal_id)
+    db.session.commit()
+    click.echo(f"goal counters repaired: {fixed} goals")
+
+
+@click.command('bench-day-load')
+@click.option('--user-id', type=int, default=None, help="Мерить на реальном пользователе вместо сгенерированного.")
+@click.option('--steps', 'n_steps', type=int, default=5000, help="Сколько шагов сгенерировать.")
+@click.option('--repeat', type=int, default=20)
+@with_appcontext
+def bench_day_load_command(user_id, n_steps, repeat):
+    """Сравнивает полный скан шагов пользователя с запросами к day_loads."""
+    if user_id is None:
+        user_id = _seed_bench_user(n_steps).id
+
+    today = datetime.today().date()
+
+    def full_scan_load():
+        steps = Step.query.join(Goal).filter(Goal.user_id == user_id).all()
+        return Counter(s.date.date() for s in steps if s.date)
+
+    def full_scan_min_load():
+        load = full_scan_load()
+        candidate = today
+        while load.get(candidate, 0) >= 2:
+            candidate += timedelta(days=1)
+        return candidate
+
+    assert full_scan_min_load() == find_day_under(user_id, today, 2)
+
+    results = [
+        ("full scan: day load", _timeit(full_scan_load, repeat)),
+        ("day_loads: day load from today", _timeit(lambda: get_day_load(user_id, start=today), repeat)),
+        ("full scan: next day under 2", _timeit(full_scan_min_load, repeat)),
+        ("day_loads: next day under 2", _timeit(lambda: find_day_under(user_id, today, 2), repeat)),
+    ]
+    for name, ms in results:
+        click.echo(f"{name:<34} {ms:9.3f} ms")
+
+    db.session.rollback()
+
+
+@click.command('bench-steps-range')
+@click.option('--steps', 'n_steps', type=int, default=100_000, help="Сколько шагов сгенерировать пользователю.")
+@click.option('--goals', 'n_goals', type=int, default=50)
+@click.option('--days', type=int, default=31, help="Ширина окна календаря.")
+@click.option('--repeat', type=int, default=10)
+@with_appcontext
+def bench_steps_range_command(n_steps, n_goals, days, repeat):
+    """Окно календаря: выборка всех шагов с фильтром в Python против GET /api/steps (range scan)."""
+    user_id = _seed_bench_user(n_steps, n_goals=n_goals).id
+    start = datetime.today().date()
+    end = start + timedelta(days=days - 1)
+
+    def load_all_and_filter():
+        steps = db.session.execute(
+            db.select(Step.id, Step.date).join(Goal).where(Goal.user_id == user_id)
+        ).all()
+        return [s for s in steps if s.date and start <= s.date.date() <= end]
+
+    def range_query():
+        return db.session.execute(steps_in_range_query(user_id, start, end)).all()
+
+    expected = len(load_all_and_filter())
+    assert len(range_query()) == expected
+
+    click.echo(f"{n_steps} steps, {days}-day window -> {expected} steps")
+    results = [
+        ("all steps + filter in Python", _timeit(load_all_and_filter, repeat)),
+        ("range query (goal_id, date)", _timeit(range_query, repeat)),
+    ]
+    for name, ms in results:
+        click.echo(f"{name:<30} {ms:9.3f} ms")
+
+    db.session.rollback()
+
+
+@click.command('bench-serialization')
+@click.option('--steps', 'n_steps', type=int, default=10_000, help="Сколько шагов сгенерировать пользователю.")
+@click.option('--repeat', type=int, default=5)
+@with_appcontext
+def bench_serialization_command(n_steps, repeat):
+    """Стоимость одной строки шага: ORM + dict вручную, dict из Core-строк, row_serializer; json vs orjson."""
+    user_id = _seed_bench_user(n_steps).id
+
+    def orm_hand_built():
+        steps = (
+            Step.query.join(Goal)
+            .options(contains_eager(Step.goal))
+            .filter(Goal.user_id == user_id)
+            .all()
+        )
+        return [
+            {
+                "id": step.id,
+                "goal_id": step.goal.id,
+                "goal_name": step.goal.title,
+                "color": step.goal.color,
+                "title": step.title,
+                "description": step.description,
+                "status": step.status,
+                "date": step.date.isoformat() if step.date else None,
+                "created_at": step.created_at.isoformat(),
+                "updated_at": step.updated_at.isoformat()
+            }
+            for step in steps
+        ]
+
+    stmt = db.select(*[column.label(name) for name, column in serializers.STEP_FIELDS.items()]).join(
+        Goal, Step.goal_id == Goal.id
+    ).where(Goal.user_id == user_id)
+    rows = db.session.execute(stmt).all()
+
+    def core_generic():
+        return [
+            {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row._mapping.items()}
+            for row in rows
+        ]
+
+    def core_serializer():
+        return serializers.serialize_rows(stmt, rows)
+
+    body = core_serializer()
+    assert core_generic() == body
+    assert sorted(orm_hand_built(), key=lambda step: step["id"]) == sorted(body, key=lambda step: step["id"])
+
+    results = [
+        ("ORM + hand-built dicts (query incl.)", _timeit(orm_hand_built, repeat)),
+        ("Core rows -> generic dict", _timeit(core_generic, repeat)),
+        ("Core rows -> row_serializer", _timeit(core_serializer, repeat)),
+        ("json.dumps (Flask provider)", _timeit(lambda: current_app.json.dumps(body), repeat)),
+    ]
+    if serializers.orjson is not None:
+        results.append(("orjson.dumps", _timeit(lambda: serializers.orjson.dumps(body), repeat)))
+    else:
+        click.echo("orjson is not installed, skipping")
+
+    click.echo(f"{len(rows)} steps")
+    for name, ms in results:
+        click.echo(f"{name:<38} {ms:9.3f} ms  {ms * 1000 / len(rows):7.3f} us/row")
+
+    db.session.rollback()
+
+
+@click.command('bench-steps-import')
+@click.option('--events', 'n_events', type=int, default=10_000, help="Сколько событий календаря импортировать.")
+@click.option('--repeat', type=int, default=3)
+@with_appcontext
+def bench_steps_import_command(n_events, repeat):
+    """Импорт календаря: INSERT + flush на каждый шаг против кусков INSERT ... RETURNING (POST /goals/<id>/steps/bulk)."""
+    user_id = _seed_bench_user(0, n_goals=1).id
+    goal = Goal.query.filter_by(user_id=user_id).one()
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    payload = [
+        {"description": f"Event {i}", "date": (today + timedelta(days=i % 365, hours=i % 24)).isoformat()}
+        for i in range(n_events)
+    ]
+
+    def per_step_flush():
+        step_dates = []
+        for event in payload:
+            step = Step(
+                goal_id=goal.id,
+                title=IMPORT_STEP_TITLE,
+                description=event["description"],
+                date=parse_event_date(event["date"])
+            )
+            db.session.add(step)
+            db.session.flush()
+            step_dates.append(step.date)
+        bump_day_loads(user_id, count_days(step_dates))
+        bump_step_counters(goal.id, total=len(step_dates))
+
+    def batched():
+        import_steps(user_id, goal.id, parse_import_events(payload))
+
+    def measure(fn):
+        # Каждый прогон — в SAVEPOINT, чтобы следующий начинал с пустой цели
+        timings, queries_count = [], 0
+        for _ in range(repeat):
+            nested = db.session.begin_nested()
+            with count_queries() as queries:
+                timings.append(_timeit(fn, 1))
+            queries_count = queries.count
+            nested.rollback()
+            db.session.expire_all()
+        return sum(timings) / len(timings), queries_count
+
+    click.echo(f"{n_events} events")
+    for name, fn in (("INSERT + flush per step", per_step_flush), ("chunked INSERT ... RETURNING", batched)):
+        ms, queries_count = measure(fn)
+        click.echo(f"{name:<30} {ms:10.1f} ms  {queries_count:6} queries")
+
+    db.session.rollback()
+
+
+def _login_storm(app, email, password, concurrency, n_requests):
+    """
+    n_requests входов в concurrency потоков и параллельный "лёгкий" GET / в отдельном потоке.
+    Возвращает (входов в секунду, p95 задержки лёгкого запроса в мс).
+    """
+    stop = threading.Event()
+    probe_ms = []
+
+    def probe():
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.get("/")
+            probe_ms.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.005)
+
+    def login(_):
+        response = app.test_client().post("/auth/login", json={"email": email, "password": password})
+        if response.status_code != 200:
+            raise click.ClickException(f"login returned {response.status_code}")
+
+    prober = threading.Thread(target=probe, daemon=True)
+    prober.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(login, range(n_requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+
+    probe_ms.sort()
+    p95 = probe_ms[min(len(probe_ms) - 1, int(len(probe_ms) * 0.95))] if probe_ms else 0.0
+    return n_requests / elapsed, p95
+
+
+@click.command('bench-login')
+@click.option('--concurrency', default="1,4,16", help="Уровни параллельности через запятую.")
+@click.option('--requests', 'n_requests', type=int, default=64, help="Входов на каждый уровень.")
+@click.option('--workers', type=int, default=None, help="Размер пула хэширования (по умолчанию PASSWORD_HASH_WORKERS).")
+@with_appcontext
+def bench_login_command(concurrency, n_requests, workers):
+    """POST /auth/login: входов в секунду и p95 параллельного лёгкого запроса, хэш в потоке запроса против пула процессов."""
+    app = current_app._get_current_object()
+    levels = [int(level) for level in concurrency.split(",") if level.strip()]
+    workers = passwords.password_hasher.workers if workers is None else workers
+    if not workers:
+        raise click.ClickException("--workers must be positive to compare with the process pool")
+
+    email, password = f"bench-{uuid.uuid4().hex}@example.invalid", "BenchPassword1"
+    user = User(email=email, name="bench")
+    user.set_password(password)
+    db.session.add(user)
+    db.session.commit()
+    user_id = user.id
+
+    default_hasher = passwords.password_hasher
+    # Бенчмарк входит одним адресом с одного IP — лимит входов выключаем
+    default_limiter_backend, rate_limiter.backend = rate_limiter.backend, None
+    try:
+        for mode, pool_workers in (("inline", 0), (f"pool x{workers}", workers)):
+            passwords.password_hasher = passwords.PasswordHasher(pool_workers, max(levels) * 2, 30)
+            try:
+                _login_storm(app, email, password, 1, 2)  # прогрев: запуск процессов пула
+                for level in levels:
+                    rate, p95 = _login_storm(app, email, password, level, n_requests)
+                    click.echo(f"{mode:<10} concurrency {level:<3} {rate:8.1f} logins/s   GET / p95 {p95:8.2f} ms")
+            finally:
+                passwords.password_hasher.shutdown()
+    finally:
+        passwords.password_hasher = default_hasher
+        rate_limiter.backend = default_limiter_backend
+        _delete_user_data(user_id)
+
+
+def _eval_parser(parse, expected_for_unparsed):
+    """
+    Прогоняет корпус через parse и возвращает (кол-во верных, кол-во распознанных, времена в мс).
+    """
+    correct, handled, timings = 0, 0, []
+    for phrase, start, end in BUSY_PHRASES:
+        started = time.perf_counter()
+        result = parse(phrase)
+        timings.append((time.perf_counter() - started) * 1000)
+        expected = (start, end) if start else expected_for_unparsed
+        if result is not None:
+            handled += 1
+        if result == expected:
+            correct += 1
+    return correct, handled, sorted(timings)
+
+
+def _echo_parser_stats(name, correct, handled, timings):
+    total = len(BUSY_PHRASES)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    click.echo(
+        f"{name:<6} accuracy {correct}/{total} ({correct * 100 / total:.1f}%), "
+        f"handled {handled}/{total}, "
+        f"mean {sum(timings) / total:.3f} ms, p95 {p95:.3f} ms"
+    )
+
+
+@click.command('eval-busy-parser')
+@click.option('--with-llm', is_flag=True, help="Прогнать корпус и через GPT (реальные платные запросы).")
+@with_appcontext
+def eval_busy_parser_command(with_llm):
+    """Точность и время разбора периода занятости на размеченном корпусе фраз."""
+    local = _eval_parser(lambda phrase: parse_busy_period(phrase, CORPUS_TODAY), None)
+    _echo_parser_stats("local", *local)
+
+    if not with_llm:
+        return
+
+    tomorrow = CORPUS_TODAY + timedelta(days=1)
+    llm = _eval_parser(
+        lambda phrase: parse_busy_period_with_llm(phrase, CORPUS_TODAY),
+        (tomorrow, tomorrow)
+    )
+    _echo_parser_stats("llm", *llm)
+
+
+# Задача в том виде, в каком её ждёт schedule_with_llm (id, title, date)
+_CorpusTask = namedtuple("_CorpusTask", "id title date")
+
+
+def _planned_dates(updates):
+    return {int(u["task_id"]): date.fromisoformat(u["new_date"]) for u in updates}
+
+
+def _check_plan(pairs, updates, busy_start, busy_end, expected):
+    """
+    Сверяет план переноса с ожидаемыми датами корпуса (задачи не из плана остаются на месте).
+    Возвращает описание расхождений или пустую строку.
+    """
+    problems = range_shift_violations(pairs, updates, busy_start, busy_end)
+    if problems:
+        return "; ".join(problems)
+    current = {task_id: to_day(day) for task_id, day in pairs}
+    planned = {task_id: day for task_id, day in _planned_dates(updates).items() if current.get(task_id) != day}
+    return "" if planned == expected else "dates differ from expected"
+
+
+@click.command('eval-reschedule')
+@click.option('--with-llm', is_flag=True, help="Прогнать корпус и через GPT (реальные платные запросы).")
+@with_appcontext
+def eval_reschedule_command(with_llm):
+    """Прогоняет корпус переносов диапазона через plan_range_shift и сверяет с размеченными датами.
+
+    С --with-llm те же случаи уходят в schedule_with_llm через настоящий клиент OpenAI;
+    его ответы сверяются с разметкой там, где она есть, и всегда — с range_shift_violations.
+    Завершается с ненулевым кодом, если хоть один случай не прошёл.
+    """
+    failed = False
+    for name, tasks, busy_start, busy_end, expected in RESCHEDULE_CASES:
+        corpus_tasks = [
+            _CorpusTask(task_id, f"Задача {task_id}", datetime.combine(day, datetime.min.time()))
+            for task_id, day in tasks
+        ]
+        pairs = [(task.id, task.date) for task in corpus_tasks]
+
+        local = plan_range_shift(pairs, busy_start, busy_end)
+        if expected is None:
+            local_ok, local_result = local is None, "gpt" if local is None else "planned, expected gpt"
+        elif local is None:
+            local_ok, local_result = False, "gpt, expected plan"
+        else:
+            problems = _check_plan(pairs, local, busy_start, busy_end, expected)
+            local_ok, local_result = not problems, problems or "plan"
+        line = f"     local: {local_result}"
+
+        # GPT-путь — как в /ai/reschedule: только режим диапазона и задачи с начала периода
+        in_range = [task for task in corpus_tasks if task.date.date() >= busy_start]
+        llm_ok = True
+        if with_llm and busy_end > busy_start and in_range:
+            updates, error = schedule_with_llm(RESCHEDULE_TODAY, in_range, busy_start, busy_end, False)
+            if error:
+                llm_ok, llm_result = False, "request failed"
+            else:
+                in_range_pairs = [(task.id, task.date) for task in in_range]
+                if expected is None:
+                    problems = "; ".join(range_shift_violations(in_range_pairs, updates, busy_start, busy_end))
+                else:
+                    problems = _check_plan(in_range_pairs, updates, busy_start, busy_end, expected)
+                llm_ok, llm_result = not problems, problems or "ok"
+            line += f"   llm: {llm_result}"
+
+        failed = failed or not (local_ok and llm_ok)
+        click.echo(f"{'ok  ' if local_ok and llm_ok else 'FAIL'} {name}")
+        click.echo(line)
+
+    if failed:
+        raise click.ClickException("reschedule corpus failed")
+
+
+@click.command('fake-openai')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=8089)
+@click.option('--latency-ms', type=int, default=0, help="Задержка перед каждым ответом.")
+@click.option('--error-rate', type=float, default=0.0, help="Доля запросов, которые завершаются ошибкой.")
+@click.option('--error-status', type=int, default=503, help="HTTP-код для внедрённых ошибок.")
+@click.option('--retry-after', type=float, default=None, help="Значение заголовка Retry-After у ошибок.")
+def fake_openai_command(host, port, latency_ms, error_rate, error_status, retry_after):
+    """Локальный фейковый OpenAI (/v1/chat/completions) с внедряемыми задержками и ошибками.
+
+    Использование: OPENAI_API_BASE=http://127.0.0.1:8089/v1 flask --app app run
+    """
+
+    class FakeOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, status, payload, extra_headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (extra_headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request_body = json.loads(self.rfile.read(length) or b"{}")
+            if latency_ms:
+                time.sleep(latency_ms / 1000)
+
+            if random.random() < error_rate:
+                headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+                self._send_json(error_status, {"error": {"message": "injected failure"}}, headers)
+                return
+
+            content = stub_completion(request_body.get("model"), request_body.get("messages", []))
+            if not request_body.get("stream"):
+                self._send_json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for i in range(0, len(content), 16):
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + 16]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.close_connection = True
+
+        def log_message(self, format, *args):
+            click.echo(f"fake-openai: {format % args}")
+
+    click.echo(f"Fake OpenAI listening on http://{host}:{port}/v1")
+    ThreadingHTTPServer((host, port), FakeOpenAIHandler).serve_forever()
+
+
+@click.command('email-dispatcher')
+@click.option('--once', is_flag=True, help="Отправить всё, что накопилось, и выйти.")
+@click.option('--poll-seconds', type=float, default=5.0)
+@with_appcontext
+def email_dispatcher_command(once, poll_seconds):
+    """Отправляет письма из email_outbox (отдельным процессом вместо потока в воркерах).
+
+    Запускать с EMAIL_DISPATCHER_ENABLED=False у веб-воркеров, если нужен один отправитель.
+    """
+    while True:
+        sent = drain_outbox()
+        if sent:
+            click.echo(f"processed {sent} emails")
+        db.session.remove()
+        if once:
+            return
+        time.sleep(poll_seconds)
+
+
+class _FakeSMTPHandler(StreamRequestHandler):
+    """
+    Минимальный SMTP-диалог для fake-smtp и check-email-outbox. Поведение задают атрибуты
+    сервера (_fake_smtp_server): задержка, доля отказов 451, отклоняемые адреса (550 на RCPT),
+    обрыв соединения после N принятых писем, печать писем.
+    """
+
+    def reply(self, line):
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000)
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        sender, recipients, sent = None, [], 0
+        for raw in self.rfile:
+            command = raw.decode("utf-8", "replace").rstrip("\r\n")
+            verb = command[:4].upper()
+            if verb in ("HELO", "EHLO"):
+                self.reply("250 fake-smtp")
+            elif verb == "MAIL":
+                sender, recipients = command[10:].strip(), []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipient = command[8:].strip()
+                if recipient.strip("<>") in self.server.reject_recipients:
+                    self.reply("550 mailbox unavailable")
+                    continue
+                recipients.append(recipient)
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                for data_line in self.rfile:
+                    if data_line.rstrip(b"\r\n") == b".":
+                        break
+                    lines.append(data_line.decode("utf-8", "replace").rstrip("\r\n"))
+                if random.random() < self.server.reject_rate:
+                    self.reply("451 injected temporary failure")
+                    continue
+                sent += 1
+                self.server.received.append((recipients, lines))
+                if self.server.echo:
+                    click.echo(f"--- message from {sender} to {', '.join(recipients)}")
+                    click.echo("\n".join(lines))
+                self.reply("250 OK queued")
+                if self.server.drop_after is not None and sent >= self.server.drop_after:
+                    break
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                break
+            else:
+                self.reply("502 Command not implemented")
+        if self.server.echo:
+            click.echo(f"fake-smtp: connection closed after {sent} messages")
+
+
+def _fake_smtp_server(host, port, latency_ms=0, reject_rate=0.0, reject_recipients=(), drop_after=None, echo=False):
+    ThreadingTCPServer.allow_reuse_address = True
+    server = ThreadingTCPServer((host, port), _FakeSMTPHandler)
+    server.daemon_threads = True
+    server.latency_ms = latency_ms
+    server.reject_rate = reject_rate
+    server.reject_recipients = set(reject_recipients)
+    server.drop_after = drop_after
+    server.echo = echo
+    server.received = []
+    return server
+
+
+@click.command('fake-smtp')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=8025)
+@click.option('--latency-ms', type=int, default=0, help="Задержка перед ответом на каждую команду.")
+@click.option('--reject-rate', type=float, default=0.0, help="Доля писем, отклоняемых временной ошибкой 451.")
+def fake_smtp_command(host, port, latency_ms, reject_rate):
+    """Локальный отладочный SMTP-сервер: печатает письма вместо отправки, умеет внедрять задержки и отказы.
+
+    Использование: MAIL_SERVER=127.0.0.1 MAIL_PORT=8025 MAIL_USE_TLS=False flask --app app run
+    """
+    click.echo(f"Fake SMTP listening on {host}:{port}")
+    _fake_smtp_server(host, port, latency_ms=latency_ms, reject_rate=reject_rate, echo=True).serve_forever()
+
+
+def _outbox_check_app(smtp_port):
+    """
+    Отдельное приложение для check-email-outbox: БД SQLite в памяти и почта на локальный
+    fake SMTP, чтобы проверка не трогала настоящую очередь и не слала писем наружу.
+    """
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        MAIL_SERVER="127.0.0.1", MAIL_PORT=smtp_port, MAIL_USE_TLS=False, MAIL_USE_SSL=False,
+    )
+    db.init_app(app)
+    mail.init_app(app)
+    return app
+
+
+def _enqueue_check_email(recipient):
+    email = enqueue_email("check-email-outbox", [recipient], "reset code 1234", "check@example.com")
+    db.session.commit()
+    return email.id
+
+
+@click.command('check-email-outbox')
+def check_email_outbox_command():
+    """Прогоняет dispatch_batch против локального SMTP-сервера и проверяет исходы писем.
+
+    Отправленное письмо — sent со стёртым телом; отклонённый адрес — отложен с backoff;
+    обрыв соединения — откладывает остаток пачки. Код выхода ≠ 0, если что-то не так.
+    """
+    server = _fake_smtp_server("127.0.0.1", 0, reject_recipients={"rejected@example.com"})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = _outbox_check_app(server.server_address[1])
+
+    failures = []
+
+    def expect(name, ok):
+        click.echo(f"{'ok  ' if ok else 'FAIL'} {name}")
+        if not ok:
+            failures.append(name)
+
+    try:
+        with app.app_context():
+            db.create_all()
+
+            sent_id = _enqueue_check_email("user@example.com")
+            rejected_id = _enqueue_check_email("rejected@example.com")
+            started = datetime.utcnow()
+            dispatch_batch()
+            sent, rejected = db.session.get(OutboxEmail, sent_id), db.session.get(OutboxEmail, rejected_id)
+            expect("delivered email is sent with its body wiped",
+                   sent.status == 'sent' and sent.body == '' and sent.sent_at is not None
+                   and len(server.received) == 1)
+            expect("rejected recipient is deferred with backoff",
+                   rejected.status == 'pending' and rejected.attempts == 1 and rejected.last_error
+                   and rejected.next_attempt_at >= started + timedelta(seconds=EMAIL_OUTBOX_BACKOFF_SECONDS)
+                   and rejected.body != '')
+
+            # Сервер рвёт соединение после первого принятого письма
+            server.drop_after = 1
+            batch_ids = [_enqueue_check_email(f"user{i}@example.com") for i in range(3)]
+            dispatch_batch()
+            first, *rest = (db.session.get(OutboxEmail, email_id) for email_id in batch_ids)
+            expect("dropped connection defers the rest of the batch",
+                   first.status == 'sent'
+                   and all(e.status == 'pending' and e.attempts == 1 and e.next_attempt_at > started for e in rest))
+            db.session.remove()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    if failures:
+        raise click.ClickException(f"{len(failures)} email outbox checks failed")
+
+
+# Сколько SQL-запросов допускается на один вызов эндпоинта, независимо от числа целей/шагов
+QUERY_BUDGETS = {
+    "GET /api/goals/with-steps": 3,
+    "GET /api/goals/with-steps (304)": 1,
+    "GET /api/goals/<id>": 3,
+    "POST /api/steps/bulk": 1,
+    # Пользователь из токена берётся из кэша identity (utils/identity.py), users не читается
+    "GET /auth/protected": 0,
+}
+
+
+def _delete_user_data(user_id):
+    goal_ids = db.select(Goal.id).where(Goal.user_id == user_id)
+    db.session.execute(db.delete(Step).where(Step.goal_id.in_(goal_ids)))
+    db.session.execute(db.delete(Goal).where(Goal.user_id == user_id))
+    db.session.execute(db.delete(DayLoad).where(DayLoad.user_id == user_id))
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+    response_cache.invalidate_user(user_id)
+    invalidate_identity(user_id)
+
+
+def _measure_read_endpoints(n_goals, steps_per_goal):
+    """
+    Создаёт (с коммитом) пользователя с n_goals целями, дёргает читающие эндпоинты
+    через тестовый клиент и возвращает {эндпоинт: число SQL-запросов}. Данные удаляются.
+    """
+    user = _seed_bench_user(n_goals * steps_per_goal, n_goals=n_goals)
+    db.session.commit()
+    user_id = user.id
+    try:
+        headers = {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+        goal_id = db.session.scalar(db.select(Goal.id).where(Goal.user_id == user_id).limit(1))
+        step_ids = db.session.scalars(
+            db.select(Step.id).join(Goal).where(Goal.user_id == user_id).limit(100)
+        ).all()
+        etag = current_app.test_client().get("/api/goals/with-steps", headers=headers).headers["ETag"]
+        current_app.test_client().get("/auth/protected", headers=headers)  # прогрев кэша identity
+        calls = {
+            "GET /api/goals/with-steps": lambda c: c.get("/api/goals/with-steps", headers=headers),
+            "GET /api/goals/with-steps (304)": lambda c: c.get(
+                "/api/goals/with-steps", headers={**headers, "If-None-Match": etag}
+            ),
+            "GET /api/goals/<id>": lambda c: c.get(f"/api/goals/{goal_id}", headers=headers),
+            "POST /api/steps/bulk": lambda c: c.post("/api/steps/bulk", json={"step_ids": step_ids}, headers=headers),
+            "GET /auth/protected": lambda c: c.get("/auth/protected", headers=headers),
+        }
+
+        counts = {}
+        client = current_app.test_client()
+        for name, call in calls.items():
+            # Бюджеты — для построения ответа, а не для попадания в кэш ответов
+            response_cache.invalidate_user(user_id)
+            with count_queries() as queries:
+                response = call(client)
+            if response.status_code not in (200, 304):
+                raise click.ClickException(f"{name} returned {response.status_code}")
+            counts[name] = queries.count
+        return counts
+    finally:
+        _delete_user_data(user_id)
+
+
+@click.command('check-query-counts')
+@click.option('--goals', 'n_goals', type=int, default=50, help="Целей у пользователя в большом прогоне.")
+@click.option('--steps-per-goal', type=int, default=5)
+@with_appcontext
+def check_query_counts_command(n_goals, steps_per_goal):
+    """Проверяет, что читающие эндпоинты целей укладываются в QUERY_BUDGETS и не растут с числом целей (N+1).
+
+    Завершается с ненулевым кодом при регрессии — можно запускать в CI.
+    """
+    small = _measure_read_endpoints(2, steps_per_goal)
+    large = _measure_read_endpoints(n_goals, steps_per_goal)
+
+    failed = False
+    for name, budget in QUERY_BUDGETS.items():
+        ok = large[name] <= budget and large[name] == small[name]
+        failed = failed or not ok
+        click.echo(f"{'ok  ' if ok else 'FAIL'} {name:<28} {small[name]} queries (2 goals), "
+                   f"{large[name]} queries ({n_goals} goals), budget {budget}")
+    if failed:
+        raise click.ClickException("query count regression")
+
+
+def register_commands(app):
+    app.cli.add_command(db_upgrade_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(rebuild_day_load_command)
+    app.cli.add_command(reconcile_goal_counters_command)
+    app.cli.add_command(bench_day_load_command)
+    app.cli.add_command(bench_steps_range_command)
+    app.cli.add_command(bench_serialization_command)
+    app.cli.add_command(bench_steps_import_command)
+    app.cli.add_command(bench_login_command)
+    app.cli.add_command(eval_busy_parser_command)
+    app.cli.add_command(eval_reschedule_command)
+    app.cli.add_command(fake_openai_command)
+    app.cli.add_command(fake_smtp_command)
+    app.cli.add_command(check_email_outbox_command)
+    app.cli.add_command(email_dispatcher_command)
+    app.cli.add_command(check_query_counts_command)
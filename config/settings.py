@@ -14,6 +14,10 @@ SQLALCHEMY_DATABASE_URI = os.getenv(
 
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Создавать недостающие таблицы при старте (удобно для разработки). В продакшене — False
+# и `flask db-upgrade` при выкатке: create_all не добавляет колонки и индексы в существующие таблицы.
+DB_AUTO_CREATE = os.getenv('DB_AUTO_CREATE', 'True').lower() in ['true', '1']
+
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'fallback_jwt_secret')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
 
@@ -23,4 +27,104 @@ MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
 MAIL_USERNAME = os.getenv('MAIL_USERNAME')
 MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
 MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True').lower() in ['true', '1']
-MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', 'False').lower() in ['true', '1']
\ No newline at end of file
+MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', 'False').lower() in ['true', '1']
+
+# Перенос задач из диапазона занятости считается локально, GPT — только как запасной путь
+LOCAL_RESCHEDULER_ENABLED = os.getenv('LOCAL_RESCHEDULER_ENABLED', 'True').lower() in ['true', '1']
+
+# Кэш ответов LLM: memory | sql | none
+LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'memory').lower()
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 1024))
+
+# Локальная заглушка вместо OpenAI (тесты/разработка)
+OPENAI_STUB = os.getenv('OPENAI_STUB', 'False').lower() in ['true', '1']
+OPENAI_STUB_LATENCY_MS = int(os.getenv('OPENAI_STUB_LATENCY_MS', 0))
+
+# Асинхронные AI-задачи (?async=1): размер пула, очередь сверх него, таймаут "зависшей" задачи
+AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', 2))
+AI_JOB_QUEUE_SIZE = int(os.getenv('AI_JOB_QUEUE_SIZE', 16))
+AI_JOB_STALE_SECONDS = int(os.getenv('AI_JOB_STALE_SECONDS', 600))
+
+# Клиент OpenAI: адрес API (можно направить на `flask fake-openai`), дедлайны, повторы,
+# circuit breaker и ограничение параллельных запросов на модель
+OPENAI_API_BASE = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', 30))
+OPENAI_LONG_TIMEOUT_SECONDS = float(os.getenv('OPENAI_LONG_TIMEOUT_SECONDS', 90))
+OPENAI_CONNECT_TIMEOUT_SECONDS = float(os.getenv('OPENAI_CONNECT_TIMEOUT_SECONDS', 5))
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', 3))
+OPENAI_RETRY_BACKOFF_SECONDS = float(os.getenv('OPENAI_RETRY_BACKOFF_SECONDS', 0.5))
+OPENAI_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv('OPENAI_RETRY_BACKOFF_MAX_SECONDS', 8))
+OPENAI_POOL_SIZE = int(os.getenv('OPENAI_POOL_SIZE', 10))
+OPENAI_MAX_CONCURRENCY_PER_MODEL = int(os.getenv('OPENAI_MAX_CONCURRENCY_PER_MODEL', 4))
+OPENAI_BREAKER_FAILURES = int(os.getenv('OPENAI_BREAKER_FAILURES', 5))
+OPENAI_BREAKER_RESET_SECONDS = float(os.getenv('OPENAI_BREAKER_RESET_SECONDS', 30))
+
+# Постраничная выдача списков (?limit=&cursor=): размер страницы по умолчанию и максимум
+PAGE_LIMIT_DEFAULT = int(os.getenv('PAGE_LIMIT_DEFAULT', 50))
+PAGE_LIMIT_MAX = int(os.getenv('PAGE_LIMIT_MAX', 200))
+
+# Кэш готовых JSON-ответов читающих эндпоинтов: memory | sql | none | "модуль:фабрика"
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+# Кодировать JSON-ответы через orjson, если он установлен (иначе — json Flask)
+FAST_JSON = os.getenv('FAST_JSON', 'True').lower() in ['true', '1']
+
+# Хэширование паролей: метод и стоимость в формате werkzeug ("pbkdf2:sha256:<итерации>"),
+# пул процессов (0 — считать в потоке запроса) и очередь перед ним
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+PASSWORD_HASH_WAIT_SECONDS = float(os.getenv('PASSWORD_HASH_WAIT_SECONDS', 5))
+
+# Кэш пользователей из JWT (utils/identity.py): сколько держать снимок и сколько снимков в процессе
+IDENTITY_CACHE_TTL_SECONDS = int(os.getenv('IDENTITY_CACHE_TTL_SECONDS', 60))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+
+# Операторы: email через запятую, кому доступны /api/goals/metrics и /api/ai/metrics
+# (статистика всего процесса). Пустая строка — метрики закрыты для всех
+METRICS_OPERATOR_EMAILS = {
+    email.strip().lower() for email in os.getenv('METRICS_OPERATOR_EMAILS', '').split(',') if email.strip()
+}
+
+# Исходящие письма (utils/email_outbox.py): диспетчер в процессе приложения, размер пачки
+# на одно SMTP-соединение, опрос очереди, повторы с экспоненциальной задержкой
+EMAIL_DISPATCHER_ENABLED = os.getenv('EMAIL_DISPATCHER_ENABLED', 'True').lower() in ['true', '1']
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', 50))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv('EMAIL_OUTBOX_POLL_SECONDS', 10))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('EMAIL_OUTBOX_MAX_ATTEMPTS', 8))
+EMAIL_OUTBOX_BACKOFF_SECONDS = float(os.getenv('EMAIL_OUTBOX_BACKOFF_SECONDS', 30))
+EMAIL_OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 3600))
+# Таймаут SMTP-сокета (подключение и каждая команда) и на сколько диспетчер забирает пачку писем.
+# Аренда по умолчанию — размер пачки × таймаут: дольше пачку не отправить, не упершись в таймауты,
+# а истёкшую аренду другой процесс вправе забрать заново
+EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS = float(os.getenv('EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS', 30))
+EMAIL_OUTBOX_CLAIM_LEASE_SECONDS = float(os.getenv(
+    'EMAIL_OUTBOX_CLAIM_LEASE_SECONDS', EMAIL_OUTBOX_BATCH_SIZE * EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS
+))
+
+# Ограничение частоты запросов (utils/rate_limit.py): memory | sql | none | "модуль:фабрика".
+# Лимиты маршрутов — "ключ:число/период" через ";", ключ — ip | user (id из JWT) | email (из тела запроса)
+# | global (один счётчик на маршрут),
+# период — second | minute | hour | day. Пустая строка снимает лимит с маршрута.
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+# Сколько доверенных прокси перед приложением добавляют X-Forwarded-For (0 — адрес берётся из соединения)
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))
+RATE_LIMIT_LOGIN = os.getenv('RATE_LIMIT_LOGIN', 'ip:20/minute;ip:200/hour;email:5/minute;email:30/hour')
+RATE_LIMIT_REGISTER = os.getenv('RATE_LIMIT_REGISTER', 'ip:5/minute;ip:50/hour')
+RATE_LIMIT_PASSWORD_RESET = os.getenv('RATE_LIMIT_PASSWORD_RESET', 'ip:10/minute;ip:60/hour;email:1/minute')
+# Ввод кода сброса: код 4-значный и живёт 30 минут, поэтому кроме лимита на IP нужен общий —
+# иначе перебор с разных адресов не ограничен ничем
+RATE_LIMIT_PASSWORD_RESET_CONFIRM = os.getenv(
+    'RATE_LIMIT_PASSWORD_RESET_CONFIRM', 'ip:5/minute;ip:20/hour;global:30/minute;global:300/hour'
+)
+RATE_LIMIT_AI = os.getenv('RATE_LIMIT_AI', 'user:10/minute;user:100/hour;ip:30/minute')
+RATE_LIMIT_AI_JOBS = os.getenv('RATE_LIMIT_AI_JOBS', 'user:120/minute')
+
+# Допуск к AI-маршрутам, которые ждут OpenAI (utils/admission.py): одновременно на процесс
+# (держать меньше числа потоков воркера) и на пользователя, очередь сверх лимита и ожидание в ней
+AI_ADMISSION_MAX_CONCURRENT = int(os.getenv('AI_ADMISSION_MAX_CONCURRENT', 4))
+AI_ADMISSION_MAX_PER_USER = int(os.getenv('AI_ADMISSION_MAX_PER_USER', 2))
+AI_ADMISSION_QUEUE_SIZE = int(os.getenv('AI_ADMISSION_QUEUE_SIZE', 8))
+AI_ADMISSION_WAIT_SECONDS = float(os.getenv('AI_ADMISSION_WAIT_SECONDS', 2))
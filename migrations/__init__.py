@@ -0,0 +1,153 @@
+"""
+Версионированные миграции схемы, применяемые без остановки сервиса.
+
+Каждая миграция — модуль migrations/versions/NNNN_<имя>.py: первая строка docstring —
+описание, функция upgrade(ops) — изменения схемы. Применённые версии пишутся в таблицу
+schema_migrations. Операции идемпотентны (IF NOT EXISTS / проверка схемы), поэтому
+прерванную миграцию можно просто запустить ещё раз. Индексы на Postgres строятся
+CONCURRENTLY (без блокировки записи), поэтому миграции выполняются в режиме autocommit.
+
+Запуск: flask --app app db-upgrade
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from extensions import db
+
+# Ключ pg_advisory_lock: два одновременных db-upgrade (например, при выкатке) не мешают друг другу
+MIGRATION_LOCK_ID = 7_210_014
+
+_metadata = sa.MetaData()
+schema_migrations = sa.Table(
+    "schema_migrations",
+    _metadata,
+    sa.Column("version", sa.String(64), primary_key=True),
+    sa.Column("description", sa.String(255), nullable=False),
+    sa.Column("applied_at", sa.DateTime, nullable=False),
+)
+
+
+class Ops:
+    """
+    Операции, доступные миграции. Работают поверх autocommit-соединения.
+    """
+
+    def __init__(self, conn, echo):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self.echo = echo
+
+    @property
+    def is_postgres(self):
+        return self.dialect == "postgresql"
+
+    def execute(self, statement, params=None):
+        if isinstance(statement, str):
+            statement = sa.text(statement)
+        return self.conn.execute(statement, params or {})
+
+    def has_column(self, table, column):
+        return column in {c["name"] for c in sa.inspect(self.conn).get_columns(table)}
+
+    def create_all(self):
+        """
+        Создаёт недостающие таблицы (и их индексы) по моделям; существующие не трогает.
+        """
+        db.metadata.create_all(bind=self.conn)
+
+    def create_table(self, table):
+        table.create(bind=self.conn, checkfirst=True)
+
+    def add_column(self, table, column, ddl):
+        """
+        ddl — тип и ограничения, например "INTEGER NOT NULL DEFAULT 0".
+        На Postgres 11+ ADD COLUMN с константным DEFAULT не переписывает таблицу.
+        """
+        if self.has_column(table, column):
+            return
+        self.echo(f"  add column {table}.{column}")
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    def create_index(self, name, table, columns, unique=False):
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        self.echo(f"  create {kind.lower()} {name} on {table} ({', '.join(columns)})")
+        if self.is_postgres:
+            self._drop_invalid_index(name)
+            self.execute(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        else:
+            self.execute(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+    def _drop_invalid_index(self, name):
+        """
+        Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, который
+        IF NOT EXISTS молча пропустил бы, — удаляем его перед повторной попыткой.
+        """
+        invalid = self.execute(
+            "SELECT 1 FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+            "WHERE c.relname = :name AND NOT i.indisvalid",
+            {"name": name}
+        ).first()
+        if invalid:
+            self.echo(f"  drop invalid index {name}")
+            self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def load_migrations():
+    """
+    [(version, description, upgrade)] в порядке версий.
+    """
+    package = importlib.import_module("migrations.versions")
+    migrations = []
+    for info in sorted(pkgutil.iter_modules(package.__path__), key=lambda m: m.name):
+        module = importlib.import_module(f"migrations.versions.{info.name}")
+        description = (module.__doc__ or info.name).strip().splitlines()[0]
+        migrations.append((info.name, description, module.upgrade))
+    return migrations
+
+
+def _applied(conn):
+    _metadata.create_all(bind=conn)
+    rows = conn.execute(sa.select(schema_migrations.c.version, schema_migrations.c.applied_at))
+    return {version: applied_at for version, applied_at in rows}
+
+
+def migration_status():
+    """
+    [(version, description, applied_at или None)].
+    """
+    with db.engine.connect() as conn:
+        applied = _applied(conn)
+        conn.commit()
+    return [(version, description, applied.get(version)) for version, description, _ in load_migrations()]
+
+
+def upgrade(echo=print):
+    """
+    Применяет все ещё не применённые миграции. Возвращает список применённых версий.
+    """
+    done = []
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        ops = Ops(conn, echo)
+        if ops.is_postgres:
+            conn.execute(sa.text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        try:
+            applied = _applied(conn)
+            for version, description, migrate in load_migrations():
+                if version in applied:
+                    continue
+                echo(f"applying {version}: {description}")
+                migrate(ops)
+                conn.execute(schema_migrations.insert().values(
+                    version=version,
+                    description=description[:255],
+                    applied_at=datetime.utcnow()
+                ))
+                done.append(version)
+        finally:
+            if ops.is_postgres:
+                conn.execute(sa.text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+    return done
@@ -0,0 +1,13 @@
+"""
+Базовая схема: создаёт недостающие таблицы по моделям (то, что раньше делал db.create_all()).
+"""
+import models.ai_job_model  # noqa: F401 — модели должны быть зарегистрированы в metadata
+import models.day_load_model  # noqa: F401
+import models.goal_model  # noqa: F401
+import models.llm_cache_model  # noqa: F401
+import models.step_model  # noqa: F401
+import models.user_model  # noqa: F401
+
+
+def upgrade(ops):
+    ops.create_all()
@@ -0,0 +1,17 @@
+"""
+Счётчики шагов goals.total_steps / goals.done_steps и их заполнение по таблице steps.
+"""
+from models.goal_model import Goal
+from utils.goal_counters import reconcile_counters_stmt
+
+# Заполняем пачками по id, чтобы не держать блокировки строк всей таблицы в одной транзакции
+BACKFILL_BATCH = 1000
+
+
+def upgrade(ops):
+    ops.add_column("goals", "total_steps", "INTEGER NOT NULL DEFAULT 0")
+    ops.add_column("goals", "done_steps", "INTEGER NOT NULL DEFAULT 0")
+
+    max_id = ops.execute("SELECT max(id) FROM goals").scalar() or 0
+    for start in range(0, max_id + 1, BACKFILL_BATCH):
+        ops.execute(reconcile_counters_stmt().where(Goal.id >= start, Goal.id < start + BACKFILL_BATCH))
@@ -0,0 +1,14 @@
+"""
+Вторичные индексы для горячих запросов (см. `flask check-query-plans`).
+"""
+
+
+def upgrade(ops):
+    # Goal.query.filter_by(user_id=...) и JOIN шагов с целями пользователя
+    ops.create_index("ix_goals_user_id", "goals", ["user_id"])
+    # Шаги цели, календарь и переносы по дате: ведущая колонка goal_id покрывает и steps.goal_id
+    ops.create_index("ix_steps_goal_id_date", "steps", ["goal_id", "date"])
+    # Фильтр по статусу и подсчёт выполненных шагов цели
+    ops.create_index("ix_steps_goal_id_status", "steps", ["goal_id", "status"])
+    # reset_password ищет пользователя по коду
+    ops.create_index("ix_users_reset_token", "users", ["reset_token"])
@@ -0,0 +1,7 @@
+"""
+users.data_version — версия данных пользователя для ETag / If-None-Match.
+"""
+
+
+def upgrade(ops):
+    ops.add_column("users", "data_version", "INTEGER NOT NULL DEFAULT 0")
@@ -0,0 +1,8 @@
+"""
+Таблица response_cache_entries для общего кэша ответов (RESPONSE_CACHE_BACKEND=sql).
+"""
+from models.response_cache_model import ResponseCacheEntry
+
+
+def upgrade(ops):
+    ops.create_table(ResponseCacheEntry.__table__)
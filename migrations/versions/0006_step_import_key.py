@@ -0,0 +1,8 @@
+"""
+steps.import_key и уникальный индекс (goal_id, import_key) для импорта календаря без дублей.
+"""
+
+
+def upgrade(ops):
+    ops.add_column("steps", "import_key", "VARCHAR(64)")
+    ops.create_index("ix_steps_goal_id_import_key", "steps", ["goal_id", "import_key"], unique=True)
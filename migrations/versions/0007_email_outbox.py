@@ -0,0 +1,8 @@
+"""
+Таблица email_outbox — исходящие письма, которые отправляет фоновый диспетчер.
+"""
+from models.email_outbox_model import OutboxEmail
+
+
+def upgrade(ops):
+    ops.create_table(OutboxEmail.__table__)
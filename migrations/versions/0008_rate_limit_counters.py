@@ -0,0 +1,8 @@
+"""
+Таблица rate_limit_counters для общего лимитера запросов (RATE_LIMIT_BACKEND=sql).
+"""
+from models.rate_limit_model import RateLimitCounter
+
+
+def upgrade(ops):
+    ops.create_table(RateLimitCounter.__table__)
@@ -0,0 +1,28 @@
+from extensions import db
+from datetime import datetime
+
+
+class AIJob(db.Model):
+    """
+    Асинхронная AI-задача (generate-goal / reschedule), см. utils/ai_jobs.py.
+    Результат хранится в БД, поэтому переживает перезапуск воркеров.
+    """
+    __tablename__ = 'ai_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='queued')
+    payload = db.Column(db.Text, nullable=False)
+    result = db.Column(db.Text, nullable=True)
+    http_status = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, id, user_id, kind, payload):
+        self.id = id
+        self.user_id = user_id
+        self.kind = kind
+        self.payload = payload
+        self.status = 'queued'
@@ -0,0 +1,18 @@
+from extensions import db
+
+
+class DayLoad(db.Model):
+    """
+    Денормализованная загрузка дня: сколько шагов у пользователя назначено на дату.
+    Обновляется вместе с каждым созданием/изменением/удалением шага (см. utils/day_load.py).
+    """
+    __tablename__ = 'day_loads'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    task_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, user_id, day, task_count=0):
+        self.user_id = user_id
+        self.day = day
+        self.task_count = task_count
@@ -0,0 +1,35 @@
+from extensions import db
+from datetime import datetime
+
+
+class OutboxEmail(db.Model):
+    """
+    Письмо в исходящей очереди, см. utils/email_outbox.py.
+    Пишется в той же транзакции, что и данные, ради которых отправляется (например, код сброса пароля).
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        # Диспетчер выбирает ожидающие письма, срок которых наступил
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # JSON-список адресов
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __init__(self, sender, recipients, subject, body):
+        self.sender = sender
+        self.recipients = recipients
+        self.subject = subject
+        self.body = body
+        self.status = 'pending'
+        self.attempts = 0
+        self.next_attempt_at = datetime.utcnow()
@@ -1,16 +1,19 @@
 from extensions import db
 from datetime import datetime
+from sqlalchemy.ext.hybrid import hybrid_property
 from models.step_model import Step
 
 class Goal(db.Model):
     __tablename__ = 'goals'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     title = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text, nullable=True)
     color = db.Column(db.String(50), nullable=True)
-    progress = db.Column(db.Float, default=0.0)
+    # Счётчики шагов, см. utils/goal_counters.py
+    total_steps = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    done_steps = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -23,15 +26,17 @@ class Goal(db.Model):
         self.description = description
         self.color = color
 
-    def update_progress(self):
+    @hybrid_property
+    def progress(self):
         """
-        Пересчитывает прогресс в зависимости от выполненных шагов.
-        Например:
-          progress = (кол-во выполненных шагов / общее кол-во шагов) * 100
+        Прогресс из счётчиков, без загрузки шагов:
+          progress = (кол-во выполненных шагов * 100) // общее кол-во шагов
         """
-        total_steps = len(self.steps)
-        if total_steps == 0:
-            self.progress = 0
-        else:
-            completed_steps = sum(1 for step in self.steps if step.status == 'done')
-            self.progress = int((completed_steps / total_steps) * 100)
+        if not self.total_steps:
+            return 0
+        return (self.done_steps * 100) // self.total_steps
+
+    @progress.expression
+    def progress(cls):
+        # То же самое в SQL — для выборок только нужных колонок
+        return db.case((cls.total_steps == 0, 0), else_=(cls.done_steps * 100) // cls.total_steps)
@@ -0,0 +1,19 @@
+from extensions import db
+from datetime import datetime
+
+
+class LLMCacheEntry(db.Model):
+    """
+    Общий (для всех воркеров) кэш ответов LLM, см. utils/llm_cache.py.
+    """
+    __tablename__ = 'llm_cache_entries'
+
+    key = db.Column(db.String(64), primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __init__(self, key, content, expires_at):
+        self.key = key
+        self.content = content
+        self.expires_at = expires_at
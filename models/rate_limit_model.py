@@ -0,0 +1,19 @@
+from extensions import db
+
+
+class RateLimitCounter(db.Model):
+    """
+    Счётчик запросов в одном окне лимита (общий для всех воркеров), см. utils/rate_limit.py.
+    """
+    __tablename__ = 'rate_limit_counters'
+
+    key = db.Column(db.String(255), primary_key=True)
+    window = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # номер окна: unix-время // длина окна
+    count = db.Column(db.Integer, nullable=False, default=0)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, key, window, count, expires_at):
+        self.key = key
+        self.window = window
+        self.count = count
+        self.expires_at = expires_at
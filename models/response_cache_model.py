@@ -0,0 +1,23 @@
+from extensions import db
+from datetime import datetime
+
+
+class ResponseCacheEntry(db.Model):
+    """
+    Общий (для всех воркеров) кэш готовых JSON-ответов, см. utils/response_cache.py.
+    """
+    __tablename__ = 'response_cache_entries'
+
+    key = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    body = db.Column(db.LargeBinary, nullable=False)
+    headers = db.Column(db.Text, nullable=False, default='{}')
+    size = db.Column(db.Integer, nullable=False)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __init__(self, key, user_id, body, headers, size):
+        self.key = key
+        self.user_id = user_id
+        self.body = body
+        self.headers = headers
+        self.size = size
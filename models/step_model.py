@@ -3,6 +3,14 @@ from datetime import datetime
 
 class Step(db.Model):
     __tablename__ = 'steps'
+    __table_args__ = (
+        # Календарь: шаги целей пользователя в окне дат — range scan по (goal_id, date)
+        db.Index('ix_steps_goal_id_date', 'goal_id', 'date'),
+        # Фильтр по статусу и подсчёт выполненных шагов цели
+        db.Index('ix_steps_goal_id_status', 'goal_id', 'status'),
+        # Повторный импорт календаря: одно и то же событие не добавляется в цель дважды
+        db.Index('ix_steps_goal_id_import_key', 'goal_id', 'import_key', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     goal_id = db.Column(db.Integer, db.ForeignKey('goals.id'), nullable=False)
@@ -12,6 +20,8 @@ class Step(db.Model):
     date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Ключ импортированного события (хэш UID из .ics или даты и описания), см. utils/step_import.py
+    import_key = db.Column(db.String(64), nullable=True)
 
     def __init__(self, goal_id, title, description=None, date=None, status='planned'):
         self.goal_id = goal_id
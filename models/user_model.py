@@ -1,5 +1,5 @@
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from utils.passwords import hash_password, verify_password, needs_rehash
 from datetime import datetime, timedelta
 import random
 
@@ -11,10 +11,13 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     name = db.Column(db.String(100), nullable=False)
 
-    reset_token = db.Column(db.String(50), nullable=True)
+    reset_token = db.Column(db.String(50), nullable=True, index=True)
     reset_token_expires = db.Column(db.DateTime, nullable=True)
     reset_token_sent_at = db.Column(db.DateTime, nullable=True) 
 
+    # Увеличивается при каждой записи целей/шагов пользователя (ETag, см. utils/data_version.py)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     def generate_reset_token(self, expires_in=30):
         """
         Генерирует 4-значный код, сохраняет в БД + время истечения.
@@ -25,10 +28,13 @@ class User(db.Model):
         self.reset_token_sent_at = datetime.utcnow()
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
 
     def clear_reset_token(self):
         self.reset_token = None
@@ -1,24 +1,67 @@
 import json
 import logging
+import math
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from collections import Counter
 
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, request, jsonify, url_for, stream_with_context, has_request_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 
-import openai
-from config.settings import OPENAI_API_KEY
+from config.settings import (
+    OPENAI_API_KEY, OPENAI_STUB, OPENAI_LONG_TIMEOUT_SECONDS, LOCAL_RESCHEDULER_ENABLED, RATE_LIMIT_AI, RATE_LIMIT_AI_JOBS
+)
 from extensions import db
+from models.ai_job_model import AIJob
 from models.goal_model import Goal
 from models.step_model import Step
-from models.user_model import User
+from utils.admission import ai_admission, AdmissionRejected
+from utils.ai_jobs import register_job_handler, submit_job, expire_stale_job, job_to_dict
 from utils.color_utils import get_unique_pastel_color
+from utils.date_phrases import parse_busy_period
+from utils.day_load import get_day_load, bump_day_loads
+from utils.data_version import bump_data_version
+from utils.identity import operator_required
+from utils.json_stream import StepsStreamParser
+from utils.llm_cache import chat_completion, chat_completion_stream, completion_cache
+from utils.openai_client import openai_client, OpenAIUnavailable
+from utils.rate_limit import rate_limit, rate_limiter
+from utils.scheduler import (
+    DayLoadCalendar, apply_reschedule_updates, plan_range_shift, range_shift_violations
+)
 
 logger = logging.getLogger(__name__)
 ai_routes = Blueprint('ai_routes', __name__)
 
+# Сколько AI-шагов можно поставить на один день
+AI_MAX_TASKS_PER_DAY = 2
+# По сколько шагов пишем в БД при потоковой генерации цели
+STREAM_STEPS_BATCH_SIZE = 5
 
-openai.api_key = OPENAI_API_KEY
+
+@ai_routes.errorhandler(AdmissionRejected)
+def ai_admission_rejected(e):
+    response = jsonify({"message": str(e), "reason": e.reason})
+    response.headers["Retry-After"] = str(max(1, math.ceil(e.retry_after)))
+    return response, e.status
+
+
+def _uses_openai():
+    return bool(OPENAI_API_KEY) and not OPENAI_STUB
+
+
+@contextmanager
+def _llm_slot():
+    """
+    Слот admission control (utils/admission.py) на время одного вызова OpenAI.
+    Только в потоке запроса и только для настоящего OpenAI: фоновые AI-задачи ограничены
+    своим пулом, а локальный разбор, локальный перенос и заглушка не ждут очереди к GPT.
+    Ставится снаружи try/except Exception, чтобы AdmissionRejected дошёл до обработчика.
+    """
+    if not _uses_openai() or not has_request_context():
+        yield
+        return
+    with ai_admission.slot(current_user.id):
+        yield
 
 
 def sanitize_gpt_response(response_text: str) -> str:
@@ -32,56 +75,108 @@ def sanitize_gpt_response(response_text: str) -> str:
     return "\n".join(lines).strip()
 
 
-def get_user_day_load(user) -> dict:
+MOCK_GOAL_RESPONSE = {
+    "goal_title": "Построить дом мечты (mock)",
+    "steps": [
+        {
+            "title": "Найти земельный участок (mock)",
+            "description": "",
+            "date": "2025-03-25"
+        },
+        {
+            "title": "Разработать проект (mock)",
+            "description": "",
+            "date": "2025-04-01"
+        }
+    ]
+}
+
+
+def _wants_async(data):
     """
-    Возвращает словарь вида { date: tasks_count }, где date — объект datetime.date,
-    а tasks_count — число задач (steps), назначенных на этот день у данного пользователя.
+    Асинхронный режим включается параметром ?async=1 или полем "async": true в теле.
     """
-    steps = Step.query.join(Goal).filter(Goal.user_id == user.id).all()
-    counts = Counter()
-    for s in steps:
-        if s.date:
-            counts[s.date.date()] += 1
-    return dict(counts)
+    flag = request.args.get("async", "")
+    return flag.lower() in ("1", "true") or data.get("async") is True
 
 
-def find_date_with_min_load(user, proposed_date: datetime.date, max_tasks_per_day=2) -> datetime.date:
+def _enqueue_ai_job(kind, user, payload):
     """
-    Ищет ближайшую дату (начиная с proposed_date), где число задач < max_tasks_per_day.
-    Сдвигается вперёд по одному дню, пока не найдёт достаточно свободный день.
+    Ставит AI-задачу в фоновый пул и сразу отвечает 202 с id задачи.
     """
-    day_load = get_user_day_load(user)
-    candidate_date = proposed_date
-    while day_load.get(candidate_date, 0) >= max_tasks_per_day:
-        candidate_date += timedelta(days=1)
-    return candidate_date
+    job = submit_job(kind, user.id, payload)
+    if job is None:
+        return jsonify({"message": "AI job queue is full, try again later"}), 503
+
+    status_url = url_for("ai_routes.get_ai_job", job_id=job.id)
+    response = jsonify({
+        "message": "Job accepted",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": status_url
+    })
+    response.headers["Location"] = status_url
+    return response, 202
+
+
+def get_user_day_load(user, start=None, end=None) -> dict:
+    """
+    Возвращает словарь вида { date: tasks_count }, где date — объект datetime.date,
+    а tasks_count — число задач (steps), назначенных на этот день у данного пользователя.
+    Читается из таблицы day_loads (при необходимости — только диапазон [start..end]).
+    """
+    return get_day_load(user.id, start=start, end=end)
 
 
-def find_next_free_date(user, proposed_date: datetime.date, exclude_task_id=None) -> datetime.date:
+def parse_busy_period_with_llm(problem, today_date):
     """
-    Ищет полностью свободную дату (без задач) для пользователя.
-    exclude_task_id позволяет исключить текущую задачу из учёта.
+    Разбор периода занятости через GPT (запасной путь для фраз, которые не понял
+    локальный парсер). Если дат нет или ответ некорректен — считаем, что занят завтра.
     """
-    query = Step.query.join(Goal).filter(Goal.user_id == user.id)
-    if exclude_task_id:
-        query = query.filter(Step.id != exclude_task_id)
-    busy_dates = {step.date.date() for step in query.all() if step.date}
-    candidate_date = proposed_date
-    while candidate_date in busy_dates:
-        candidate_date += timedelta(days=1)
-    return candidate_date
+    with _llm_slot():
+        try:
+            parse_prompt = f"""ВНИМАНИЕ! Сегодня {today_date.isoformat()}.
+            Проанализируй следующий запрос и выдели даты занятости в формате JSON:
+            {{"busy_start": "YYYY-MM-DD", "busy_end": "YYYY-MM-DD"}}
+            Если дат нет, верни null для обоих.
+            Запрос: {problem}"""
+
+            parse_message = chat_completion(
+                model="gpt-4o",
+                messages=[{"role": "system", "content": parse_prompt}],
+                temperature=0,
+                max_tokens=350
+            )
+            parse_message = sanitize_gpt_response(parse_message)
+            busy_data = json.loads(parse_message)
+            busy_start_str = busy_data.get("busy_start")
+            busy_end_str = busy_data.get("busy_end")
+            if busy_start_str and busy_end_str:
+                busy_start = datetime.fromisoformat(busy_start_str).date()
+                busy_end = datetime.fromisoformat(busy_end_str).date()
+            else:
+                busy_start = today_date + timedelta(days=1)
+                busy_end = busy_start
+        except Exception as e:
+            logger.exception("Failed to parse busy period, fallback to 'tomorrow'")
+            busy_start = today_date + timedelta(days=1)
+            busy_end = busy_start
+    return busy_start, busy_end
 
 
 @ai_routes.route('/ai/reschedule', methods=['POST'])
 @jwt_required()
+@rate_limit('ai', RATE_LIMIT_AI)
 def reschedule_tasks():
     """
     Эндпоинт для переназначения дат задач с учетом запроса пользователя.
     1. Принимаем текст запроса (например, "Я буду занят с 1 по 20 апреля" или "Я буду занят 4 апреля").
-    2. Через GPT парсим busy_start и busy_end (если не найдено, считаем, что завтра занят).
+    2. Парсим busy_start и busy_end локальными правилами (utils/date_phrases.py), а если фраза
+       не распознана — через GPT (если не найдено, считаем, что завтра занят).
     3. Если задан диапазон (busy_start != busy_end), выбираем задачи, начиная с busy_start.
        Если указан один день (busy_start == busy_end), выбираем задачи в интервале [busy_start, busy_start+3 дня).
-    4. Отправляем GPT системный промпт с требованием:
+    4. Диапазон сдвигается локально (plan_range_shift) с сохранением интервалов между задачами.
+       Если локальный алгоритм не справился (и для одиночной даты) — отправляем GPT системный промпт с требованием:
        - При диапазоне: никакие задачи не могут остаться в периоде [busy_start..busy_end],
          сохранить интервалы между задачами, и при совпадении дат сдвигать дату вперёд.
        - При одиночном запросе: задачи, назначенные на busy_start, нужно перенести на ближайшие свободные дни,
@@ -89,8 +184,7 @@ def reschedule_tasks():
        - Вернуть ТОЛЬКО JSON без комментариев.
     5. Сохраняем новые даты в БД.
     """
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
+    user = current_user.load()
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -99,37 +193,23 @@ def reschedule_tasks():
     if not problem:
         return jsonify({"message": "Field 'problem' is required"}), 400
 
+    if _wants_async(data):
+        return _enqueue_ai_job("reschedule", user, {"problem": problem})
+    return _reschedule_for_user(user, problem)
+
+
+def _reschedule_for_user(user, problem):
+    """
+    Конвейер переноса задач (этапы 1–5 из reschedule_tasks).
+    Выполняется и внутри запроса, и в фоновом воркере (асинхронный режим).
+    """
     today_date = datetime.today().date()
 
-    # ЭТАП 1. Парсинг busy-периода
-    try:
-        parse_prompt = f"""ВНИМАНИЕ! Сегодня {today_date.isoformat()}.
-        Проанализируй следующий запрос и выдели даты занятости в формате JSON:
-        {{"busy_start": "YYYY-MM-DD", "busy_end": "YYYY-MM-DD"}}
-        Если дат нет, верни null для обоих.
-        Запрос: {problem}"""
-
-        parse_response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": parse_prompt}],
-            temperature=0,
-            max_tokens=350
-        )
-        parse_message = parse_response.choices[0].message.content
-        parse_message = sanitize_gpt_response(parse_message)
-        busy_data = json.loads(parse_message)
-        busy_start_str = busy_data.get("busy_start")
-        busy_end_str = busy_data.get("busy_end")
-        if busy_start_str and busy_end_str:
-            busy_start = datetime.fromisoformat(busy_start_str).date()
-            busy_end = datetime.fromisoformat(busy_end_str).date()
-        else:
-            busy_start = today_date + timedelta(days=1)
-            busy_end = busy_start
-    except Exception as e:
-        logger.exception("Failed to parse busy period, fallback to 'tomorrow'")
-        busy_start = today_date + timedelta(days=1)
-        busy_end = busy_start
+    # ЭТАП 1. Парсинг busy-периода: сначала локальными правилами, GPT — только если не распознали
+    busy_period = parse_busy_period(problem, today_date)
+    if busy_period is None:
+        busy_period = parse_busy_period_with_llm(problem, today_date)
+    busy_start, busy_end = busy_period
 
     # Определяем режим запроса: диапазон или один день
     if busy_start == busy_end:
@@ -154,6 +234,45 @@ def reschedule_tasks():
             "message": f"No tasks found for rescheduling starting from {busy_start.isoformat()}"
         }), 404
 
+    # ЭТАП 3. Расчёт новых дат: диапазон сдвигаем локально, остальное (и то, что
+    # локальный алгоритм не смог) — через GPT
+    updates = None
+    solver = "llm"
+    if not single_date_mode and LOCAL_RESCHEDULER_ENABLED:
+        updates = plan_range_shift([(t.id, t.date) for t in tasks], busy_start, busy_end)
+        if updates is not None:
+            solver = "local"
+
+    if updates is None:
+        updates, error = schedule_with_llm(today_date, tasks, busy_start, busy_end, single_date_mode)
+        if error:
+            return error
+        if not single_date_mode:
+            violations = range_shift_violations(
+                [(t.id, t.date) for t in tasks], updates, busy_start, busy_end
+            )
+            if violations:
+                logger.warning("GPT reschedule violates invariants: %s", "; ".join(violations))
+
+    # ЭТАП 4. Применяем обновлённые даты (один SELECT + один bulk UPDATE)
+    updated_tasks = apply_reschedule_updates(user.id, updates)
+    if updated_tasks:
+        bump_data_version(user.id)
+
+    db.session.commit()
+
+    return jsonify({
+        "message": "Tasks rescheduled successfully",
+        "solver": solver,
+        "updated_tasks": updated_tasks
+    }), 200
+
+
+def schedule_with_llm(today_date, tasks, busy_start, busy_end, single_date_mode):
+    """
+    Просит GPT рассчитать новые даты задач.
+    Возвращает (updates, None) либо (None, (response, status)) при ошибке.
+    """
     tasks_info = []
     for t in tasks:
         tasks_info.append({
@@ -166,7 +285,7 @@ def reschedule_tasks():
     if busy_duration < 1:
         busy_duration = 1
 
-    # ЭТАП 3. Формирование промпта для GPT
+    # Формирование промпта для GPT
     if single_date_mode:
         # Для одиночной даты уточняем, что переносим задачи только для указанного дня, с учётом ближайших 2 дней
         system_prompt = f"""ВНИМАНИЕ! Сегодня {today_date.isoformat()}.
@@ -209,68 +328,52 @@ def reschedule_tasks():
 Без комментариев.
 """
 
-    try:
-        schedule_response = openai.ChatCompletion.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": ""}
-            ],
-            temperature=0,
-            max_tokens=10000
-        )
-        schedule_message = schedule_response.choices[0].message.content
-        schedule_message = sanitize_gpt_response(schedule_message)
-    except Exception as e:
-        logger.exception("OpenAI request for schedule generation failed")
-        return jsonify({
-            "message": "Failed to reach OpenAI for schedule generation",
-            "error": str(e)
-        }), 500
+    with _llm_slot():
+        try:
+            schedule_message = chat_completion(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": ""}
+                ],
+                temperature=0,
+                max_tokens=10000,
+                deadline=OPENAI_LONG_TIMEOUT_SECONDS
+            )
+            schedule_message = sanitize_gpt_response(schedule_message)
+        except OpenAIUnavailable as e:
+            logger.warning("OpenAI unavailable for schedule generation: %s", e)
+            return None, (jsonify({
+                "message": "OpenAI is temporarily unavailable, try again later",
+                "error": str(e)
+            }), 503)
+        except Exception as e:
+            logger.exception("OpenAI request for schedule generation failed")
+            return None, (jsonify({
+                "message": "Failed to reach OpenAI for schedule generation",
+                "error": str(e)
+            }), 500)
 
     try:
         schedule_data = json.loads(schedule_message)
     except Exception:
-        return jsonify({
+        return None, (jsonify({
             "message": "OpenAI returned invalid JSON for schedule generation",
             "raw_response": schedule_message
-        }), 500
+        }), 500)
 
     if "updates" not in schedule_data:
-        return jsonify({
+        return None, (jsonify({
             "message": "AI response missing 'updates' field",
             "raw_response": schedule_message
-        }), 500
-
-    # ЭТАП 4. Применяем обновлённые даты
-    updated_tasks = []
-    for update in schedule_data["updates"]:
-        task_id = update.get("task_id")
-        new_date_str = update.get("new_date")
-        try:
-            new_date = datetime.fromisoformat(new_date_str)
-        except Exception:
-            new_date = None
-
-        task = Step.query.get(task_id)
-        if task and task.goal.user_id == user.id and new_date:
-            corrected_date = find_next_free_date(user, new_date.date(), exclude_task_id=task.id)
-            task.date = datetime.combine(corrected_date, datetime.min.time())
-            updated_tasks.append({
-                "task_id": task_id,
-
-            })
-
-    db.session.commit()
+        }), 500)
 
-    return jsonify({
-        "message": "Tasks rescheduled successfully",
-        "updated_tasks": updated_tasks  
-    }), 200
+    return schedule_data["updates"], None
 
 
 @ai_routes.route('/ai/generate-goal', methods=['POST'])
 @jwt_required()
+@rate_limit('ai', RATE_LIMIT_AI)
 def generate_goal():
     """
     Создание новой цели с шагами, равномерно распределяем шаги по дням,
@@ -278,8 +381,7 @@ def generate_goal():
     1) GPT генерирует goal_title и steps[] с датами.
     2) Проверяем загрузку: если день перегружен, сдвигаем шаг вперёд.
     """
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
+    user = current_user.load()
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -288,12 +390,17 @@ def generate_goal():
     if not user_prompt:
         return jsonify({"message": "user_prompt is required"}), 400
 
-    if not OPENAI_API_KEY:
-        logger.warning("OPENAI_API_KEY is missing")
-        return _create_goal_from_mock(user)
+    if _wants_async(data):
+        return _enqueue_ai_job("generate_goal", user, {"user_prompt": user_prompt})
+    return _generate_goal_for_user(user, user_prompt)
+
 
+def _build_generate_goal_prompt(user, user_prompt):
+    """
+    Системный промпт для генерации цели с учётом текущей загрузки дней пользователя.
+    """
     today = datetime.today().strftime("%Y-%m-%d")
-    day_load_dict = get_user_day_load(user)
+    day_load_dict = get_user_day_load(user, start=datetime.today().date())
     day_load_list = [{"date": d.isoformat(), "tasks_count": c}
                      for d, c in sorted(day_load_dict.items())]
 
@@ -340,20 +447,37 @@ def generate_goal():
 
 Повторяю: никаких пояснений, только JSON по указанной структуре!
 """
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": system_prompt}
-            ],
-            temperature=0,
-            max_tokens=2000
-        )
-        gpt_message = response.choices[0].message.content
-        gpt_message = sanitize_gpt_response(gpt_message)
-    except Exception as e:
-        logger.exception("OpenAI request for generate-goal with free days failed")
-        return jsonify({"message": "Failed to reach OpenAI", "error": str(e)}), 500
+    return system_prompt
+
+
+def _generate_goal_for_user(user, user_prompt):
+    """
+    Конвейер генерации цели: промпт -> GPT -> сохранение цели и шагов.
+    Выполняется и внутри запроса, и в фоновом воркере (асинхронный режим).
+    """
+    if not OPENAI_API_KEY and not OPENAI_STUB:
+        logger.warning("OPENAI_API_KEY is missing")
+        return _create_goal_from_mock(user)
+
+    system_prompt = _build_generate_goal_prompt(user, user_prompt)
+    with _llm_slot():
+        try:
+            gpt_message = chat_completion(
+                model="gpt-4.1",
+                messages=[
+                    {"role": "system", "content": system_prompt}
+                ],
+                temperature=0,
+                max_tokens=2000,
+                deadline=OPENAI_LONG_TIMEOUT_SECONDS
+            )
+            gpt_message = sanitize_gpt_response(gpt_message)
+        except OpenAIUnavailable as e:
+            logger.warning("OpenAI unavailable for generate-goal: %s", e)
+            return jsonify({"message": "OpenAI is temporarily unavailable, try again later", "error": str(e)}), 503
+        except Exception as e:
+            logger.exception("OpenAI request for generate-goal with free days failed")
+            return jsonify({"message": "Failed to reach OpenAI", "error": str(e)}), 500
 
     try:
         ai_data = json.loads(gpt_message)
@@ -373,51 +497,192 @@ def generate_goal():
 
 
 
-def _create_goal_and_steps_from_ai(user, ai_data):
+@ai_routes.route('/ai/generate-goal/stream', methods=['POST'])
+@jwt_required()
+@rate_limit('ai', RATE_LIMIT_AI)
+def generate_goal_stream():
     """
-    Вспомогательная функция для сохранения новой цели и её шагов,
-    с дополнительной проверкой загрузки дня. Если на день уже 2 задачи, сдвигаем шаг вперёд.
+    Потоковый вариант generate-goal (Server-Sent Events).
+    Ответ OpenAI разбирается по мере поступления: каждый шаг, как только его объект
+    в "steps" закрылся, раскладывается по календарю и сразу отправляется клиенту
+    событием "step". Шаги пишутся в БД пачками по STREAM_STEPS_BATCH_SIZE,
+    цель коммитится в конце потока (событие "done" с goal_id).
+    События: goal {"goal_title"}, step {"index", "title", "description", "date"},
+    done {"goal_id", "steps"}, error {"message"}.
     """
-    goal_title = ai_data.get("goal_title", "Новая цель")
-    steps_data = ai_data.get("steps", [])
+    user = current_user.load()
+    if not user:
+        return jsonify({"message": "User not found"}), 404
 
+    data = request.get_json() or {}
+    user_prompt = data.get('user_prompt', "").strip()
+    if not user_prompt:
+        return jsonify({"message": "user_prompt is required"}), 400
+
+    if not OPENAI_API_KEY and not OPENAI_STUB:
+        logger.warning("OPENAI_API_KEY is missing")
+        chunks = iter([json.dumps(MOCK_GOAL_RESPONSE, ensure_ascii=False)])
+    else:
+        chunks = None
+
+    # Ответ OpenAI читается, пока поток отдаётся клиенту, поэтому слот admission control
+    # освобождает закрытие ответа (в том числе при обрыве соединения до первого события)
+    holds_slot = _uses_openai()
+    if holds_slot:
+        ai_admission.acquire(user.id)
+    try:
+        if chunks is None:
+            chunks = chat_completion_stream(
+                model="gpt-4.1",
+                messages=[{"role": "system", "content": _build_generate_goal_prompt(user, user_prompt)}],
+                temperature=0,
+                max_tokens=2000,
+                deadline=OPENAI_LONG_TIMEOUT_SECONDS
+            )
+
+        response = Response(
+            stream_with_context(_stream_goal_events(user, chunks)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    except Exception:
+        if holds_slot:
+            ai_admission.release(user.id)
+        raise
+    if holds_slot:
+        response.call_on_close(lambda: ai_admission.release(user.id))
+    return response
+
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _stream_goal_events(user, chunks):
+    default_date = datetime.today().date() + timedelta(days=1)
+    parser = StepsStreamParser()
+    new_goal = _new_ai_goal(user, "Новая цель")
+    calendar = DayLoadCalendar.load(user.id, start=datetime.today().date(), max_tasks=AI_MAX_TASKS_PER_DAY)
+    pending_rows = []
+
+    try:
+        for chunk in chunks:
+            for kind, value in parser.feed(chunk):
+                if kind == "goal_title":
+                    new_goal.title = value
+                    yield _sse("goal", {"goal_title": value})
+                    continue
+
+                day = calendar.place(_ai_step_date(value, default_date))
+                row = _ai_step_row(new_goal.id, value, day)
+                pending_rows.append(row)
+                yield _sse("step", {
+                    "index": parser.steps_count - 1,
+                    "title": row["title"],
+                    "description": row["description"],
+                    "date": day.isoformat()
+                })
+
+                if len(pending_rows) >= STREAM_STEPS_BATCH_SIZE:
+                    db.session.execute(db.insert(Step), pending_rows)
+                    pending_rows = []
+
+        if parser.goal_title is None or parser.steps_count == 0:
+            db.session.rollback()
+            yield _sse("error", {"message": "AI response JSON missing required fields (goal_title, steps)."})
+            return
+
+        if pending_rows:
+            db.session.execute(db.insert(Step), pending_rows)
+        bump_day_loads(user.id, calendar.added)
+        bump_data_version(user.id)
+        new_goal.total_steps = parser.steps_count
+        new_goal.done_steps = 0
+        db.session.commit()
+    except Exception as e:
+        logger.exception("Streaming generate-goal failed")
+        db.session.rollback()
+        yield _sse("error", {"message": "Failed to generate goal", "error": str(e)})
+        return
+
+    yield _sse("done", {"goal_id": new_goal.id, "steps": parser.steps_count})
+
+
+def _new_ai_goal(user, title):
+    """
+    Создаёт (flush, без commit) цель для AI-шагов со свободным пастельным цветом.
+    """
     user_goals = Goal.query.filter_by(user_id=user.id).all()
     used_colors = [g.color for g in user_goals if g.color]
     color = get_unique_pastel_color(used_colors) or "#D3D3D3"
 
     new_goal = Goal(
         user_id=user.id,
-        title=goal_title,
+        title=title,
         description="",
         color=color
     )
     db.session.add(new_goal)
     db.session.flush()
+    return new_goal
 
-    MAX_TASKS_PER_DAY = 2
 
-    for step_info in steps_data:
-        raw_date = step_info.get("date")
-        try:
-            base_date = datetime.fromisoformat(raw_date).date() if raw_date else None
-        except ValueError:
-            base_date = None
-
-        if base_date is None:
-            base_date = datetime.today().date() + timedelta(days=1)
-
-        correct_date = find_date_with_min_load(user, base_date, max_tasks_per_day=MAX_TASKS_PER_DAY)
-        new_step = Step(
-            goal_id=new_goal.id,
-            title=step_info.get("title") or "Без названия",
-            description=step_info.get("description") or "",
-            date=datetime.combine(correct_date, datetime.min.time())
-        )
-        db.session.add(new_step)
+def _ai_step_date(step_info, default_date):
+    """
+    Дата, предложенная GPT для шага (или default_date, если её нет или она некорректна).
+    """
+    raw_date = step_info.get("date")
+    try:
+        base_date = datetime.fromisoformat(raw_date).date() if raw_date else None
+    except (TypeError, ValueError):
+        base_date = None
+    return base_date or default_date
+
+
+def _ai_step_row(goal_id, step_info, day):
+    return {
+        "goal_id": goal_id,
+        "title": step_info.get("title") or "Без названия",
+        "description": step_info.get("description") or "",
+        "status": "planned",
+        "date": datetime.combine(day, datetime.min.time())
+    }
 
-    db.session.commit()
 
-    new_goal.update_progress()
+def _create_goal_and_steps_from_ai(user, ai_data):
+    """
+    Вспомогательная функция для сохранения новой цели и её шагов,
+    с дополнительной проверкой загрузки дня. Если на день уже 2 задачи, сдвигаем шаг вперёд.
+    Шаги раскладываются за один проход по календарю в памяти и пишутся одним bulk INSERT.
+    """
+    goal_title = ai_data.get("goal_title", "Новая цель")
+    steps_data = ai_data.get("steps", [])
+
+    new_goal = _new_ai_goal(user, goal_title)
+
+    default_date = datetime.today().date() + timedelta(days=1)
+    base_dates = [_ai_step_date(step_info, default_date) for step_info in steps_data]
+
+    # Календарь загружается один раз, дальше шаги раскладываются в памяти,
+    # и каждый размещённый шаг сразу учитывается при размещении следующих.
+    calendar = DayLoadCalendar.load(
+        user.id,
+        start=min(base_dates, default=default_date),
+        max_tasks=AI_MAX_TASKS_PER_DAY
+    )
+    step_rows = [
+        _ai_step_row(new_goal.id, step_info, calendar.place(base_date))
+        for step_info, base_date in zip(steps_data, base_dates)
+    ]
+
+    if step_rows:
+        db.session.execute(db.insert(Step), step_rows)
+    bump_day_loads(user.id, calendar.added)
+    bump_data_version(user.id)
+
+    # Все новые шаги в статусе 'planned' — выполненных нет
+    new_goal.total_steps = len(step_rows)
+    new_goal.done_steps = 0
     db.session.commit()
 
     return jsonify({
@@ -430,19 +695,41 @@ def _create_goal_from_mock(user):
     """
     Если нет OPENAI_API_KEY, возвращаем тестовый пример.
     """
-    mock_response = {
-        "goal_title": "Построить дом мечты (mock)",
-        "steps": [
-            {
-                "title": "Найти земельный участок (mock)",
-                "description": "",
-                "date": "2025-03-25"
-            },
-            {
-                "title": "Разработать проект (mock)",
-                "description": "",
-                "date": "2025-04-01"
-            }
-        ]
-    }
-    return _create_goal_and_steps_from_ai(user, mock_response)
+    return _create_goal_and_steps_from_ai(user, MOCK_GOAL_RESPONSE)
+
+
+@ai_routes.route('/ai/metrics', methods=['GET'])
+@jwt_required()
+@operator_required
+def ai_metrics():
+    """
+    Счётчики AI-подсистемы (кэш ответов LLM и т.п.). Только для операторов.
+    """
+    return jsonify({
+        "llm_cache": completion_cache.stats(),
+        "openai_client": openai_client.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "admission": ai_admission.stats()
+    }), 200
+
+
+@ai_routes.route('/ai/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+@rate_limit('ai_jobs', RATE_LIMIT_AI_JOBS)
+def get_ai_job(job_id):
+    """
+    Статус и результат асинхронной AI-задачи.
+    status: queued | running | done | failed; result — тело ответа, которое вернул бы
+    синхронный эндпоинт, http_status — его код.
+    """
+    current_user_id = int(get_jwt_identity())
+    job = AIJob.query.filter_by(id=job_id, user_id=current_user_id).first()
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    expire_stale_job(job)
+    return jsonify(job_to_dict(job)), 200
+
+
+register_job_handler("reschedule", lambda user, payload: _reschedule_for_user(user, payload["problem"]))
+register_job_handler("generate_goal", lambda user, payload: _generate_goal_for_user(user, payload["user_prompt"]))
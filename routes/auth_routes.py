@@ -1,10 +1,15 @@
 from flask import Blueprint, request, jsonify
-from flask_mail import Message
 from datetime import datetime, timedelta
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from extensions import mail, db
+from flask_jwt_extended import create_access_token, jwt_required, current_user
+from extensions import db
 from models.user_model import User
 from models.goal_model import Goal
+from utils.email_outbox import enqueue_email, wake_email_dispatcher
+from utils.passwords import PasswordHasherBusy
+from utils.rate_limit import rate_limit
+from config.settings import (
+    RATE_LIMIT_LOGIN, RATE_LIMIT_REGISTER, RATE_LIMIT_PASSWORD_RESET, RATE_LIMIT_PASSWORD_RESET_CONFIRM
+)
 import re
 
 auth_routes = Blueprint('auth', __name__)
@@ -14,7 +19,12 @@ PASSWORD_REGEX = re.compile(
     r"^(?=.*[a-z])(?=.*[A-Z])[a-zA-Z0-9]{7,}$"
 )
 
+@auth_routes.errorhandler(PasswordHasherBusy)
+def password_hasher_busy(e):
+    return jsonify({"message": "Server is busy, try again later"}), 503
+
 @auth_routes.route('/register', methods=['POST'])
+@rate_limit('register', RATE_LIMIT_REGISTER)
 def register():
     data = request.get_json()
 
@@ -57,6 +67,7 @@ def register():
     return jsonify({"message": "User registered successfully"}), 201
 
 @auth_routes.route('/login', methods=['POST'])
+@rate_limit('login', RATE_LIMIT_LOGIN)
 def login():
     data = request.get_json()
     email = data.get('email')
@@ -69,6 +80,11 @@ def login():
     if not user or not user.check_password(password):
         return jsonify({"message": "Invalid email or password"}), 401
 
+    # Хэш со старой стоимостью (PASSWORD_HASH_METHOD поменяли) пересчитываем, пока пароль под рукой
+    if user.password_needs_rehash():
+        user.set_password(password)
+        db.session.commit()
+
     access_token = create_access_token(
         identity=str(user.id),
         expires_delta=timedelta(hours=10)
@@ -80,11 +96,13 @@ def login():
     }), 200
 
 @auth_routes.route('/recover-password', methods=['POST'])
+@rate_limit('password_reset', RATE_LIMIT_PASSWORD_RESET)
 def recover_password():
     """
     Генерируем/высылаем одноразовый код на почту.
     Если пользователь нажал "Отправить код ещё раз" — проверяем, прошло ли не меньше 1 минуты
-    с момента последней отправки (reset_token_sent_at).
+    с момента последней отправки (reset_token_sent_at). Частые повторы на один адрес
+    отсекает ещё до запроса к БД лимит email из RATE_LIMIT_PASSWORD_RESET.
     """
     data = request.get_json()
     email = data.get('email')
@@ -104,27 +122,26 @@ def recover_password():
                 "message": "A code was sent recently. Please wait at least 1 minute before requesting again."
             }), 400
 
-    # Генерируем новый код (или продлеваем срок)
+    # Генерируем новый код (или продлеваем срок); письмо уходит в outbox в той же транзакции,
+    # отправит его фоновый диспетчер (utils/email_outbox.py)
     user.generate_reset_token(expires_in=30)
-    db.session.commit()
-
-    code = user.reset_token
-
-    msg = Message(
+    enqueue_email(
         subject="Password Recovery",
         sender="WhatImTodo App",
         recipients=[user.email],
         body=(
             f"Hello, {user.name}!\n\n"
-            f"Your one-time code for password reset is: {code}\n\n"
+            f"Your one-time code for password reset is: {user.reset_token}\n\n"
             "This code is valid for 30 minutes. If you didn't request a password reset, just ignore this email."
         )
     )
-    mail.send(msg)
+    db.session.commit()
+    wake_email_dispatcher()
 
     return jsonify({"message": "Recovery email has been sent"}), 200
 
 @auth_routes.route('/reset-password', methods=['POST'])
+@rate_limit('password_reset_confirm', RATE_LIMIT_PASSWORD_RESET_CONFIRM)
 def reset_password():
     """
     При сбросе пароля дополнительно проверяем сложность нового пароля.
@@ -159,8 +176,7 @@ def reset_password():
 @auth_routes.route('/protected', methods=['GET'])
 @jwt_required()
 def protected_route():
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
+    user = current_user.load()
 
     if not user:
         return jsonify({"message": "User not found"}), 404
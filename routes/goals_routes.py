@@ -1,15 +1,125 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, current_user
 from extensions import db
 from models.goal_model import Goal
 from models.step_model import Step
-from models.user_model import User
-from datetime import datetime
+from collections import Counter
+from datetime import date, datetime, timedelta
 from utils.color_utils import get_unique_pastel_color
-from dateutil.parser import isoparse
+from utils.day_load import track_step_dates, bump_day_loads, count_days, goal_day_counts
+from utils.goal_counters import bump_step_counters, done_delta
+from utils.data_version import bump_data_version, conditional_on_data_version
+from utils.identity import identity_cache, operator_required
+from utils.response_cache import response_cache
+from utils.step_import import (
+    IMPORT_PARSERS, IMPORT_STEP_TITLE, StepImportError, import_event_stream, import_steps, parse_import_events
+)
+from utils.pagination import (
+    ListingParamsError, NEXT_CURSOR_HEADER, parse_fields, parse_page, decode_cursor, encode_cursor
+)
+from utils.serializers import (
+    GOAL_FIELDS, STEP_FIELDS, json_response, parent_columns, parent_values, row_serializer, serialize_rows,
+    split_step_fields
+)
 
 goals_routes = Blueprint('goals_routes', __name__)
 
+
+def _select_fields(mapping, fields):
+    """
+    SELECT только запрошенных полей. Для шагов цель всегда присоединена (goal_name, color, владелец).
+    """
+    stmt = db.select(*[mapping[name].label(name) for name in fields])
+    if mapping is STEP_FIELDS:
+        return stmt.select_from(Step).join(Goal, Step.goal_id == Goal.id)
+    return stmt.select_from(Goal)
+
+
+def _goals_page_query(user_id, fields, limit, cursor):
+    """
+    Цели пользователя; при пагинации — по убыванию (updated_at, id), начиная после курсора.
+    """
+    stmt = (
+        _select_fields(GOAL_FIELDS, fields)
+        .add_columns(Goal.updated_at.label("_sort"), Goal.id.label("_id"))
+        .where(Goal.user_id == user_id)
+    )
+    if limit is None:
+        return stmt
+    if cursor:
+        updated_at, goal_id = decode_cursor(cursor, (datetime, int))
+        stmt = stmt.where(db.tuple_(Goal.updated_at, Goal.id) < (updated_at, goal_id))
+    return stmt.order_by(Goal.updated_at.desc(), Goal.id.desc()).limit(limit + 1)
+
+
+def _steps_page_query(stmt, limit, cursor, order_by_date=False):
+    """
+    Шаги по возрастанию (date, id), шаги без даты — в конце (одинаково в Postgres и SQLite).
+    Без пагинации порядок по id, если не указан order_by_date.
+    """
+    stmt = stmt.add_columns(Step.date.label("_sort"), Step.id.label("_id"))
+    if limit is None:
+        return stmt.order_by(Step.date, Step.id) if order_by_date else stmt.order_by(Step.id)
+    if cursor:
+        date_val, step_id = decode_cursor(cursor, (datetime, int))
+        if date_val is None:
+            stmt = stmt.where(Step.date.is_(None), Step.id > step_id)
+        else:
+            stmt = stmt.where(db.or_(
+                Step.date > date_val,
+                db.and_(Step.date == date_val, Step.id > step_id),
+                Step.date.is_(None)
+            ))
+    return stmt.order_by(Step.date.is_(None), Step.date, Step.id).limit(limit + 1)
+
+
+def _parse_date_window(args):
+    """
+    (начало, конец) из ?from=YYYY-MM-DD&to=YYYY-MM-DD, оба дня включительно.
+    """
+    try:
+        start = date.fromisoformat(args['from'])
+        end = date.fromisoformat(args['to'])
+    except KeyError:
+        raise ListingParamsError("Fields 'from' and 'to' are required")
+    except ValueError:
+        raise ListingParamsError("Fields 'from' and 'to' must be dates (YYYY-MM-DD)")
+    if start > end:
+        raise ListingParamsError("Field 'from' must not be after 'to'")
+    return start, end
+
+
+def steps_in_range_query(user_id, start, end, statuses=None, fields=None):
+    """
+    Шаги пользователя с датой в [start, end]. Владелец проверяется в SQL (JOIN goals),
+    по дате — полуинтервал по самой колонке, чтобы работал индекс ix_steps_goal_id_date.
+    """
+    stmt = _select_fields(STEP_FIELDS, fields or list(STEP_FIELDS)).where(
+        Goal.user_id == user_id,
+        Step.date >= datetime.combine(start, datetime.min.time()),
+        Step.date < datetime.combine(end + timedelta(days=1), datetime.min.time())
+    )
+    if statuses:
+        stmt = stmt.where(Step.status.in_(statuses))
+    return stmt
+
+
+def _split_page(rows, limit):
+    """
+    Отрезает лишнюю (limit + 1)-ю строку и возвращает (строки, курсор следующей страницы или None).
+    """
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]._sort, rows[-1]._id)
+
+
+def _listing_response(body, next_cursor):
+    response = json_response(body)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response, 200
+
 @goals_routes.route('/goals', methods=['POST'])
 @jwt_required()
 def create_goal():
@@ -25,8 +135,7 @@ def create_goal():
       ]
     }
     """
-    current_user_id = int(get_jwt_identity())
-    user = User.query.get(current_user_id)
+    user = current_user.load()
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -56,6 +165,7 @@ def create_goal():
     db.session.flush()  # чтобы у new_goal появился ID
 
     # Создаём шаги
+    step_dates = []
     for step_info in steps_data:
         step_title = step_info.get('title')
         if not step_title:
@@ -71,10 +181,13 @@ def create_goal():
             date=date_val
         )
         db.session.add(new_step)
+        step_dates.append(date_val)
 
-    db.session.commit()
-
-    new_goal.update_progress()
+    # Цель создана в этой же транзакции — счётчики можно выставить напрямую
+    new_goal.total_steps = len(step_dates)
+    new_goal.done_steps = 0
+    bump_day_loads(user.id, count_days(step_dates))
+    bump_data_version(user.id)
     db.session.commit()
 
     return jsonify({
@@ -85,167 +198,187 @@ def create_goal():
 
 @goals_routes.route('/goals', methods=['GET'])
 @jwt_required()
+@conditional_on_data_version
 def get_goals():
     """
     Возвращает все цели пользователя (без деталей шагов).
+    Необязательные параметры:
+      ?fields=id,title,color,progress — только эти поля (см. GOAL_FIELDS);
+      ?limit=N&cursor=... — постранично, от недавно изменённых; курсор следующей
+      страницы приходит в заголовке X-Next-Cursor.
     """
     current_user_id = int(get_jwt_identity())
-    goals = Goal.query.filter_by(user_id=current_user_id).all()
+    try:
+        fields = parse_fields(request.args.get('fields'), GOAL_FIELDS)
+        limit, cursor = parse_page(request.args)
+        stmt = _goals_page_query(current_user_id, fields, limit, cursor)
+    except ListingParamsError as e:
+        return jsonify({"message": str(e)}), 400
 
-    result = []
-    for g in goals:
-        result.append({
-            "id": g.id,
-            "title": g.title,
-            "description": g.description,
-            "color": g.color,
-            "progress": g.progress,
-            "created_at": g.created_at.isoformat(),
-            "updated_at": g.updated_at.isoformat()
-        })
-
-    return jsonify(result), 200
+    rows, next_cursor = _split_page(db.session.execute(stmt).all(), limit)
+    return _listing_response(serialize_rows(stmt, rows), next_cursor)
 
 @goals_routes.route('/goals/<int:goal_id>', methods=['GET'])
 @jwt_required()
+@conditional_on_data_version
 def get_goal_detail(goal_id):
     """
     Возвращает полную информацию по одной цели, включая шаги.
+    Необязательные параметры: ?fields= (поля цели), ?step_fields= (поля шагов),
+    ?limit=N&cursor=... — шаги постранично в порядке (date, id), курсор в X-Next-Cursor.
     """
     current_user_id = int(get_jwt_identity())
-    goal = Goal.query.filter_by(id=goal_id, user_id=current_user_id).first()
+    try:
+        fields = parse_fields(request.args.get('fields'), GOAL_FIELDS)
+        step_fields, inherited = split_step_fields(
+            parse_fields(request.args.get('step_fields'), STEP_FIELDS)
+        )
+        limit, cursor = parse_page(request.args)
+        steps_stmt = _steps_page_query(
+            _select_fields(STEP_FIELDS, step_fields).where(Step.goal_id == goal_id),
+            limit,
+            cursor
+        )
+    except ListingParamsError as e:
+        return jsonify({"message": str(e)}), 400
+
+    goal_stmt = (
+        _select_fields(GOAL_FIELDS, fields)
+        .add_columns(*parent_columns(inherited))
+        .where(Goal.id == goal_id, Goal.user_id == current_user_id)
+    )
+    goal = db.session.execute(goal_stmt).first()
     if not goal:
         return jsonify({"message": "Goal not found"}), 404
 
-    steps_data = []
-    for s in goal.steps:
-        steps_data.append({
-            "id": s.id,
-            "goal_id": goal.id,
-            "goal_name": goal.title,
-            "color": goal.color,
-            "title": s.title,
-            "description": s.description,
-            "status": s.status,
-            "date": s.date.isoformat() if s.date else None,
-            "created_at": s.created_at.isoformat(),
-            "updated_at": s.updated_at.isoformat()
-        })
-
-    data = {
-        "id": goal.id,
-        "title": goal.title,
-        "description": goal.description,
-        "color": goal.color,
-        "progress": goal.progress,
-        "created_at": goal.created_at.isoformat(),
-        "updated_at": goal.updated_at.isoformat(),
-        "steps": steps_data
-    }
-    return jsonify(data), 200
+    steps, next_cursor = _split_page(db.session.execute(steps_stmt).all(), limit)
+    data = row_serializer(goal_stmt)(goal)
+    data["steps"] = serialize_rows(steps_stmt, steps, parent_values(goal, inherited))
+    return _listing_response(data, next_cursor)
 
 @goals_routes.route('/goals/<int:goal_id>/info', methods=['GET'])
 @jwt_required()
+@conditional_on_data_version
 def get_goal_without_steps(goal_id):
     """
     Возвращает информацию по одной цели без подробностей шагов.
     """
     current_user_id = int(get_jwt_identity())
-    goal = Goal.query.filter_by(id=goal_id, user_id=current_user_id).first()
+    stmt = _select_fields(GOAL_FIELDS, GOAL_FIELDS).where(Goal.id == goal_id, Goal.user_id == current_user_id)
+    goal = db.session.execute(stmt).first()
     if not goal:
         return jsonify({"message": "Goal not found"}), 404
 
-    data = {
-        "id": goal.id,
-        "title": goal.title,
-        "description": goal.description,
-        "color": goal.color,
-        "progress": goal.progress,
-        "created_at": goal.created_at.isoformat(),
-        "updated_at": goal.updated_at.isoformat()
-    }
-    return jsonify(data), 200
+    return json_response(row_serializer(stmt)(goal)), 200
 
 @goals_routes.route('/goals/<int:goal_id>/steps/<int:step_id>', methods=['GET'])
 @jwt_required()
+@conditional_on_data_version
 def get_goal_step_detail(goal_id, step_id):
     current_user_id = int(get_jwt_identity())
-    goal = Goal.query.filter_by(id=goal_id, user_id=current_user_id).first()
+    step_fields, inherited = split_step_fields(STEP_FIELDS)
+    goal_stmt = (
+        _select_fields(GOAL_FIELDS, GOAL_FIELDS)
+        .add_columns(*parent_columns(inherited))
+        .where(Goal.id == goal_id, Goal.user_id == current_user_id)
+    )
+    goal = db.session.execute(goal_stmt).first()
     if not goal:
         return jsonify({"message": "Goal not found"}), 404
 
-    step = next((s for s in goal.steps if s.id == step_id), None)
+    step_stmt = _select_fields(STEP_FIELDS, step_fields).where(Step.id == step_id, Step.goal_id == goal_id)
+    step = db.session.execute(step_stmt).first()
     if not step:
         return jsonify({"message": "Step not found in goal"}), 404
 
-    goal.update_progress()
-    db.session.commit()
-
-    step_data = {
-        "id": step.id,
-        "goal_id": step.goal_id,
-        "goal_name": goal.title,
-        "color": goal.color,
-        "title": step.title,
-        "description": step.description,
-        "status": step.status,
-        "date": step.date.isoformat() if step.date else None,
-        "created_at": step.created_at.isoformat(),
-        "updated_at": step.updated_at.isoformat()
-    }
-
-    data = {
-        "id": goal.id,
-        "title": goal.title,
-        "description": goal.description,
-        "color": goal.color,
-        "progress": goal.progress,
-        "created_at": goal.created_at.isoformat(),
-        "updated_at": goal.updated_at.isoformat(),
-        "steps": [step_data]
-    }
-    return jsonify(data), 200
-
-
+    data = row_serializer(goal_stmt)(goal)
+    data["steps"] = [row_serializer(step_stmt)(step, parent_values(goal, inherited))]
+    return json_response(data), 200
 
 
 @goals_routes.route('/goals/with-steps', methods=['GET'])
 @jwt_required()
+@conditional_on_data_version
 def get_goals_with_steps():
     """
     Возвращает все цели пользователя вместе со всеми шагами для каждой цели.
+    Шаги всех целей страницы выбираются одним дополнительным запросом, а не по запросу на цель.
+    Параметры те же, что у GET /goals, плюс ?step_fields= для полей шагов.
     """
     current_user_id = int(get_jwt_identity())
-    goals = Goal.query.filter_by(user_id=current_user_id).all()
+    try:
+        fields = parse_fields(request.args.get('fields'), GOAL_FIELDS)
+        step_fields, inherited = split_step_fields(
+            parse_fields(request.args.get('step_fields'), STEP_FIELDS)
+        )
+        limit, cursor = parse_page(request.args)
+        stmt = _goals_page_query(current_user_id, fields, limit, cursor).add_columns(*parent_columns(inherited))
+    except ListingParamsError as e:
+        return jsonify({"message": str(e)}), 400
+
+    goals, next_cursor = _split_page(db.session.execute(stmt).all(), limit)
+    # goal_name/color шагов не выбираются повторно, а берутся у цели
+    parents = {goal._id: parent_values(goal, inherited) for goal in goals}
+    steps_by_goal = {goal._id: [] for goal in goals}
+    if goals:
+        steps_stmt = (
+            _select_fields(STEP_FIELDS, step_fields)
+            .add_columns(Step.goal_id.label("_goal_id"))
+            .where(Goal.user_id == current_user_id)
+            .order_by(Step.id)
+        )
+        if limit is not None:
+            steps_stmt = steps_stmt.where(Step.goal_id.in_(list(steps_by_goal)))
+        serialize_step = row_serializer(steps_stmt)
+        for step in db.session.execute(steps_stmt):
+            steps_by_goal[step._goal_id].append(serialize_step(step, parents[step._goal_id]))
 
+    serialize_goal = row_serializer(stmt)
     result = []
-    for g in goals:
-        steps_data = []
-        for s in g.steps:
-            steps_data.append({
-                "id": s.id,
-                "goal_id": g.id,
-                "goal_name": g.title,
-                "color": g.color,
-                "title": s.title,
-                "description": s.description,
-                "status": s.status,
-                "date": s.date.isoformat() if s.date else None,
-                "created_at": s.created_at.isoformat(),
-                "updated_at": s.updated_at.isoformat()
-            })
-        result.append({
-            "id": g.id,
-            "title": g.title,
-            "description": g.description,
-            "color": g.color,
-            "progress": g.progress,
-            "created_at": g.created_at.isoformat(),
-            "updated_at": g.updated_at.isoformat(),
-            "steps": steps_data
-        })
-
-    return jsonify(result), 200
+    for goal in goals:
+        data = serialize_goal(goal)
+        data["steps"] = steps_by_goal[goal._id]
+        result.append(data)
+    return _listing_response(result, next_cursor)
+
+@goals_routes.route('/steps', methods=['GET'])
+@jwt_required()
+@conditional_on_data_version
+def get_steps_in_range():
+    """
+    Шаги пользователя в окне дат (для календаря), по возрастанию (date, id).
+    Параметры:
+      ?from=2025-03-01&to=2025-03-31 — обязательны, оба дня включительно;
+      ?status=planned,done — необязательный фильтр по статусу;
+      ?fields=, ?limit=&cursor= — как у остальных списков, курсор в X-Next-Cursor.
+    """
+    current_user_id = int(get_jwt_identity())
+    try:
+        start, end = _parse_date_window(request.args)
+        fields = parse_fields(request.args.get('fields'), STEP_FIELDS)
+        limit, cursor = parse_page(request.args)
+        statuses = [s.strip() for s in request.args.get('status', '').split(',') if s.strip()]
+        stmt = _steps_page_query(
+            steps_in_range_query(current_user_id, start, end, statuses, fields),
+            limit,
+            cursor,
+            order_by_date=True
+        )
+    except ListingParamsError as e:
+        return jsonify({"message": str(e)}), 400
+
+    steps, next_cursor = _split_page(db.session.execute(stmt).all(), limit)
+    return _listing_response(serialize_rows(stmt, steps), next_cursor)
+
+@goals_routes.route('/goals/metrics', methods=['GET'])
+@jwt_required()
+@operator_required
+def goals_metrics():
+    """
+    Статистика кэшей читающего пути (в пределах процесса): готовые ответы и пользователи из JWT.
+    Попадания identity_cache — сэкономленные запросы к users. Только для операторов.
+    """
+    return jsonify({"response_cache": response_cache.stats(), "identity_cache": identity_cache.stats()}), 200
 
 @goals_routes.route('/goals/<int:goal_id>', methods=['PUT', 'PATCH'])
 @jwt_required()
@@ -270,6 +403,7 @@ def update_goal(goal_id):
     if color:
         goal.color = color
 
+    bump_data_version(current_user_id)
     db.session.commit()
     return jsonify({"message": "Goal updated"}), 200
 
@@ -284,6 +418,9 @@ def delete_goal(goal_id):
     if not goal:
         return jsonify({"message": "Goal not found"}), 404
 
+    freed_days = {day: -count for day, count in goal_day_counts(goal.id).items()}
+    bump_day_loads(current_user_id, freed_days)
+    bump_data_version(current_user_id)
     db.session.delete(goal)
     db.session.commit()
     return jsonify({"message": "Goal deleted"}), 200
@@ -321,10 +458,9 @@ def add_step_to_goal(goal_id):
         date=date_val
     )
     db.session.add(new_step)
-    db.session.commit()
-
-    # Пересчитываем прогресс
-    goal.update_progress()
+    track_step_dates(current_user_id, None, date_val)
+    bump_step_counters(goal.id, total=1)
+    bump_data_version(current_user_id)
     db.session.commit()
 
     return jsonify({"message": "Step added", "step_id": new_step.id}), 201
@@ -334,7 +470,7 @@ def add_step_to_goal(goal_id):
 def update_step(step_id):
     """
     Обновляет шаг (статус, дату, описание и т.д.).
-    При смене статуса на 'done' или 'planned' — пересчитываем прогресс в родительской цели.
+    При смене статуса на 'done' или обратно — сдвигаем счётчик выполненных шагов цели.
     """
     current_user_id = int(get_jwt_identity())
     step = Step.query.get(step_id)
@@ -350,24 +486,130 @@ def update_step(step_id):
     if 'description' in data:
         step.description = data['description']
     if 'status' in data:
+        bump_step_counters(step.goal_id, done=done_delta(step.status, data['status']))
         step.status = data['status']
     if 'date' in data:
+        old_date = step.date
         if data['date']:
             step.date = datetime.fromisoformat(data['date'])
         else:
             step.date = None
+        track_step_dates(current_user_id, old_date, step.date)
 
-    db.session.commit()
-    step.goal.update_progress()
+    bump_data_version(current_user_id)
     db.session.commit()
 
     return jsonify({"message": "Step updated"}), 200
 
+STEP_PATCH_FIELDS = ('title', 'description', 'status', 'date')
+
+
+def _parse_step_patch(item):
+    """
+    Изменения одного шага из элемента PATCH /steps/bulk: (id, {поле: значение}).
+    """
+    # bool — подкласс int: True/False не должны становиться шагами 1 и 0
+    step_id = item.get('id') if isinstance(item, dict) else None
+    if isinstance(step_id, bool) or not isinstance(step_id, int):
+        raise ValueError("Item must be an object with integer 'id'")
+    changes = {name: item[name] for name in STEP_PATCH_FIELDS if name in item}
+    if not changes:
+        raise ValueError(f"Nothing to update, expected some of: {', '.join(STEP_PATCH_FIELDS)}")
+    if 'status' in changes and not isinstance(changes['status'], str):
+        raise ValueError("Field 'status' must be a string")
+    if 'title' in changes and not changes['title']:
+        raise ValueError("Field 'title' must not be empty")
+    if changes.get('date'):
+        try:
+            changes['date'] = datetime.fromisoformat(changes['date'])
+        except (TypeError, ValueError):
+            raise ValueError("Field 'date' must be an ISO date")
+    elif 'date' in changes:
+        changes['date'] = None
+    return step_id, changes
+
+
+@goals_routes.route('/steps/bulk', methods=['PATCH'])
+@jwt_required()
+def update_steps_bulk():
+    """
+    Обновляет несколько шагов в одной транзакции.
+    Тело запроса: {"steps": [{"id": 1, "status": "done"}, {"id": 2, "date": "2025-03-22"}, ...]}
+    (поля как у PATCH /steps/<id>). Владелец проверяется одним запросом, счётчики каждой
+    затронутой цели и загрузка дней сдвигаются один раз. Ошибка в одном элементе не мешает
+    остальным — результат по каждому элементу в "results".
+    """
+    current_user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True)
+    items = data.get('steps') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "Field 'steps' must be a non-empty list"}), 400
+
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(_parse_step_patch(item))
+        except ValueError as e:
+            parsed.append((item.get('id') if isinstance(item, dict) else None, str(e)))
+
+    ids = {step_id for step_id, changes in parsed if isinstance(changes, dict)}
+    current = {
+        row.id: {"goal_id": row.goal_id, "user_id": row.user_id, "status": row.status, "date": row.date}
+        for row in db.session.execute(
+            db.select(Step.id, Step.goal_id, Step.status, Step.date, Goal.user_id)
+            .join(Goal, Step.goal_id == Goal.id)
+            .where(Step.id.in_(ids))
+        )
+    } if ids else {}
+
+    results = []
+    updates = {}            # step_id -> итоговые значения изменённых полей
+    done_deltas = Counter()  # goal_id -> сдвиг done_steps
+    day_deltas = Counter()
+    for step_id, changes in parsed:
+        if not isinstance(changes, dict):
+            results.append({"id": step_id, "status": 400, "message": changes})
+            continue
+        step = current.get(step_id)
+        if step is None:
+            results.append({"id": step_id, "status": 404, "message": "Step not found"})
+            continue
+        if step["user_id"] != current_user_id:
+            results.append({"id": step_id, "status": 403, "message": "Not authorized"})
+            continue
+
+        if 'status' in changes:
+            done_deltas[step["goal_id"]] += done_delta(step["status"], changes['status'])
+            step["status"] = changes['status']
+        if 'date' in changes:
+            for day, delta in count_days([step["date"]]).items():
+                day_deltas[day] -= delta
+            for day, delta in count_days([changes['date']]).items():
+                day_deltas[day] += delta
+            step["date"] = changes['date']
+        updates.setdefault(step_id, {}).update(changes)
+        results.append({"id": step_id, "status": 200, "message": "Step updated"})
+
+    if updates:
+        # ORM bulk UPDATE по первичному ключу: одна executemany-пачка на набор полей
+        db.session.execute(db.update(Step), [{"id": step_id, **changes} for step_id, changes in updates.items()])
+        for goal_id, delta in done_deltas.items():
+            bump_step_counters(goal_id, done=delta)
+        bump_day_loads(current_user_id, day_deltas)
+        bump_data_version(current_user_id)
+        db.session.commit()
+
+    return jsonify({
+        "updated": sum(1 for result in results if result["status"] == 200),
+        "failed": sum(1 for result in results if result["status"] != 200),
+        "results": results
+    }), 200
+
 @goals_routes.route('/steps/<int:step_id>', methods=['DELETE'])
 @jwt_required()
 def delete_step(step_id):
     """
-    Удаляет шаг и пересчитывает прогресс.
+    Удаляет шаг и уменьшает счётчики цели.
     """
     current_user_id = int(get_jwt_identity())
     step = Step.query.get(step_id)
@@ -377,13 +619,12 @@ def delete_step(step_id):
     if step.goal.user_id != int(current_user_id):
         return jsonify({"message": "Not authorized"}), 403
 
-    goal = step.goal
+    track_step_dates(current_user_id, step.date, None)
+    bump_step_counters(step.goal_id, total=-1, done=-done_delta(None, step.status))
+    bump_data_version(current_user_id)
     db.session.delete(step)
     db.session.commit()
 
-    goal.update_progress()
-    db.session.commit()
-
     return jsonify({"message": "Step deleted"}), 200
 
 @goals_routes.route('/steps/bulk', methods=['POST'])
@@ -420,24 +661,10 @@ def get_steps_bulk():
     if not step_ids or not isinstance(step_ids, list):
         return jsonify({"message": "Field 'step_ids' must be provided as a list"}), 400
 
-    steps = Step.query.filter(Step.id.in_(step_ids)).all()
-    user_steps = []
-    for step in steps:
-        if step.goal.user_id == int(current_user_id):
-            user_steps.append({
-                "id": step.id,
-                "goal_id": step.goal.id,
-                "goal_name": step.goal.title,
-                "color": step.goal.color,
-                "title": step.title,
-                "description": step.description,
-                "status": step.status,
-                "date": step.date.isoformat() if step.date else None,
-                "created_at": step.created_at.isoformat(),
-                "updated_at": step.updated_at.isoformat()
-            })
-
-    return jsonify({"steps": user_steps}), 200
+    # Владелец проверяется в том же запросе, поля цели приходят через JOIN
+    stmt = _select_fields(STEP_FIELDS, STEP_FIELDS).where(Step.id.in_(step_ids), Goal.user_id == current_user_id)
+    steps = db.session.execute(stmt).all()
+    return json_response({"steps": serialize_rows(stmt, steps)}), 200
 
 
 @goals_routes.route('/goals/<int:goal_id>/steps/bulk', methods=['POST'])
@@ -446,6 +673,7 @@ def add_steps_bulk(goal_id):
     """
     Импорт календаря iOS — массовое добавление шагов к цели "Повседневные дела".
     Ожидает JSON {"steps": [{"description": str, "date": "YYYY-MM-DDTHH:MM:SS"} , …]}
+    Все события сначала проверяются, затем вставляются кусками (см. utils/step_import.py).
     """
 
     current_user_id = int(get_jwt_identity())
@@ -454,48 +682,53 @@ def add_steps_bulk(goal_id):
         return jsonify({"message": "Goal not found"}), 404
 
     data = request.get_json(silent=True) or {}
-    steps_data = data.get('steps', [])
-    if not isinstance(steps_data, list) or not steps_data:
-        return jsonify({"message": "No steps data provided"}), 400
-
-    created_steps = []
-
-    for step_info in steps_data:
-        desc = step_info.get('description', '').strip()
-        if not desc:
-            continue
+    try:
+        events = parse_import_events(data.get('steps'))
+    except StepImportError as e:
+        return jsonify({"message": str(e)}), 400
 
-        date_str = step_info.get('date')
-        date_val = None
-        if date_str:
-            try:
-                date_val = parser.isoparse(date_str)
-            except (ValueError, TypeError):
-                date_val = None
-
-        new_step = Step(
-            goal_id=goal.id,
-            title="Импорт IOS календарь",
-            description=desc,
-            date=date_val
-        )
-        db.session.add(new_step)
-        db.session.flush()  # чтобы получить new_step.id до commit
+    created = import_steps(current_user_id, goal.id, events)
+    db.session.commit()
 
-        created_steps.append({
-            "step_id": new_step.id,
-            "title": new_step.title,
-            "description": new_step.description,
-            "date": date_val.isoformat() if date_val else None
-        })
+    return json_response({
+        "message": "Steps added successfully",
+        "created_steps": [
+            {
+                "step_id": step_id,
+                "title": IMPORT_STEP_TITLE,
+                "description": event["description"],
+                "date": event["date"].isoformat() if event["date"] else None
+            }
+            for step_id, event in created
+        ]
+    }, 201)
+
+
+@goals_routes.route('/goals/<int:goal_id>/steps/import', methods=['POST'])
+@jwt_required()
+def import_steps_stream(goal_id):
+    """
+    Потоковый импорт календаря в цель. Тело — файл .ics (Content-Type: text/calendar)
+    или NDJSON (application/x-ndjson): по событию {"description", "date", "uid"} на строку.
+    Тело читается построчно, не целиком; события, уже импортированные в эту цель, пропускаются,
+    а некорректные строки NDJSON и события без описания считаются в invalid.
+    Возвращает {"inserted": N, "skipped": N, "invalid": N}.
+    """
+    current_user_id = int(get_jwt_identity())
+    goal = Goal.query.filter_by(id=goal_id, user_id=current_user_id).first()
+    if not goal:
+        return jsonify({"message": "Goal not found"}), 404
 
-    db.session.commit()
+    parse = IMPORT_PARSERS.get(request.mimetype)
+    if parse is None:
+        return jsonify({"message": f"Unsupported Content-Type, expected one of: {', '.join(IMPORT_PARSERS)}"}), 415
 
-    goal.update_progress()
+    try:
+        counts = import_event_stream(current_user_id, goal.id, parse(request.stream))
+    except StepImportError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 400
     db.session.commit()
 
-    return jsonify({
-        "message": "Steps added successfully",
-        "created_steps": created_steps
-    }), 201
+    return jsonify({"message": "Steps imported", **counts}), 201
 
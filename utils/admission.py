@@ -0,0 +1,133 @@
+"""
+Допуск запросов к маршрутам, которые ждут OpenAI (admission control).
+
+Когда OpenAI отвечает медленно, каждый такой запрос держит поток воркера десятки секунд.
+Контроллер пропускает одновременно не больше AI_ADMISSION_MAX_CONCURRENT запросов на процесс
+и не больше AI_ADMISSION_MAX_PER_USER от одного пользователя (выполняющиеся + ждущие),
+поэтому остальные потоки воркера всегда свободны для входа, CRUD целей и т.п.
+Сверх лимита запрос ждёт в короткой очереди (FIFO, не длиннее AI_ADMISSION_QUEUE_SIZE)
+не дольше AI_ADMISSION_WAIT_SECONDS. Иначе — сразу AdmissionRejected: 429, если упёрся лимит
+пользователя, и 503, если заполнена очередь или вышло время ожидания.
+
+AI_ADMISSION_MAX_CONCURRENT стоит держать меньше числа потоков воркера (gunicorn --threads).
+Слот берётся только на время самого вызова OpenAI (routes/ai_routes.py, _llm_slot): локальный
+разбор дат, локальный перенос, заглушка и mock не ждут очереди к GPT. Фоновые AI-задачи
+(?async=1) ограничены своим пулом (utils/ai_jobs.py) и сюда не попадают.
+"""
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from config.settings import (
+    AI_ADMISSION_MAX_CONCURRENT, AI_ADMISSION_MAX_PER_USER, AI_ADMISSION_QUEUE_SIZE, AI_ADMISSION_WAIT_SECONDS
+)
+
+
+class AdmissionRejected(RuntimeError):
+    """Запрос не допущен — отвечаем status (429 или 503) с Retry-After."""
+
+    def __init__(self, message, status, reason, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrent, max_per_user, queue_size, wait_seconds):
+        self.max_concurrent = max_concurrent
+        self.max_per_user = max_per_user
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        self._active = 0
+        self._queue = deque()       # threading.Event ждущих запросов, по порядку прихода
+        self._per_user = Counter()  # user_id -> выполняющиеся + ждущие
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.queued = 0
+        self.max_queue_depth = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+        self.shed = Counter(user_limit=0, queue_full=0, timeout=0)
+
+    def _reject(self, reason):
+        self.shed[reason] += 1
+        if reason == "user_limit":
+            return AdmissionRejected("Too many concurrent AI requests", 429, reason, self.wait_seconds)
+        return AdmissionRejected("AI is busy, try again later", 503, reason, self.wait_seconds)
+
+    def acquire(self, user_id):
+        """
+        Занимает слот или бросает AdmissionRejected. После acquire обязателен release(user_id).
+        """
+        with self._lock:
+            if self._per_user[user_id] >= self.max_per_user:
+                raise self._reject("user_limit")
+            if self._active < self.max_concurrent and not self._queue:
+                self._active += 1
+                self._per_user[user_id] += 1
+                self.admitted += 1
+                return
+            if len(self._queue) >= self.queue_size:
+                raise self._reject("queue_full")
+            waiter = threading.Event()
+            self._queue.append(waiter)
+            self._per_user[user_id] += 1
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+
+        started = time.monotonic()
+        granted = waiter.wait(self.wait_seconds)
+        waited = time.monotonic() - started
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            # Слот мог освободиться для нас сразу после таймаута — тогда он уже наш
+            if granted or waiter.is_set():
+                self.admitted += 1
+                return
+            self._queue.remove(waiter)
+            self._release_user(user_id)
+            raise self._reject("timeout")
+
+    def release(self, user_id):
+        with self._lock:
+            self._release_user(user_id)
+            if self._queue:
+                # Слот переходит первому в очереди, _active не меняется
+                self._queue.popleft().set()
+            else:
+                self._active -= 1
+
+    def _release_user(self, user_id):
+        self._per_user[user_id] -= 1
+        if self._per_user[user_id] <= 0:
+            del self._per_user[user_id]
+
+    @contextmanager
+    def slot(self, user_id):
+        self.acquire(user_id)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._active,
+                "queue_depth": len(self._queue),
+                "max_concurrent": self.max_concurrent,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "max_queue_depth": self.max_queue_depth,
+                "avg_wait_ms": round(self.wait_seconds_total / self.queued * 1000, 2) if self.queued else 0.0,
+                "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+                "shed": dict(self.shed),
+            }
+
+
+ai_admission = AdmissionController(
+    AI_ADMISSION_MAX_CONCURRENT, AI_ADMISSION_MAX_PER_USER, AI_ADMISSION_QUEUE_SIZE, AI_ADMISSION_WAIT_SECONDS
+)
@@ -0,0 +1,118 @@
+"""
+Фоновый пул для асинхронных AI-задач.
+Задача сохраняется в таблицу ai_jobs, выполняется ограниченным пулом потоков,
+а результат (тело ответа и HTTP-код синхронного эндпоинта) пишется обратно в строку.
+"""
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from config.settings import AI_JOB_WORKERS, AI_JOB_QUEUE_SIZE, AI_JOB_STALE_SECONDS
+from extensions import db
+from models.ai_job_model import AIJob
+from models.user_model import User
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+_executor = ThreadPoolExecutor(max_workers=AI_JOB_WORKERS, thread_name_prefix="ai-job")
+# Выполняющиеся + ожидающие задачи этого процесса; сверх лимита новые задачи не принимаем
+_slots = threading.BoundedSemaphore(AI_JOB_WORKERS + AI_JOB_QUEUE_SIZE)
+
+
+def register_job_handler(kind, handler):
+    """
+    handler(user, payload) -> (flask.Response, status) — тот же ответ, что у синхронного эндпоинта.
+    """
+    _handlers[kind] = handler
+
+
+def submit_job(kind, user_id, payload):
+    """
+    Сохраняет задачу и отправляет её в пул. Возвращает AIJob или None, если очередь заполнена.
+    """
+    if not _slots.acquire(blocking=False):
+        return None
+
+    job = AIJob(id=uuid.uuid4().hex, user_id=user_id, kind=kind, payload=json.dumps(payload, ensure_ascii=False))
+    try:
+        db.session.add(job)
+        db.session.commit()
+        _executor.submit(_run_job, current_app._get_current_object(), job.id)
+    except Exception:
+        _slots.release()
+        raise
+    return job
+
+
+def _run_job(app, job_id):
+    try:
+        with app.app_context():
+            try:
+                _execute(job_id)
+            finally:
+                db.session.remove()
+    finally:
+        _slots.release()
+
+
+def _execute(job_id):
+    job = db.session.get(AIJob, job_id)
+    if job is None:
+        return
+    job.status = 'running'
+    db.session.commit()
+
+    try:
+        user = db.session.get(User, job.user_id)
+        if user is None:
+            raise LookupError("User not found")
+        response, status = _handlers[job.kind](user, json.loads(job.payload))
+        result = response.get_json()
+    except Exception as e:
+        logger.exception("AI job %s failed", job_id)
+        db.session.rollback()
+        job = db.session.get(AIJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+        db.session.commit()
+        return
+
+    # Пайплайн мог откатить свою транзакцию — перечитываем задачу
+    job = db.session.get(AIJob, job_id)
+    job.status = 'done'
+    job.result = json.dumps(result, ensure_ascii=False)
+    job.http_status = status
+    db.session.commit()
+
+
+def expire_stale_job(job):
+    """
+    Задача, зависшая в queued/running дольше AI_JOB_STALE_SECONDS, считается потерянной
+    (например, воркер перезапустился посреди выполнения) и помечается как failed.
+    """
+    if job.status not in ('queued', 'running'):
+        return
+    if datetime.utcnow() - job.updated_at < timedelta(seconds=AI_JOB_STALE_SECONDS):
+        return
+    job.status = 'failed'
+    job.error = "Job was interrupted, please retry"
+    db.session.commit()
+
+
+def job_to_dict(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "http_status": job.http_status,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "updated_at": job.updated_at.isoformat()
+    }
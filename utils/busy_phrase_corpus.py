@@ -0,0 +1,84 @@
+"""
+Размеченный корпус фраз о занятости для `flask eval-busy-parser`.
+Все ожидания посчитаны относительно CORPUS_TODAY (четверг).
+None в ожидании — фраза без дат, локальный парсер должен отдать её GPT.
+"""
+from datetime import date
+
+CORPUS_TODAY = date(2025, 3, 20)
+
+BUSY_PHRASES = [
+    # Одиночные даты
+    ("Я буду занят 4 апреля", date(2025, 4, 4), date(2025, 4, 4)),
+    ("занят 25 марта", date(2025, 3, 25), date(2025, 3, 25)),
+    ("Не смогу 1-го мая", date(2025, 5, 1), date(2025, 5, 1)),
+    ("Буду в командировке 10 января", date(2026, 1, 10), date(2026, 1, 10)),
+    ("I'm busy on April 4", date(2025, 4, 4), date(2025, 4, 4)),
+    ("busy on the 4th of April", date(2025, 4, 4), date(2025, 4, 4)),
+    ("Can't work on 12 June", date(2025, 6, 12), date(2025, 6, 12)),
+    ("занят 2025-04-07", date(2025, 4, 7), date(2025, 4, 7)),
+    ("занят 07.04", date(2025, 4, 7), date(2025, 4, 7)),
+    ("Занят 07.04.2025", date(2025, 4, 7), date(2025, 4, 7)),
+    # Диапазоны
+    ("Я буду занят с 1 по 20 апреля", date(2025, 4, 1), date(2025, 4, 20)),
+    ("С 28 марта по 3 апреля я в отпуске", date(2025, 3, 28), date(2025, 4, 3)),
+    ("занят 10-15 мая", date(2025, 5, 10), date(2025, 5, 15)),
+    ("отпуск с 28 декабря по 5 января", date(2025, 12, 28), date(2026, 1, 5)),
+    ("с 10 по 25 марта болею", date(2025, 3, 10), date(2025, 3, 25)),
+    ("I will be busy from April 1 to April 20", date(2025, 4, 1), date(2025, 4, 20)),
+    ("busy April 1-20", date(2025, 4, 1), date(2025, 4, 20)),
+    ("out of office from 1 to 20 April", date(2025, 4, 1), date(2025, 4, 20)),
+    ("vacation March 28 - April 3", date(2025, 3, 28), date(2025, 4, 3)),
+    ("between 5 and 9 May", date(2025, 5, 5), date(2025, 5, 9)),
+    ("занят с 2025-04-01 по 2025-04-10", date(2025, 4, 1), date(2025, 4, 10)),
+    ("с 01.04 по 10.04", date(2025, 4, 1), date(2025, 4, 10)),
+    ("занят до 25 марта", date(2025, 3, 20), date(2025, 3, 25)),
+    ("busy until April 2", date(2025, 3, 20), date(2025, 4, 2)),
+    ("весь апрель в разъездах", date(2025, 4, 1), date(2025, 4, 30)),
+    ("в мае буду на сборах", date(2025, 5, 1), date(2025, 5, 31)),
+    ("in March I'm swamped", date(2025, 3, 20), date(2025, 3, 31)),
+    # Относительные даты
+    ("завтра не смогу", date(2025, 3, 21), date(2025, 3, 21)),
+    ("Послезавтра занят", date(2025, 3, 22), date(2025, 3, 22)),
+    ("сегодня и завтра занят", date(2025, 3, 20), date(2025, 3, 21)),
+    ("завтра и послезавтра меня не будет", date(2025, 3, 21), date(2025, 3, 22)),
+    ("I'm busy tomorrow", date(2025, 3, 21), date(2025, 3, 21)),
+    ("busy the day after tomorrow", date(2025, 3, 22), date(2025, 3, 22)),
+    ("Я буду занят на следующей неделе", date(2025, 3, 24), date(2025, 3, 30)),
+    ("всю следующую неделю в отпуске", date(2025, 3, 24), date(2025, 3, 30)),
+    ("busy next week", date(2025, 3, 24), date(2025, 3, 30)),
+    ("на этой неделе не успею", date(2025, 3, 20), date(2025, 3, 23)),
+    ("на выходных уезжаю", date(2025, 3, 22), date(2025, 3, 23)),
+    ("busy this weekend", date(2025, 3, 22), date(2025, 3, 23)),
+    ("через 3 дня занят", date(2025, 3, 23), date(2025, 3, 23)),
+    ("in 10 days I'm travelling", date(2025, 3, 30), date(2025, 3, 30)),
+    # Дни недели
+    ("в пятницу занят", date(2025, 3, 21), date(2025, 3, 21)),
+    ("в четверг не смогу", date(2025, 3, 27), date(2025, 3, 27)),
+    ("занят в понедельник", date(2025, 3, 24), date(2025, 3, 24)),
+    ("с понедельника по среду занят", date(2025, 3, 24), date(2025, 3, 26)),
+    ("busy on Wednesday", date(2025, 3, 26), date(2025, 3, 26)),
+    ("from Friday to Monday I'm away", date(2025, 3, 21), date(2025, 3, 24)),
+    # Без дат — должны уйти в GPT
+    ("Мне нужно больше времени на отдых", None, None),
+    ("Перенеси задачи, пожалуйста", None, None),
+    ("I feel overwhelmed, move things around", None, None),
+    ("Когда закончится проект, буду свободен", None, None),
+    # Перепутанный порядок дат — не год занятости, а GPT
+    ("занят с 5 по 3 мая", None, None),
+    ("с 10.04 по 05.04 в отъезде", None, None),
+    # Время, похожее на dd.mm, — не дата
+    ("созвон в 10.30, перенеси задачи", None, None),
+    ("работаю до 12.05, потом свободен", None, None),
+    ("с 9.10 до 11.10 на встрече", None, None),
+    # Через Новый год — конец в следующем году
+    ("с 28.12 по 05.01 в отпуске", date(2025, 12, 28), date(2026, 1, 5)),
+    # Год после месяца словом не отбрасывается
+    ("занят с 1 по 3 января 2030", date(2030, 1, 1), date(2030, 1, 3)),
+    ("busy April 4 2028", date(2028, 4, 4), date(2028, 4, 4)),
+    ("занят 4 апреля 2024 года", date(2024, 4, 4), date(2024, 4, 4)),
+    ("busy from April 1 2027 to April 5 2027", date(2027, 4, 1), date(2027, 4, 5)),
+    ("отпуск с 28 декабря по 3 января 2030", date(2029, 12, 28), date(2030, 1, 3)),
+    # Два дня недели через "и"
+    ("во вторник и среду занят", date(2025, 3, 25), date(2025, 3, 26)),
+]
@@ -0,0 +1,68 @@
+"""
+Версия данных пользователя (users.data_version) для условных GET.
+Каждая запись целей/шагов увеличивает версию в той же транзакции; читающие эндпоинты
+отдают её как ETag и на If-None-Match с той же версией отвечают 304, не трогая цели и шаги.
+Для той же версии готовый ответ берётся из кэша ответов (utils/response_cache.py).
+"""
+from functools import wraps
+
+from flask import request, make_response
+from flask_jwt_extended import get_jwt_identity
+
+from extensions import db
+from models.user_model import User
+from utils.response_cache import response_cache
+
+
+def bump_data_version(user_id):
+    """
+    Атомарно увеличивает версию данных пользователя и сбрасывает его кэш ответов.
+    Коммит — на вызывающем.
+    """
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    response_cache.invalidate_user(user_id)
+
+
+def get_data_version(user_id):
+    return db.session.scalar(db.select(User.data_version).where(User.id == user_id))
+
+
+def _etag(user_id, version):
+    return f"{user_id}-{version}"
+
+
+def conditional_on_data_version(view):
+    """
+    Декоратор читающего эндпоинта (ставится под @jwt_required()).
+    Версия читается до выборки данных: если запись проскочит между ними, клиент получит
+    более свежие данные со старым ETag и просто перезапросит их в следующий раз.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user_id = int(get_jwt_identity())
+        version = get_data_version(user_id)
+        if version is None:
+            return view(*args, **kwargs)
+
+        etag = _etag(user_id, version)
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+        else:
+            response = response_cache.lookup(user_id, version)
+            if response is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                response_cache.store(user_id, version, response)
+
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.vary.add("Authorization")
+        return response
+
+    return wrapper
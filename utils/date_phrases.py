@@ -0,0 +1,327 @@
+"""
+Локальный разбор периода занятости из фраз вида
+"Я буду занят с 1 по 20 апреля", "занят 4 апреля", "busy tomorrow", "next week".
+Если фраза не распознана — parse_busy_period возвращает None, и её разбирает GPT.
+"""
+import re
+from datetime import date, timedelta
+
+
+_MONTH_FORMS = {
+    1: ["январь", "января", "январе", "january", "jan"],
+    2: ["февраль", "февраля", "феврале", "february", "feb"],
+    3: ["март", "марта", "марте", "march", "mar"],
+    4: ["апрель", "апреля", "апреле", "april", "apr"],
+    5: ["май", "мая", "мае", "may"],
+    6: ["июнь", "июня", "июне", "june", "jun"],
+    7: ["июль", "июля", "июле", "july", "jul"],
+    8: ["август", "августа", "августе", "august", "aug"],
+    9: ["сентябрь", "сентября", "сентябре", "september", "sept", "sep"],
+    10: ["октябрь", "октября", "октябре", "october", "oct"],
+    11: ["ноябрь", "ноября", "ноябре", "november", "nov"],
+    12: ["декабрь", "декабря", "декабре", "december", "dec"],
+}
+MONTHS = {form: number for number, forms in _MONTH_FORMS.items() for form in forms}
+
+_WEEKDAY_FORMS = {
+    0: ["понедельник", "понедельника", "monday"],
+    1: ["вторник", "вторника", "tuesday"],
+    2: ["среда", "среду", "среды", "wednesday"],
+    3: ["четверг", "четверга", "thursday"],
+    4: ["пятница", "пятницу", "пятницы", "friday"],
+    5: ["суббота", "субботу", "субботы", "saturday"],
+    6: ["воскресенье", "воскресенья", "sunday"],
+}
+WEEKDAYS = {form: number for number, forms in _WEEKDAY_FORMS.items() for form in forms}
+
+
+def _alternation(words):
+    return "|".join(sorted(map(re.escape, words), key=len, reverse=True))
+
+
+_MONTH = rf"(?:{_alternation(MONTHS)})"
+_WEEKDAY = rf"(?:{_alternation(WEEKDAYS)})"
+_DAY = r"(\d{1,2})(?:st|nd|rd|th|-?го|-?е)?"
+_TO = r"\s*(?:-|–|—|по|до|и|to|till|until|through|and)\s*"
+# Необязательный год после даты: "4 апреля 2028", "4 апреля 2028 года", "april 4, 2028"
+_YEAR = r"(?:,?\s+(\d{4})\b(?:\s*(?:года|году|г\.?))?)?"
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_DATE = re.compile(r"\b(\d{1,2})\.(\d{1,2})(?:\.(\d{2,4}))?\b")
+# dd.mm без года в таком окружении — время ("в 10.30", "до 12.05", "с 9.10 до 11.10", "12.05 утра")
+_TIME_BEFORE = re.compile(r"\b(?:в|во|до|к|после|около|at|by|until|till)\s+$")
+_RANGE_START_BEFORE = re.compile(r"\b(?:с|со|from)\s+$")
+_TIME_AFTER = re.compile(r"^\s*(?:час|ч\b|утра|дня|вечера|ночи|мин|am\b|pm\b)")
+_TIME_RANGE_AFTER = re.compile(r"^\s*(?:до|-|–|—)\s*\d{1,2}[.:]\d{2}\b(?![.:]\d)")
+
+# Все правила с месяцем словом принимают год после даты (_YEAR); группа года может быть пустой.
+# "с 1 по 20 апреля", "1-20 апреля", "from 1 to 20 april"
+_RANGE_DAYS_MONTH = re.compile(rf"\b{_DAY}{_TO}{_DAY}\s+(?:of\s+)?({_MONTH})\b{_YEAR}")
+# "с 28 марта по 3 апреля", "from 28 march to 3 april"
+_RANGE_DAY_MONTH_DAY_MONTH = re.compile(
+    rf"\b{_DAY}\s+(?:of\s+)?({_MONTH})\b{_YEAR}{_TO}{_DAY}\s+(?:of\s+)?({_MONTH})\b{_YEAR}"
+)
+# "april 1 to april 20", "april 1-20", "march 28 - april 3"
+_RANGE_MONTH_FIRST = re.compile(rf"\b({_MONTH})\s+{_DAY}\b{_YEAR}{_TO}(?:({_MONTH})\s+)?{_DAY}\b{_YEAR}")
+# "до 20 апреля", "until april 20"
+_UNTIL_DAY_MONTH = re.compile(rf"\b(?:до|until|till)\s+{_DAY}\s+(?:of\s+)?({_MONTH})\b{_YEAR}")
+_UNTIL_MONTH_DAY = re.compile(rf"\b(?:до|until|till)\s+({_MONTH})\s+{_DAY}\b{_YEAR}")
+# "4 апреля", "4th of april", "april 4"
+_DAY_MONTH = re.compile(rf"\b{_DAY}\s+(?:of\s+)?({_MONTH})\b{_YEAR}")
+_MONTH_DAY = re.compile(rf"\b({_MONTH})\s+{_DAY}\b{_YEAR}")
+# "в апреле", "весь май", "in april"
+_WHOLE_MONTH = re.compile(rf"\b(?:в|во|весь|всю|in|all|whole)\s+(?:of\s+)?({_MONTH})\b{_YEAR}")
+# "с понедельника по среду", "from monday to wednesday"
+_RANGE_WEEKDAYS = re.compile(rf"\b({_WEEKDAY}){_TO}({_WEEKDAY})\b")
+_WEEKDAY_WORD = re.compile(rf"\b({_WEEKDAY})\b")
+_IN_DAYS = re.compile(r"\b(?:через\s+(\d{1,3})\s+(?:день|дня|дней)|in\s+(\d{1,3})\s+days?)\b")
+
+_DAY_AFTER_TOMORROW = re.compile(r"\b(?:послезавтра|day after tomorrow)\b")
+_TOMORROW = re.compile(r"\b(?:завтра|tomorrow)\b")
+_TODAY = re.compile(r"\b(?:сегодня|today)\b")
+_NEXT_WEEK = re.compile(r"\b(?:следующей неделе|следующую неделю|след\. неделе|next week)\b")
+_THIS_WEEK = re.compile(r"\b(?:этой неделе|эту неделю|this week)\b")
+_WEEKEND = re.compile(r"\b(?:выходны[ех]|выходные|weekend)\b")
+
+
+def _normalize(text):
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+def _safe_date(year, month, day):
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _upcoming(today, month, day):
+    """
+    Дата без года: текущий год, а если она уже прошла — следующий.
+    """
+    candidate = _safe_date(today.year, month, day)
+    if candidate is not None and candidate < today:
+        candidate = _safe_date(today.year + 1, month, day)
+    return candidate
+
+
+def _range(start, end):
+    """
+    Период start..end. Конец раньше начала переносится в следующий год, только если
+    его месяц раньше ("с 28 декабря по 3 января"); иначе это опечатка или перепутанный
+    порядок ("с 5 по 3 мая") — None, фразу разберёт GPT.
+    """
+    if start is None or end is None:
+        return None
+    if end < start:
+        if end.year != start.year or end.month >= start.month:
+            return None
+        end = _safe_date(end.year + 1, end.month, end.day)
+        if end is None:
+            return None
+    return start, end
+
+
+def _upcoming_range(today, month1, day1, month2, day2):
+    """
+    Диапазон без года: текущий год, а если он уже целиком прошёл — следующий.
+    """
+    for year in (today.year, today.year + 1):
+        period = _range(_safe_date(year, month1, day1), _safe_date(year, month2, day2))
+        if period is not None and period[1] >= today:
+            return period
+    return None
+
+
+def _dated(today, month, day, year):
+    """
+    Дата из месяца, дня и необязательного года (строка из _YEAR или None).
+    """
+    if year:
+        return _safe_date(int(year), month, day)
+    return _upcoming(today, month, day)
+
+
+def _dated_range(today, month1, day1, year1, month2, day2, year2):
+    """
+    Диапазон, в котором год может быть указан у одной из дат, у обеих или ни у одной.
+    Указанный год не отбрасывается: "с 28 декабря по 3 января 2030" — 2029-12-28..2030-01-03.
+    """
+    if not year1 and not year2:
+        return _upcoming_range(today, month1, day1, month2, day2)
+    in_order = (month1, day1) <= (month2, day2)
+    if not year1:
+        year1 = int(year2) if in_order else int(year2) - 1
+    if not year2:
+        year2 = int(year1) if in_order else int(year1) + 1
+    start, end = _safe_date(int(year1), month1, day1), _safe_date(int(year2), month2, day2)
+    if start is None or end is None or end < start:
+        return None
+    return start, end
+
+
+def _next_weekday(today, weekday, strictly_after=True):
+    delta = (weekday - today.weekday()) % 7
+    if delta == 0 and strictly_after:
+        delta = 7
+    return today + timedelta(days=delta)
+
+
+def _is_clock_time(text, match):
+    """
+    dd.mm без года, которое по окружению — время, а не дата.
+    """
+    before, after = text[:match.start()], text[match.end():]
+    if _TIME_BEFORE.search(before) or _TIME_AFTER.search(after):
+        return True
+    return bool(_RANGE_START_BEFORE.search(before) and _TIME_RANGE_AFTER.search(after))
+
+
+def _explicit_dates(text, today):
+    """
+    Явные даты по порядку: [(date, год указан)]. dd.mm без года в контексте времени пропускается.
+    """
+    iso = [(_safe_date(int(y), int(m), int(d)), True) for y, m, d in _ISO_DATE.findall(text)]
+    if iso:
+        return iso
+
+    dates = []
+    for match in _NUMERIC_DATE.finditer(text):
+        day, month, year = match.groups()
+        if year:
+            year = int(year)
+            if year < 100:
+                year += 2000
+            dates.append((_safe_date(year, int(month), int(day)), True))
+        elif _safe_date(2000, int(month), int(day)) and not _is_clock_time(text, match):
+            # Год достраивается позже (_explicit_period); 2000 — високосный, 29.02 допустимо
+            dates.append(((int(month), int(day)), False))
+    return dates
+
+
+def _explicit_period(dates, today):
+    """
+    Период из явных дат: одна дата — один день, две — диапазон. Даты без года
+    достраиваются как _upcoming/_upcoming_range.
+    """
+    (first, first_dated), (last, last_dated) = dates[0], dates[-1]
+    if len(dates) > 1 and not first_dated and not last_dated:
+        return _upcoming_range(today, first[0], first[1], last[0], last[1])
+    first = first if first_dated else _upcoming(today, *first)
+    last = last if last_dated else _upcoming(today, *last)
+    if len(dates) == 1:
+        return (first, first) if first else None
+    return _range(first, last)
+
+
+def _month_day_rules(text, today):
+    match = _RANGE_DAY_MONTH_DAY_MONTH.search(text)
+    if match:
+        day1, month1, year1, day2, month2, year2 = match.groups()
+        return _dated_range(today, MONTHS[month1], int(day1), year1, MONTHS[month2], int(day2), year2)
+
+    match = _RANGE_DAYS_MONTH.search(text)
+    if match:
+        day1, day2, month, year = match.groups()
+        return _dated_range(today, MONTHS[month], int(day1), year, MONTHS[month], int(day2), year)
+
+    match = _RANGE_MONTH_FIRST.search(text)
+    if match:
+        month1, day1, year1, month2, day2, year2 = match.groups()
+        return _dated_range(
+            today, MONTHS[month1], int(day1), year1, MONTHS[month2 or month1], int(day2), year2
+        )
+
+    match = _UNTIL_DAY_MONTH.search(text)
+    if match:
+        day, month, year = match.groups()
+        return _range(today, _dated(today, MONTHS[month], int(day), year))
+    match = _UNTIL_MONTH_DAY.search(text)
+    if match:
+        month, day, year = match.groups()
+        return _range(today, _dated(today, MONTHS[month], int(day), year))
+
+    match = _DAY_MONTH.search(text)
+    if match:
+        day, month, year = match.groups()
+        single = _dated(today, MONTHS[month], int(day), year)
+        return (single, single) if single else None
+
+    match = _MONTH_DAY.search(text)
+    if match:
+        month, day, year = match.groups()
+        single = _dated(today, MONTHS[month], int(day), year)
+        return (single, single) if single else None
+
+    match = _WHOLE_MONTH.search(text)
+    if match:
+        month = MONTHS[match.group(1)]
+        if match.group(2):
+            year = int(match.group(2))
+        else:
+            year = today.year if month >= today.month else today.year + 1
+        start = date(year, month, 1)
+        end = (date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)) - timedelta(days=1)
+        return (max(start, today) if end >= today else start), end
+
+    return None
+
+
+def _relative_rules(text, today):
+    offsets = []
+    if _DAY_AFTER_TOMORROW.search(text):
+        offsets.append(2)
+        text = _DAY_AFTER_TOMORROW.sub(" ", text)
+    if _TODAY.search(text):
+        offsets.append(0)
+    if _TOMORROW.search(text):
+        offsets.append(1)
+    if offsets:
+        # "завтра", "сегодня и завтра", "завтра и послезавтра"
+        return today + timedelta(days=min(offsets)), today + timedelta(days=max(offsets))
+
+    if _NEXT_WEEK.search(text):
+        start = _next_weekday(today, 0)
+        return start, start + timedelta(days=6)
+    if _THIS_WEEK.search(text):
+        return today, today + timedelta(days=6 - today.weekday())
+    if _WEEKEND.search(text):
+        start = _next_weekday(today, 5, strictly_after=False)
+        return start, start + timedelta(days=1)
+
+    match = _IN_DAYS.search(text)
+    if match:
+        single = today + timedelta(days=int(match.group(1) or match.group(2)))
+        return single, single
+
+    match = _RANGE_WEEKDAYS.search(text)
+    if match:
+        start = _next_weekday(today, WEEKDAYS[match.group(1)])
+        end = _next_weekday(start, WEEKDAYS[match.group(2)], strictly_after=False)
+        return start, end
+
+    match = _WEEKDAY_WORD.search(text)
+    if match:
+        single = _next_weekday(today, WEEKDAYS[match.group(1)])
+        return single, single
+
+    return None
+
+
+def parse_busy_period(text, today):
+    """
+    Пытается локально выделить период занятости (busy_start, busy_end) из текста запроса.
+    Понимает ISO-даты и dd.mm[.yyyy], "4 апреля"/"april 4", диапазоны "с 1 по 20 апреля",
+    "с 28 марта по 3 апреля", "до 20 апреля", "в апреле", а также "сегодня", "завтра",
+    "послезавтра", "через N дней", "на следующей неделе", "на выходных" и дни недели.
+    Возвращает кортеж дат или None, если фраза не распознана.
+    """
+    text = _normalize(text or "")
+    if not text:
+        return None
+
+    dates = [(d, dated) for d, dated in _explicit_dates(text, today) if d is not None]
+    if dates:
+        return _explicit_period(dates[:2], today)
+
+    return _month_day_rules(text, today) or _relative_rules(text, today)
@@ -0,0 +1,161 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from extensions import db
+from models.day_load_model import DayLoad
+from models.goal_model import Goal
+from models.step_model import Step
+
+# Сколько "занятых" дней подтягиваем за один запрос при поиске свободного дня
+_SCAN_CHUNK = 64
+
+
+def to_day(value):
+    """
+    Приводит datetime/date/None к datetime.date (или None).
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def dialect_insert(table):
+    """
+    INSERT текущего диалекта — с поддержкой ON CONFLICT (Postgres и SQLite).
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+    raise RuntimeError(f"INSERT ... ON CONFLICT is not supported for dialect '{dialect}'")
+
+
+def bump_day_loads(user_id, deltas):
+    """
+    Атомарно прибавляет к загрузке дней пользователя значения из deltas ({date: delta}).
+    Выполняется в текущей транзакции одним INSERT ... ON CONFLICT DO UPDATE.
+    """
+    rows = [
+        {"user_id": user_id, "day": to_day(day), "task_count": delta}
+        for day, delta in deltas.items()
+        if day is not None and delta
+    ]
+    if not rows:
+        return
+
+    stmt = dialect_insert(DayLoad.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DayLoad.user_id, DayLoad.day],
+        set_={"task_count": DayLoad.task_count + stmt.excluded.task_count}
+    )
+    db.session.execute(stmt, rows)
+
+
+def track_step_dates(user_id, old_date=None, new_date=None):
+    """
+    Учитывает перенос одного шага: old_date -> new_date.
+    Для создания шага old_date=None, для удаления new_date=None.
+    """
+    old_day, new_day = to_day(old_date), to_day(new_date)
+    if old_day == new_day:
+        return
+    deltas = Counter()
+    if old_day:
+        deltas[old_day] -= 1
+    if new_day:
+        deltas[new_day] += 1
+    bump_day_loads(user_id, deltas)
+
+
+def count_days(dates):
+    """
+    Собирает Counter {date: кол-во} из списка datetime/date, пропуская пустые даты.
+    """
+    return Counter(to_day(d) for d in dates if d is not None)
+
+
+def goal_day_counts(goal_id) -> Counter:
+    """
+    Загрузка по дням, которую даёт одна цель (нужна перед каскадным удалением цели).
+    """
+    day_col = db.func.date(Step.date)
+    rows = db.session.query(day_col, db.func.count(Step.id)).filter(
+        Step.goal_id == goal_id,
+        Step.date.isnot(None)
+    ).group_by(day_col).all()
+    return Counter({_as_date(day): count for day, count in rows})
+
+
+def _as_date(value):
+    # SQLite возвращает date() строкой
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).date()
+    return value
+
+
+def get_day_load(user_id, start=None, end=None) -> dict:
+    """
+    Возвращает { date: tasks_count } для дней с задачами в диапазоне [start..end]
+    (любая из границ может отсутствовать). Индексный range-запрос по (user_id, day).
+    """
+    query = DayLoad.query.filter(DayLoad.user_id == user_id, DayLoad.task_count > 0)
+    if start is not None:
+        query = query.filter(DayLoad.day >= to_day(start))
+    if end is not None:
+        query = query.filter(DayLoad.day <= to_day(end))
+    return {row.day: row.task_count for row in query.order_by(DayLoad.day)}
+
+
+def find_day_under(user_id, start, max_tasks, exclude_day=None):
+    """
+    Ближайший день начиная со start, на котором у пользователя меньше max_tasks задач.
+    exclude_day — день, на котором стоит сама переносимая задача: её не учитываем.
+    Читает только "заполненные" дни кусками по _SCAN_CHUNK, пока не найдётся пропуск.
+    """
+    candidate = to_day(start)
+    exclude_day = to_day(exclude_day)
+    while True:
+        rows = DayLoad.query.with_entities(DayLoad.day, DayLoad.task_count).filter(
+            DayLoad.user_id == user_id,
+            DayLoad.day >= candidate,
+            DayLoad.task_count >= max_tasks
+        ).order_by(DayLoad.day).limit(_SCAN_CHUNK).all()
+
+        for day, count in rows:
+            if day > candidate:
+                return candidate
+            if day == exclude_day and count - 1 < max_tasks:
+                return candidate
+            candidate += timedelta(days=1)
+
+        if len(rows) < _SCAN_CHUNK:
+            return candidate
+
+
+def rebuild_day_load(user_id=None) -> int:
+    """
+    Пересобирает day_loads из таблицы steps (для одного пользователя или для всех).
+    Возвращает количество записанных дней. Коммит — на стороне вызывающего.
+    """
+    delete_query = DayLoad.query
+    if user_id is not None:
+        delete_query = delete_query.filter(DayLoad.user_id == user_id)
+    delete_query.delete(synchronize_session=False)
+
+    day_col = db.func.date(Step.date)
+    source = db.select(Goal.user_id, day_col, db.func.count(Step.id)).join(
+        Goal, Step.goal_id == Goal.id
+    ).filter(Step.date.isnot(None))
+    if user_id is not None:
+        source = source.filter(Goal.user_id == user_id)
+    source = source.group_by(Goal.user_id, day_col)
+
+    result = db.session.execute(
+        db.insert(DayLoad).from_select(['user_id', 'day', 'task_count'], source)
+    )
+    return result.rowcount
@@ -0,0 +1,260 @@
+"""
+Исходящие письма через таблицу email_outbox (transactional outbox).
+
+enqueue_email добавляет письмо в текущую сессию — оно коммитится вместе с данными,
+ради которых отправляется, и запрос не ждёт SMTP. Диспетчер забирает ожидающие письма
+пачками: условный UPDATE ... RETURNING сдвигает next_attempt_at на CLAIM_LEASE и коммитится
+до отправки, поэтому диспетчеры нескольких процессов не берут одно письмо дважды на любой БД
+(на Postgres выборка ещё и FOR UPDATE SKIP LOCKED, чтобы они не ждали друг друга). Если процесс
+упал посреди отправки, письмо снова станет доступно через CLAIM_LEASE. Пачка отправляется
+через одно SMTP-соединение с таймаутом EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS; письма, до которых
+очередь не дошла к концу аренды, возвращаются в очередь неотправленными. Неудачная
+отправка откладывается с экспоненциальной задержкой, после EMAIL_OUTBOX_MAX_ATTEMPTS
+попыток письмо помечается как failed.
+
+Диспетчер (EMAIL_DISPATCHER_ENABLED) запускается фоновым потоком при создании приложения,
+поэтому письма, оставшиеся в очереди после рестарта (и отложенные повторы), уходят без
+новых запросов; после fork (gunicorn --preload) поток перезапускается в каждом воркере.
+Под командами `flask ...` поток при старте не запускается (flask run запустит его с первым
+письмом), отдельным процессом очередь разбирает flask email-dispatcher.
+
+Тело отправленного (или окончательно не отправленного) письма стирается: в нём живой код сброса пароля.
+"""
+import json
+import logging
+import os
+import smtplib
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Connection, Message
+
+from config.settings import (
+    EMAIL_DISPATCHER_ENABLED, EMAIL_OUTBOX_BATCH_SIZE, EMAIL_OUTBOX_POLL_SECONDS, EMAIL_OUTBOX_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_BACKOFF_SECONDS, EMAIL_OUTBOX_BACKOFF_MAX_SECONDS,
+    EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS, EMAIL_OUTBOX_CLAIM_LEASE_SECONDS
+)
+from extensions import db
+from models.email_outbox_model import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# На сколько письмо "забирается" диспетчером на время отправки пачки
+CLAIM_LEASE = timedelta(seconds=EMAIL_OUTBOX_CLAIM_LEASE_SECONDS)
+SMTP_TIMEOUT = timedelta(seconds=EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS)
+
+
+class _SMTPConnection(Connection):
+    """
+    Connection Flask-Mail с таймаутом сокета: в Flask-Mail 0.9 его не задать, и зависший
+    SMTP-сервер держал бы пачку (и её аренду) сколько угодно.
+    """
+
+    def configure_host(self):
+        smtp = smtplib.SMTP_SSL if self.mail.use_ssl else smtplib.SMTP
+        host = smtp(self.mail.server, self.mail.port, timeout=EMAIL_OUTBOX_SMTP_TIMEOUT_SECONDS)
+        host.set_debuglevel(int(self.mail.debug))
+        if self.mail.use_tls:
+            host.starttls()
+        if self.mail.username and self.mail.password:
+            host.login(self.mail.username, self.mail.password)
+        return host
+
+
+def _is_connection_error(error):
+    """
+    Соединение непригодно (сеть, разрыв) — остаток пачки откладывается целиком.
+    SMTPException — тоже OSError, но отказ сервера по одному письму соединение не ломает.
+    """
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+def enqueue_email(subject, recipients, body, sender):
+    """
+    Ставит письмо в очередь в текущей транзакции. Коммит — на вызывающем,
+    после коммита стоит вызвать wake_email_dispatcher().
+    """
+    email = OutboxEmail(sender=sender, recipients=json.dumps(recipients), subject=subject, body=body)
+    db.session.add(email)
+    return email
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(EMAIL_OUTBOX_BACKOFF_SECONDS * 2 ** (attempts - 1), EMAIL_OUTBOX_BACKOFF_MAX_SECONDS))
+
+
+def _defer(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)[:1000]
+    if email.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = 'failed'
+        email.body = ''
+        logger.error("Email %s failed after %s attempts: %s", email.id, email.attempts, error)
+    else:
+        email.next_attempt_at = now + _backoff(email.attempts)
+        logger.warning("Email %s deferred (attempt %s): %s", email.id, email.attempts, error)
+
+
+def dispatch_batch(batch_size=EMAIL_OUTBOX_BATCH_SIZE):
+    """
+    Отправляет одну пачку писем, срок которых наступил. Возвращает число обработанных писем.
+    Нужен контекст приложения.
+    """
+    now = datetime.utcnow()
+    due = OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now
+    ids = db.session.scalars(
+        db.select(OutboxEmail.id)
+        .where(*due)
+        .order_by(OutboxEmail.next_attempt_at, OutboxEmail.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).all()
+    if ids:
+        # Забираем только те письма, которые никто не успел забрать между выборкой и UPDATE
+        ids = db.session.scalars(
+            db.update(OutboxEmail)
+            .where(OutboxEmail.id.in_(ids), *due)
+            .values(next_attempt_at=now + CLAIM_LEASE)
+            .returning(OutboxEmail.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    db.session.commit()
+    if not ids:
+        return 0
+
+    emails = db.session.scalars(db.select(OutboxEmail).where(OutboxEmail.id.in_(ids)).order_by(OutboxEmail.id)).all()
+
+    # Последний момент, когда ещё можно начать отправку письма, не рискуя, что аренда
+    # истечёт посреди неё и письмо заберёт (и отправит ещё раз) другой процесс
+    send_until = now + CLAIM_LEASE - SMTP_TIMEOUT
+    pending = list(emails)
+    try:
+        with _SMTPConnection(current_app.extensions['mail']) as conn:
+            while pending:
+                # Первое письмо пачки отправляется всегда — иначе при аренде короче таймаута очередь встанет
+                if len(pending) < len(emails) and datetime.utcnow() >= send_until:
+                    logger.warning("Claim lease is running out, returning %s emails to the queue", len(pending))
+                    for email in pending:
+                        email.next_attempt_at = datetime.utcnow()
+                    pending = []
+                    break
+                email = pending[0]
+                try:
+                    conn.send(Message(
+                        subject=email.subject,
+                        sender=email.sender,
+                        recipients=json.loads(email.recipients),
+                        body=email.body
+                    ))
+                except Exception as e:
+                    if _is_connection_error(e):
+                        raise
+                    # Письмо отклонено (адрес, заголовки) — остальные шлём тем же соединением
+                    _defer(email, e, now)
+                else:
+                    email.status = 'sent'
+                    email.sent_at = datetime.utcnow()
+                    email.last_error = None
+                    email.body = ''
+                pending.pop(0)
+    except Exception as e:
+        for email in pending:
+            _defer(email, e, now)
+    db.session.commit()
+    return len(emails)
+
+
+def drain_outbox(batch_size=EMAIL_OUTBOX_BATCH_SIZE):
+    """
+    Отправляет пачки, пока есть письма с наступившим сроком. Возвращает число обработанных.
+    """
+    total = 0
+    while True:
+        count = dispatch_batch(batch_size)
+        total += count
+        if count < batch_size:
+            return total
+
+
+class EmailDispatcher:
+    """
+    Фоновый поток процесса: разбирает очередь сразу после wake() и раз в poll_seconds
+    (для отложенных повторов и писем, поставленных другими процессами).
+    """
+
+    def __init__(self, poll_seconds):
+        self.poll_seconds = poll_seconds
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Держится, пока поток разбирает очередь: fork не должен застать его посреди работы с БД/SMTP
+        self._busy = threading.Lock()
+        self._fork_hooks = False
+
+    def wake(self, app):
+        with self._lock:
+            # После fork (воркеры gunicorn) поток нужно запустить заново
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, args=(app,), name="email-dispatcher", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def start(self, app):
+        """
+        Запускает поток сразу (первый проход — без ожидания) и перезапускает его в дочерних процессах.
+        """
+        with self._lock:
+            if not self._fork_hooks:
+                self._fork_hooks = True
+                os.register_at_fork(
+                    before=self._busy.acquire,
+                    after_in_parent=self._busy.release,
+                    after_in_child=lambda: self._after_fork_in_child(app)
+                )
+        self.wake(app)
+
+    def _after_fork_in_child(self, app):
+        self._busy.release()
+        self._lock = threading.Lock()
+        self._thread = None
+        with app.app_context():
+            # Соединения пула унаследованы от родителя — в дочернем процессе их не используем
+            db.engine.dispose(close=False)
+        self.wake(app)
+
+    def _run(self, app):
+        while True:
+            self._wakeup.wait(self.poll_seconds)
+            self._wakeup.clear()
+            with self._busy, app.app_context():
+                try:
+                    drain_outbox()
+                except Exception:
+                    logger.exception("Email dispatcher failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+email_dispatcher = EmailDispatcher(EMAIL_OUTBOX_POLL_SECONDS)
+
+
+def init_email_dispatcher(app):
+    """
+    Запуск диспетчера при создании приложения (см. docstring модуля).
+    """
+    if EMAIL_DISPATCHER_ENABLED and os.environ.get("FLASK_RUN_FROM_CLI") != "true":
+        email_dispatcher.start(app)
+
+
+def wake_email_dispatcher():
+    """
+    Будит диспетчер этого процесса (и запускает его при первом вызове). Вызывать после коммита.
+    """
+    if EMAIL_DISPATCHER_ENABLED:
+        email_dispatcher.wake(current_app._get_current_object())
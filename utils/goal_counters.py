@@ -0,0 +1,64 @@
+"""
+Денормализованные счётчики шагов цели (goals.total_steps / goals.done_steps).
+Меняются атомарным UPDATE ... SET x = x + :delta в той же транзакции, что и шаги,
+поэтому прогресс цели считается без загрузки шагов и без гонок read-modify-write.
+"""
+from extensions import db
+from models.goal_model import Goal
+from models.step_model import Step
+
+
+def bump_step_counters(goal_id, total=0, done=0):
+    """
+    Сдвигает счётчики цели на total/done. Коммит — на вызывающем.
+    """
+    if not total and not done:
+        return
+    db.session.execute(
+        db.update(Goal)
+        .where(Goal.id == goal_id)
+        .values(total_steps=Goal.total_steps + total, done_steps=Goal.done_steps + done)
+    )
+
+
+def done_delta(old_status, new_status):
+    """
+    На сколько меняется done_steps при смене статуса шага: -1, 0 или 1.
+    """
+    return int(new_status == 'done') - int(old_status == 'done')
+
+
+def reconcile_counters_stmt():
+    """
+    UPDATE, пересчитывающий счётчики по таблице steps у целей, где они разошлись.
+    Вызывающий может сузить его через .where(...).
+    """
+    total = (
+        db.select(db.func.count(Step.id))
+        .where(Step.goal_id == Goal.id)
+        .correlate(Goal)
+        .scalar_subquery()
+    )
+    done = (
+        db.select(db.func.count(Step.id))
+        .where(Step.goal_id == Goal.id, Step.status == 'done')
+        .correlate(Goal)
+        .scalar_subquery()
+    )
+    return (
+        db.update(Goal)
+        .where(db.or_(Goal.total_steps != total, Goal.done_steps != done))
+        .values(total_steps=total, done_steps=done)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_goal_counters(goal_id=None):
+    """
+    Пересчитывает счётчики там, где они разошлись.
+    Возвращает количество исправленных целей. Коммит — на вызывающем.
+    """
+    stmt = reconcile_counters_stmt()
+    if goal_id is not None:
+        stmt = stmt.where(Goal.id == goal_id)
+    return db.session.execute(stmt).rowcount
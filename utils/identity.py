@@ -0,0 +1,131 @@
+"""
+Пользователь из JWT без запроса к БД на каждый запрос.
+
+Загрузчик Flask-JWT-Extended (user_lookup_loader) возвращает Identity: id берётся прямо
+из токена, поэтому маршрутам, которым нужен только id (current_user.id), в БД ходить
+не нужно вовсе. Маршруты, которым нужна учётная запись (проверить, что пользователь
+существует, взять имя), вызывают current_user.load() — снимок (id, email, name) берётся
+из LRU+TTL кэша процесса и только при промахе читается из users.
+
+Кэш сбрасывается при изменении или удалении User через ORM (см. события ниже) и явным
+invalidate_identity(); в других воркерах устаревший снимок живёт не дольше IDENTITY_CACHE_TTL_SECONDS.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import current_app, jsonify
+from flask_jwt_extended import current_user
+from sqlalchemy import event
+
+from config.settings import IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES, METRICS_OPERATOR_EMAILS
+from extensions import db
+from models.user_model import User
+
+UserSnapshot = namedtuple("UserSnapshot", "id email name")
+
+_MISSING = object()
+
+
+class IdentityCache:
+    """
+    LRU+TTL кэш снимков пользователей в памяти процесса. Отсутствие пользователя тоже кэшируется.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # user_id -> (UserSnapshot или None, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        row = db.session.execute(
+            db.select(User.id, User.email, User.name).where(User.id == user_id)
+        ).first()
+        snapshot = UserSnapshot(*row) if row else None
+        with self._lock:
+            self._entries[user_id] = (snapshot, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+identity_cache = IdentityCache(IDENTITY_CACHE_MAX_ENTRIES, IDENTITY_CACHE_TTL_SECONDS)
+
+
+class Identity:
+    """
+    current_user для защищённых маршрутов: id из токена, учётная запись — по требованию.
+    """
+    __slots__ = ("id", "_user")
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self._user = _MISSING
+
+    def load(self):
+        """
+        UserSnapshot или None, если пользователя уже нет. В пределах запроса — один раз.
+        """
+        if self._user is _MISSING:
+            self._user = identity_cache.get(self.id)
+        return self._user
+
+
+def invalidate_identity(user_id):
+    identity_cache.invalidate(user_id)
+
+
+def operator_required(view):
+    """
+    Пускает только операторов (METRICS_OPERATOR_EMAILS), остальным — 403.
+    Ставится после @jwt_required().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        user = current_user.load()
+        if user is None or user.email.lower() not in METRICS_OPERATOR_EMAILS:
+            return jsonify({"message": "Forbidden"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def register_identity_loader(jwt):
+    @jwt.user_lookup_loader
+    def _lookup_identity(jwt_header, jwt_data):
+        return Identity(int(jwt_data[current_app.config.get("JWT_IDENTITY_CLAIM", "sub")]))
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_identity(target.id)
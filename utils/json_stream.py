@@ -0,0 +1,79 @@
+"""
+Инкрементальный разбор ответа GPT вида {"goal_title": "...", "steps": [{...}, {...}]},
+который приходит кусками из потока. Каждый шаг отдаётся сразу, как только его объект
+в массиве "steps" закрылся, не дожидаясь конца ответа.
+"""
+import json
+import re
+
+_GOAL_TITLE = re.compile(r'"goal_title"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_STEPS_START = re.compile(r'"steps"\s*:\s*\[')
+
+
+class StepsStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.goal_title = None
+        self.steps_count = 0
+        self.finished = False
+        self._pos = None          # позиция сканирования внутри массива steps
+        self._depth = 0           # вложенность относительно массива steps
+        self._in_string = False
+        self._escape = False
+        self._object_start = None
+
+    def feed(self, chunk):
+        """
+        Добавляет очередной кусок текста и возвращает список событий:
+        ("goal_title", str) и ("step", dict) в порядке появления.
+        """
+        self.buffer += chunk
+        events = []
+
+        if self.goal_title is None:
+            match = _GOAL_TITLE.search(self.buffer)
+            if match:
+                self.goal_title = json.loads(f'"{match.group(1)}"')
+                events.append(("goal_title", self.goal_title))
+
+        if self._pos is None:
+            match = _STEPS_START.search(self.buffer)
+            if not match:
+                return events
+            self._pos = match.end()
+
+        events.extend(("step", step) for step in self._scan_steps())
+        return events
+
+    def _scan_steps(self):
+        steps = []
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.finished:
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = self._pos
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0:
+                    # закрылся сам массив steps
+                    self.finished = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0 and self._object_start is not None:
+                        step = json.loads(buffer[self._object_start:self._pos + 1])
+                        self._object_start = None
+                        if isinstance(step, dict):
+                            self.steps_count += 1
+                            steps.append(step)
+            self._pos += 1
+        return steps
@@ -0,0 +1,218 @@
+"""
+Кэш ответов LLM перед каждым вызовом OpenAI.
+Ключ — sha256 от модели, нормализованных сообщений и параметров запроса.
+Бэкенды: "memory" (LRU+TTL в процессе), "sql" (таблица llm_cache_entries, общая
+для всех воркеров gunicorn) и "none" (кэш выключен).
+Если в промпте есть сегодняшняя дата, запись живёт не дольше конца текущих суток.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from config.settings import LLM_CACHE_BACKEND, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+from extensions import db
+from models.llm_cache_model import LLMCacheEntry
+from utils.openai_client import openai_client
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """
+    LRU+TTL кэш в памяти процесса.
+    """
+    name = "memory"
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            content, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return content
+
+    def set(self, key, content, ttl_seconds):
+        with self._lock:
+            self._entries[key] = (content, time.time() + ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class SqlCacheBackend:
+    """
+    Кэш в таблице llm_cache_entries. Работает через отдельное соединение,
+    чтобы не вмешиваться в транзакцию текущего запроса.
+    """
+    name = "sql"
+    # Как часто (в записях) чистить просроченные и лишние строки
+    PRUNE_EVERY = 100
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        table = LLMCacheEntry.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            content = conn.execute(
+                db.select(table.c.content).where(table.c.key == key, table.c.expires_at > now)
+            ).scalar()
+            if content is not None:
+                conn.execute(table.update().where(table.c.key == key).values(last_used_at=now))
+        return content
+
+    def set(self, key, content, ttl_seconds):
+        table = LLMCacheEntry.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.key == key))
+                conn.execute(table.insert().values(
+                    key=key,
+                    content=content,
+                    expires_at=now + timedelta(seconds=ttl_seconds),
+                    last_used_at=now
+                ))
+        except IntegrityError:
+            # ту же запись параллельно положил другой воркер
+            return
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune(now)
+
+    def _prune(self, now):
+        table = LLMCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at <= now))
+            keep = db.select(table.c.key).order_by(table.c.last_used_at.desc()).limit(self.max_entries)
+            conn.execute(table.delete().where(table.c.key.not_in(keep.scalar_subquery())))
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(LLMCacheEntry.__table__.delete())
+
+    def size(self):
+        with db.engine.connect() as conn:
+            return conn.execute(db.select(db.func.count()).select_from(LLMCacheEntry.__table__)).scalar()
+
+
+class CompletionCache:
+    def __init__(self, backend, ttl_seconds):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(model, messages, params):
+        normalized = [
+            {"role": m.get("role"), "content": " ".join((m.get("content") or "").split())}
+            for m in messages
+        ]
+        payload = json.dumps(
+            {"model": model, "messages": normalized, "params": params},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def ttl_for(self, messages):
+        """
+        TTL записи: если промпт привязан к сегодняшней дате, запись истекает в полночь.
+        """
+        now = datetime.now()
+        today = now.date().isoformat()
+        if any(today in (m.get("content") or "") for m in messages):
+            midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+            return max(1, min(self.ttl_seconds, int((midnight - now).total_seconds())))
+        return self.ttl_seconds
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _make_backend(name):
+    if name == "memory":
+        return MemoryCacheBackend(LLM_CACHE_MAX_ENTRIES)
+    if name == "sql":
+        return SqlCacheBackend(LLM_CACHE_MAX_ENTRIES)
+    return None
+
+
+completion_cache = CompletionCache(_make_backend(LLM_CACHE_BACKEND), LLM_CACHE_TTL_SECONDS)
+
+
+def chat_completion(model, messages, deadline=None, **params):
+    """
+    Возвращает текст ответа модели, по возможности из кэша.
+    Кэшируются только детерминированные запросы (temperature=0).
+    deadline — бюджет времени на вызов OpenAI (секунды), в ключ кэша не входит.
+    """
+    backend = completion_cache.backend
+    if backend is None or params.get("temperature") != 0:
+        completion_cache.bypassed += 1
+        return openai_client.chat(model, messages, deadline=deadline, **params)
+
+    key = CompletionCache.make_key(model, messages, params)
+    try:
+        cached = backend.get(key)
+    except Exception:
+        logger.exception("LLM cache lookup failed")
+        cached = None
+    if cached is not None:
+        completion_cache.hits += 1
+        return cached
+
+    completion_cache.misses += 1
+    content = openai_client.chat(model, messages, deadline=deadline, **params)
+    if content:
+        try:
+            backend.set(key, content, completion_cache.ttl_for(messages))
+        except Exception:
+            logger.exception("LLM cache store failed")
+    return content
+
+
+def chat_completion_stream(model, messages, deadline=None, **params):
+    """
+    Потоковый ответ модели: генератор кусков текста по мере их генерации.
+    Потоковые запросы не кэшируются.
+    """
+    completion_cache.bypassed += 1
+    return openai_client.chat_stream(model, messages, deadline=deadline, **params)
@@ -0,0 +1,270 @@
+"""
+Единый HTTP-клиент OpenAI для всех AI-маршрутов:
+- общий пул keep-alive соединений (requests.Session + HTTPAdapter);
+- дедлайн на весь вызов (включая повторы);
+- повторы с джиттером для 429/5xx и сетевых ошибок (с учётом Retry-After);
+- circuit breaker: при серии сбоев апстрима сразу отказываем, не занимая воркеры;
+- ограничение одновременных запросов на модель.
+Адрес API задаётся OPENAI_API_BASE, поэтому клиент можно направить на локальный
+фейковый сервер (`flask fake-openai`) с задержками и ошибками.
+"""
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from config.settings import (
+    OPENAI_API_KEY, OPENAI_API_BASE, OPENAI_STUB,
+    OPENAI_TIMEOUT_SECONDS, OPENAI_CONNECT_TIMEOUT_SECONDS,
+    OPENAI_MAX_RETRIES, OPENAI_RETRY_BACKOFF_SECONDS, OPENAI_RETRY_BACKOFF_MAX_SECONDS,
+    OPENAI_POOL_SIZE, OPENAI_MAX_CONCURRENCY_PER_MODEL,
+    OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SECONDS,
+)
+from utils.openai_stub import stub_completion
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenAIClientError(Exception):
+    """Ошибка запроса к OpenAI, которую не имеет смысла повторять (4xx, битый ответ)."""
+
+
+class OpenAIUnavailable(OpenAIClientError):
+    """Апстрим недоступен: открыт circuit breaker, исчерпаны повторы или вышел дедлайн."""
+
+
+class CircuitBreaker:
+    """
+    closed -> (failure_threshold сбоев подряд) -> open -> (reset_timeout) -> half_open.
+    В half_open пропускается один пробный запрос: успех закрывает, сбой снова открывает.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def cancel_trial(self):
+        """
+        Пропущенный запрос так и не ушёл в апстрим — в half_open можно пропустить следующий.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+class OpenAIClient:
+    def __init__(self, api_base, api_key):
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=OPENAI_POOL_SIZE, pool_maxsize=OPENAI_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breaker = CircuitBreaker(OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_RESET_SECONDS)
+        self._model_slots = {}
+        self._slots_lock = threading.Lock()
+        self.retries = 0
+        self.rejected = 0
+
+    def _slot(self, model):
+        with self._slots_lock:
+            if model not in self._model_slots:
+                self._model_slots[model] = threading.BoundedSemaphore(OPENAI_MAX_CONCURRENCY_PER_MODEL)
+            return self._model_slots[model]
+
+    def _backoff(self, attempt, response, deadline):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.replace(".", "", 1).isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(OPENAI_RETRY_BACKOFF_MAX_SECONDS, OPENAI_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+        if time.monotonic() + delay >= deadline:
+            return False
+        time.sleep(delay)
+        return True
+
+    @staticmethod
+    def _iter_body(response, deadline):
+        """
+        Тело ответа по мере поступления. read timeout ограничивает только паузу между байтами,
+        и сервер, отдающий ответ по капле, держал бы запрос сколько угодно — поэтому дедлайн
+        проверяется после каждого чтения, а по его истечении соединение закрывается.
+        """
+        with response:
+            while True:
+                try:
+                    chunk = response.raw.read1(8192, decode_content=True)
+                except (urllib3.exceptions.HTTPError, OSError) as e:
+                    raise requests.ConnectionError(e)
+                if not chunk:
+                    return
+                if time.monotonic() > deadline:
+                    raise OpenAIUnavailable("OpenAI response deadline exceeded")
+                yield chunk
+
+    def _iter_lines(self, response, deadline):
+        buffer = b""
+        for chunk in self._iter_body(response, deadline):
+            *lines, buffer = (buffer + chunk).split(b"\n")
+            for line in lines:
+                yield line.decode("utf-8").rstrip("\r")
+        if buffer:
+            yield buffer.decode("utf-8")
+
+    def _post(self, body, deadline, stream=False):
+        """
+        POST /chat/completions с повторами в пределах дедлайна.
+        Возвращает requests.Response (2xx), тело которого читает вызывающий (stream=True),
+        или тело ответа в байтах, прочитанное целиком до дедлайна.
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise OpenAIUnavailable("OpenAI circuit breaker is open")
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Время ушло до запроса (очередь к модели, паузы между повторами) — это не сбой
+                # апстрима: сбои прошлых попыток уже учтены, а здоровый апстрим breaker не открывает
+                if attempt == 0:
+                    self.breaker.cancel_trial()
+                raise OpenAIUnavailable("OpenAI request deadline exceeded")
+
+            response, payload, failure = None, None, None
+            try:
+                response = self.session.post(
+                    f"{self.api_base}/chat/completions",
+                    headers={"Authorization": f"Bearer {self.api_key}"},
+                    json=body,
+                    stream=True,
+                    timeout=(min(OPENAI_CONNECT_TIMEOUT_SECONDS, remaining), remaining)
+                )
+                if response.status_code < 400 and not stream:
+                    payload = b"".join(self._iter_body(response, deadline))
+            except requests.RequestException as e:
+                failure = str(e)
+            except OpenAIUnavailable:
+                # апстрим отдаёт ответ медленнее дедлайна
+                self.breaker.record_failure()
+                raise
+            else:
+                if response.status_code < 400:
+                    self.breaker.record_success()
+                    return response if stream else payload
+                if response.status_code not in RETRYABLE_STATUSES:
+                    # ошибка запроса, а не апстрима — breaker не трогаем
+                    self.breaker.record_success()
+                    with response:
+                        text = response.raw.read(500, decode_content=True).decode("utf-8", "replace")
+                    raise OpenAIClientError(f"OpenAI returned {response.status_code}: {text}")
+                failure = f"HTTP {response.status_code}"
+                response.close()
+
+            self.breaker.record_failure()
+            logger.warning("OpenAI attempt %s failed: %s", attempt + 1, failure)
+            if attempt >= OPENAI_MAX_RETRIES or not self.breaker.allow():
+                raise OpenAIUnavailable(f"OpenAI is unavailable: {failure}")
+            if not self._backoff(attempt, response, deadline):
+                raise OpenAIUnavailable(f"OpenAI request deadline exceeded after: {failure}")
+            attempt += 1
+            self.retries += 1
+
+    def _acquire(self, model, deadline):
+        slot = self._slot(model)
+        if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.rejected += 1
+            raise OpenAIUnavailable(f"Too many concurrent requests to {model}")
+        return slot
+
+    def chat(self, model, messages, deadline=None, **params):
+        """
+        Текст ответа модели. deadline — бюджет на весь вызов в секундах.
+        """
+        if OPENAI_STUB:
+            return stub_completion(model, messages, **params)
+
+        deadline_at = time.monotonic() + (deadline or OPENAI_TIMEOUT_SECONDS)
+        slot = self._acquire(model, deadline_at)
+        try:
+            payload = self._post({"model": model, "messages": messages, **params}, deadline_at)
+            try:
+                return json.loads(payload)["choices"][0]["message"]["content"]
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                raise OpenAIClientError(f"Unexpected OpenAI response: {e}")
+        finally:
+            slot.release()
+
+    def chat_stream(self, model, messages, deadline=None, **params):
+        """
+        Генератор кусков текста ответа (stream=true). Повторы возможны только до первого байта.
+        """
+        if OPENAI_STUB:
+            content = stub_completion(model, messages, **params)
+            for i in range(0, len(content), 16):
+                yield content[i:i + 16]
+            return
+
+        deadline_at = time.monotonic() + (deadline or OPENAI_TIMEOUT_SECONDS)
+        slot = self._acquire(model, deadline_at)
+        try:
+            response = self._post({"model": model, "messages": messages, "stream": True, **params}, deadline_at, stream=True)
+            for line in self._iter_lines(response, deadline_at):
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            slot.release()
+
+    def stats(self):
+        return {
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "retries": self.retries,
+            "rejected": self.rejected,
+        }
+
+
+openai_client = OpenAIClient(OPENAI_API_BASE, OPENAI_API_KEY)
@@ -0,0 +1,39 @@
+"""
+Локальная заглушка OpenAI (OPENAI_STUB=true): детерминированные ответы без сети.
+Нужна для тестов и локальной разработки AI-эндпоинтов, в том числе асинхронного режима.
+"""
+import json
+import time
+from datetime import date, timedelta
+
+from config.settings import OPENAI_STUB_LATENCY_MS
+
+
+def stub_completion(model, messages, **params):
+    if OPENAI_STUB_LATENCY_MS:
+        time.sleep(OPENAI_STUB_LATENCY_MS / 1000)
+
+    prompt = "\n".join(m.get("content") or "" for m in messages)
+    today = date.today()
+
+    if '"busy_start"' in prompt:
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        return json.dumps({"busy_start": tomorrow, "busy_end": tomorrow})
+
+    if '"updates"' in prompt:
+        return json.dumps({"updates": []})
+
+    if '"goal_title"' in prompt:
+        return json.dumps({
+            "goal_title": "Цель (stub)",
+            "steps": [
+                {
+                    "title": f"Шаг {i + 1} (stub)",
+                    "description": "",
+                    "date": (today + timedelta(days=1 + 2 * i)).isoformat()
+                }
+                for i in range(3)
+            ]
+        }, ensure_ascii=False)
+
+    return "{}"
@@ -0,0 +1,72 @@
+"""
+Keyset-пагинация и выборочные поля (?limit=&cursor=&fields=) для списков.
+Курсор — непрозрачная строка (base64 от JSON с ключом сортировки последней строки страницы),
+клиент просто передаёт значение заголовка X-Next-Cursor в следующий запрос.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from config.settings import PAGE_LIMIT_DEFAULT, PAGE_LIMIT_MAX
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class ListingParamsError(ValueError):
+    """Некорректные limit/cursor/fields — отвечаем 400."""
+
+
+def encode_cursor(*values):
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, types):
+    """
+    Разбирает курсор в кортеж значений типов types (datetime или int; None допускается).
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(
+            None if value is None else (datetime.fromisoformat(value) if kind is datetime else kind(value))
+            for value, kind in zip(values, types)
+        )
+    except (ValueError, TypeError, binascii.Error):
+        raise ListingParamsError("Invalid cursor")
+
+
+def parse_page(args):
+    """
+    (limit, cursor) из query-параметров; (None, None), если пагинация не запрошена.
+    """
+    limit, cursor = args.get("limit"), args.get("cursor")
+    if limit is None and cursor is None:
+        return None, None
+    if limit is None:
+        return PAGE_LIMIT_DEFAULT, cursor
+    try:
+        limit = int(limit)
+    except ValueError:
+        raise ListingParamsError("Field 'limit' must be an integer")
+    if limit < 1:
+        raise ListingParamsError("Field 'limit' must be positive")
+    return min(limit, PAGE_LIMIT_MAX), cursor
+
+
+def parse_fields(value, allowed):
+    """
+    Список запрошенных полей (в порядке allowed) из строки "id,title,color"; по умолчанию — все.
+    """
+    if not value:
+        return list(allowed)
+    requested = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ListingParamsError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [name for name in allowed if name in requested]
+
@@ -0,0 +1,96 @@
+"""
+Хэширование паролей вне потока запроса.
+PBKDF2 считается в ограниченном пуле процессов (PASSWORD_HASH_WORKERS), чтобы всплеск
+логинов не занимал CPU и GIL воркера, обслуживающего остальные запросы. Сверх
+PASSWORD_HASH_QUEUE_SIZE ожидающих хэшей новые ждут не дольше PASSWORD_HASH_WAIT_SECONDS,
+после чего запрос получает 503. PASSWORD_HASH_WORKERS=0 — считать в самом потоке запроса.
+
+Стоимость задаётся PASSWORD_HASH_METHOD (например, "pbkdf2:sha256:600000"); хэши,
+посчитанные с другим методом, пересчитываются при следующем успешном входе.
+
+Процессы пула запускаются через forkserver (или spawn), а не fork: fork многопоточного
+воркера может унести в дочерний процесс замки, захваченные другими потоками, и зависнуть.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+from config.settings import (
+    PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_WAIT_SECONDS
+)
+
+
+def _pool_context():
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(start_method)
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Очередь хэширования заполнена — отвечаем 503."""
+
+
+class PasswordHasher:
+    def __init__(self, workers, queue_size, wait_seconds):
+        self.workers = workers
+        self.wait_seconds = wait_seconds
+        self._slots = threading.BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Пул создаётся лениво в каждом процессе (после fork воркера gunicorn), а не при импорте
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise PasswordHasherBusy("Password hashing queue is full")
+        try:
+            return self._pool().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE, PASSWORD_HASH_WAIT_SECONDS)
+
+
+def hash_password(password, method=PASSWORD_HASH_METHOD):
+    return password_hasher.run(generate_password_hash, password, method)
+
+
+def verify_password(pwhash, password):
+    return password_hasher.run(check_password_hash, pwhash, password)
+
+
+def effective_method(method):
+    """
+    Метод так, как werkzeug запишет его в хэш: "pbkdf2:sha256" -> "pbkdf2:sha256:260000"
+    (число итераций по умолчанию подставляется). Остальные методы — как есть.
+    """
+    parts = method.split(":")
+    if parts[0] != "pbkdf2" or len(parts) not in (2, 3):
+        return method
+    iterations = int(parts[2] or 0) if len(parts) == 3 else DEFAULT_PBKDF2_ITERATIONS
+    return f"pbkdf2:{parts[1]}:{iterations}"
+
+
+def needs_rehash(pwhash, method=PASSWORD_HASH_METHOD):
+    """
+    Хэш посчитан не тем методом/числом итераций, что сейчас в настройках.
+    """
+    return effective_method(pwhash.split("$", 1)[0]) != effective_method(method)
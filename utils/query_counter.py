@@ -0,0 +1,35 @@
+"""
+Подсчёт SQL-запросов, которые реально уходят в базу, — для проверки эндпоинтов на N+1.
+
+    with count_queries() as queries:
+        client.get('/api/goals/with-steps', headers=headers)
+    assert queries.count <= 2, queries.statements
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from extensions import db
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None):
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._before_cursor_execute)
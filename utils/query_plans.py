@@ -0,0 +1,89 @@
+"""
+Проверка планов горячих запросов: ни один не должен читать таблицу целиком.
+
+На Postgres запрос объясняется с SET LOCAL enable_seqscan = off: на пустой или маленькой
+таблице планировщик и так выбрал бы Seq Scan, а с выключенным seqscan он остаётся в плане,
+только если подходящего индекса нет. На SQLite ищем в EXPLAIN QUERY PLAN строки "SCAN <таблица>".
+"""
+import json
+from datetime import date
+
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from extensions import db
+from models.day_load_model import DayLoad
+from models.goal_model import Goal
+from models.step_model import Step
+from models.user_model import User
+
+
+class _Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement, prefix):
+        self.statement = statement
+        self.prefix = prefix
+
+
+@compiles(_Explain)
+def _compile_explain(element, compiler, **kw):
+    return f"{element.prefix} {compiler.process(element.statement, **kw)}"
+
+
+def hot_queries():
+    """
+    {имя: SQLAlchemy-запрос} — запросы, которые выполняются на каждом экране приложения.
+    """
+    # Импорт здесь: маршруты импортируют модели, а не наоборот
+    from routes.goals_routes import steps_in_range_query
+
+    user_id, goal_id, today = 1, 1, date.today()
+    return {
+        "goals of user": db.select(Goal.id, Goal.title).where(Goal.user_id == user_id),
+        "steps of user's goals": db.select(Step.id).join(Goal).where(Goal.user_id == user_id),
+        "steps of goal": db.select(Step.id, Step.title).where(Step.goal_id == goal_id),
+        "done steps of goal": db.select(db.func.count(Step.id)).where(Step.goal_id == goal_id, Step.status == 'done'),
+        "calendar window": steps_in_range_query(user_id, today, today),
+        "user by email": db.select(User.id).where(User.email == "user@example.com"),
+        "reset token lookup": db.select(User.id).where(User.reset_token == "1234"),
+        "day load window": db.select(DayLoad.day, DayLoad.task_count).where(
+            DayLoad.user_id == user_id, DayLoad.day >= today
+        ),
+    }
+
+
+def _postgres_seq_scans(conn, statement):
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.execute(_Explain(statement, "EXPLAIN (FORMAT JSON)")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    scans, nodes = [], [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node.get("Relation Name"))
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+
+def _sqlite_seq_scans(conn, statement):
+    tables = set(db.metadata.tables)
+    scans = []
+    for row in conn.execute(_Explain(statement, "EXPLAIN QUERY PLAN")):
+        words = row[-1].split()
+        if len(words) >= 2 and words[0] == "SCAN" and words[1] in tables:
+            scans.append(words[1])
+    return scans
+
+
+def seq_scans(statement):
+    """
+    Таблицы, которые запрос читает полным сканированием.
+    """
+    with db.engine.connect() as conn:
+        with conn.begin():
+            if conn.dialect.name == "postgresql":
+                return _postgres_seq_scans(conn, statement)
+            return _sqlite_seq_scans(conn, statement)
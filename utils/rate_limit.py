@@ -0,0 +1,301 @@
+"""
+Ограничение частоты запросов скользящим окном — до любой работы с БД и хэширования пароля.
+
+Лимит "ключ:число/период" (см. RATE_LIMIT_* в config/settings.py) считается по ключу
+запроса: ip — адрес клиента, user — id из JWT (декоратор ставится под @jwt_required),
+email — адрес из JSON-тела (вход, восстановление пароля), global — один счётчик на маршрут
+(например, перебор кода сброса пароля с разных адресов). Если ключа в запросе нет,
+лимит пропускается. Алгоритм — sliding window counter: хранятся счётчики текущего
+и предыдущего окна, оценка = предыдущий * (непрошедшая доля текущего окна) + текущий.
+Все лимиты маршрута проверяются вместе: запрос учитывается, только если прошёл все,
+отклонённый не учитывается ни в одном. Ответ на превышение — 429 с Retry-After.
+
+Бэкенды (RATE_LIMIT_BACKEND):
+- "memory" — счётчики в памяти процесса (каждый воркер gunicorn считает сам по себе);
+- "sql" — таблица rate_limit_counters, общая для всех воркеров;
+- "none" — лимиты выключены;
+- "пакет.модуль:фабрика" — свой бэкенд (например, Redis): фабрика без аргументов возвращает
+  объект с атрибутом name и методом hit(checks): checks — [(key, limit, window)], результат —
+  0 (все прошли, все учтены) или секунды до повтора (ничего не учтено).
+Если бэкенд недоступен, запрос пропускается (ошибка пишется в лог).
+"""
+import hashlib
+import importlib
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from functools import wraps
+
+from flask import request, jsonify
+from flask_jwt_extended import get_jwt_identity
+
+from config.settings import RATE_LIMIT_BACKEND, RATE_LIMIT_TRUSTED_PROXIES
+from extensions import db
+from models.rate_limit_model import RateLimitCounter
+from utils.day_load import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+Limit = namedtuple("Limit", "scope count window")
+
+
+def parse_limits(spec):
+    """
+    "ip:20/minute;email:5/minute" -> [Limit("ip", 20, 60), Limit("email", 5, 60)].
+    """
+    limits = []
+    for part in (spec or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            scope, rate = part.split(":", 1)
+            count, period = rate.split("/", 1)
+            limit = Limit(scope.strip(), int(count), PERIODS[period.strip()])
+        except (ValueError, KeyError):
+            raise ValueError(f"Invalid rate limit '{part}'")
+        if limit.scope not in SCOPES or limit.count <= 0:
+            raise ValueError(f"Invalid rate limit '{part}'")
+        limits.append(limit)
+    return limits
+
+
+def client_ip():
+    """
+    Адрес клиента. За RATE_LIMIT_TRUSTED_PROXIES прокси берём адрес, который дописал в
+    X-Forwarded-For самый внешний из них: то, что левее, клиент может подставить сам.
+    """
+    forwarded = request.headers.get("X-Forwarded-For")
+    if RATE_LIMIT_TRUSTED_PROXIES and forwarded:
+        addresses = [address.strip() for address in forwarded.split(",")]
+        return addresses[max(len(addresses) - RATE_LIMIT_TRUSTED_PROXIES, 0)]
+    return request.remote_addr
+
+
+def _jwt_user():
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # JWT в этом запросе не проверялся
+        return None
+    return str(identity) if identity is not None else None
+
+
+def _body_email():
+    data = request.get_json(silent=True)
+    email = data.get("email") if isinstance(data, dict) else None
+    if not isinstance(email, str) or not email.strip():
+        return None
+    return email.strip().lower()
+
+
+# Ключ лимита -> значение для текущего запроса (None — лимит к запросу не применяется)
+SCOPES = {
+    "ip": client_ip,
+    "user": _jwt_user,
+    "email": _body_email,
+    "global": lambda: "global",
+}
+
+
+def retry_after(previous, current, limit, window, elapsed):
+    """
+    0, если ещё один запрос укладывается в лимит, иначе через сколько секунд уложится.
+    previous/current — запросы в предыдущем и текущем окне (без этого), elapsed — сколько прошло от начала текущего.
+    """
+    if previous * (1 - elapsed / window) + current + 1 <= limit:
+        return 0
+    if current + 1 > limit:
+        # В этом окне уже не уложиться: ждём следующего, где current станет предыдущим
+        return window - elapsed + window * (1 - (limit - 1) / current)
+    return window * (1 - (limit - current - 1) / previous) - elapsed
+
+
+class MemoryRateLimitBackend:
+    """
+    Счётчики в памяти процесса; устаревшие окна удаляются раз в PRUNE_EVERY запросов.
+    """
+    name = "memory"
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._counters = {}   # key -> [window, номер окна, запросов в предыдущем, в текущем]
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def _counter(self, key, window, number):
+        counter = self._counters.get(key)
+        if counter is None or counter[1] < number - 1:
+            counter = self._counters[key] = [window, number, 0, 0]
+        elif counter[1] == number - 1:
+            counter[1:] = [number, counter[3], 0]
+        return counter
+
+    def hit(self, checks):
+        now = time.time()
+        with self._lock:
+            counters, wait = [], 0
+            for key, limit, window in checks:
+                number = int(now // window)
+                counter = self._counter(key, window, number)
+                counters.append(counter)
+                wait = max(wait, retry_after(counter[2], counter[3], limit, window, now - number * window))
+            if not wait:
+                for counter in counters:
+                    counter[3] += 1
+
+            self._hits += 1
+            if self._hits % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        for key, (window, number, _, _) in list(self._counters.items()):
+            if number < int(now // window) - 1:
+                del self._counters[key]
+
+
+class SqlRateLimitBackend:
+    """
+    Счётчики в таблице rate_limit_counters через отдельное соединение (вне транзакции запроса):
+    INSERT ... ON CONFLICT DO UPDATE SET count = count + 1 атомарен между воркерами,
+    отклонённый запрос в той же транзакции возвращает все свои счётчики обратно.
+    Раз в PRUNE_EVERY запросов процесс удаляет окна, которые уже не нужны для оценки.
+    """
+    name = "sql"
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._hits = 0
+        self._lock = threading.Lock()
+
+    def hit(self, checks):
+        table = RateLimitCounter.__table__
+        now = time.time()
+        insert = dialect_insert(table)
+
+        with db.engine.begin() as conn:
+            counted, wait = [], 0
+            for key, limit, window in checks:
+                number = int(now // window)
+                stmt = insert.values(
+                    key=key,
+                    window=number,
+                    count=1,
+                    # Окно нужно, пока оно текущее или предыдущее
+                    expires_at=datetime.utcfromtimestamp((number + 2) * window)
+                )
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.key, table.c.window],
+                    set_={"count": table.c.count + 1}
+                ).returning(table.c.count)
+                current = conn.execute(stmt).scalar_one()
+                counted.append((key, number))
+                previous = conn.execute(
+                    db.select(table.c.count).where(table.c.key == key, table.c.window == number - 1)
+                ).scalar() or 0
+                wait = max(wait, retry_after(previous, current - 1, limit, window, now - number * window))
+            if wait:
+                for key, number in counted:
+                    conn.execute(
+                        table.update()
+                        .where(table.c.key == key, table.c.window == number)
+                        .values(count=table.c.count - 1)
+                    )
+
+        with self._lock:
+            self._hits += 1
+            prune = self._hits % self.PRUNE_EVERY == 0
+        if prune:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.expires_at < datetime.utcnow()))
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def make_key(name, limit, value):
+        # Значение хэшируется: ключ ограниченной длины и без адресов почты в хранилище
+        digest = hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+        return f"{name}:{limit.scope}:{limit.window}:{digest}"
+
+    def check(self, name, limits):
+        """
+        0, если запрос пропущен (и учтён во всех лимитах), иначе через сколько секунд повторить
+        (тогда он не учтён ни в одном).
+        """
+        if self.backend is None:
+            return 0
+        checks = []
+        for limit in limits:
+            value = SCOPES[limit.scope]()
+            if value is not None:
+                checks.append((self.make_key(name, limit, value), limit.count, limit.window))
+        if not checks:
+            return 0
+        try:
+            wait = self.backend.hit(checks)
+        except Exception:
+            logger.exception("Rate limit check failed")
+            return 0
+        if wait:
+            self.rejected += 1
+            return wait
+        self.allowed += 1
+        return 0
+
+    def stats(self):
+        return {
+            "backend": self.backend.name if self.backend else "none",
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+        }
+
+
+def _make_backend(name):
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    if name == "sql":
+        return SqlRateLimitBackend()
+    if ":" in name:
+        module_name, factory_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), factory_name)()
+    return None
+
+
+rate_limiter = RateLimiter(_make_backend(RATE_LIMIT_BACKEND))
+
+
+def rate_limit(name, spec):
+    """
+    Декоратор маршрута: name — общий счётчик (один на несколько маршрутов), spec — лимиты из настроек.
+    Некорректный spec — ошибка при импорте, а не на первом запросе.
+    """
+    limits = parse_limits(spec)
+
+    def decorator(view):
+        if not limits:
+            return view
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            wait = rate_limiter.check(name, limits)
+            if wait:
+                response = jsonify({"message": "Too many requests, try again later"})
+                response.headers["Retry-After"] = str(max(1, math.ceil(wait)))
+                return response, 429
+            return view(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
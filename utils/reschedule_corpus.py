@@ -0,0 +1,67 @@
+"""
+Размеченный корпус переносов диапазона для `flask eval-reschedule`.
+Каждый случай: (название, задачи [(task_id, дата)], busy_start, busy_end, ожидание).
+Ожидание — {task_id: новая дата} от plan_range_shift (задачи, которых нет в словаре,
+остаются на месте) или None, если локально случай не решается и уходит в GPT.
+"""
+from datetime import date
+
+# "Сегодня" для промпта GPT-пути
+RESCHEDULE_TODAY = date(2025, 3, 20)
+
+RESCHEDULE_CASES = [
+    (
+        "интервалы между задачами сохраняются, задачи до периода не трогаем",
+        [(1, date(2025, 3, 25)), (2, date(2025, 4, 1)), (3, date(2025, 4, 5)), (4, date(2025, 4, 10))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        {2: date(2025, 4, 4), 3: date(2025, 4, 8), 4: date(2025, 4, 13)},
+    ),
+    (
+        "две задачи на одном дне — сдвигается только столкнувшаяся, остальные сохраняют смещение",
+        [(1, date(2025, 4, 1)), (2, date(2025, 4, 1)), (3, date(2025, 4, 2)), (4, date(2025, 4, 6))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        {1: date(2025, 4, 4), 2: date(2025, 4, 5), 3: date(2025, 4, 6), 4: date(2025, 4, 9)},
+    ),
+    (
+        "столкновение в начале не уводит последнюю задачу за горизонт LOCAL_SHIFT_HORIZON_DAYS",
+        [(1, date(2025, 4, 1)), (2, date(2025, 4, 1)), (3, date(2025, 4, 1)), (4, date(2028, 3, 30))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        {1: date(2025, 4, 4), 2: date(2025, 4, 5), 3: date(2025, 4, 6), 4: date(2028, 4, 2)},
+    ),
+    (
+        "задачи сразу за периодом не сталкиваются с перенесёнными",
+        [(1, date(2025, 4, 2)), (2, date(2025, 4, 3)), (3, date(2025, 4, 4)), (4, date(2025, 4, 5))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        {1: date(2025, 4, 4), 2: date(2025, 4, 5), 3: date(2025, 4, 6), 4: date(2025, 4, 7)},
+    ),
+    (
+        "первая задача начинается внутри периода",
+        [(1, date(2025, 4, 5)), (2, date(2025, 4, 8)), (3, date(2025, 4, 20))],
+        date(2025, 4, 1), date(2025, 4, 10),
+        {1: date(2025, 4, 11), 2: date(2025, 4, 14), 3: date(2025, 4, 26)},
+    ),
+    (
+        "в периоде нет задач — ничего не переносим",
+        [(1, date(2025, 3, 30)), (2, date(2025, 4, 10))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        {},
+    ),
+    (
+        "у пользователя нет задач с начала периода — GPT",
+        [(1, date(2025, 3, 30))],
+        date(2025, 4, 1), date(2025, 4, 3),
+        None,
+    ),
+    (
+        "сдвиг уводит задачи дальше горизонта LOCAL_SHIFT_HORIZON_DAYS — GPT",
+        [(1, date(2025, 4, 1)), (2, date(2028, 6, 1))],
+        date(2025, 4, 1), date(2025, 4, 30),
+        None,
+    ),
+    (
+        "период из одного дня — не режим диапазона",
+        [(1, date(2025, 4, 1))],
+        date(2025, 4, 1), date(2025, 4, 1),
+        None,
+    ),
+]
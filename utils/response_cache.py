@@ -0,0 +1,256 @@
+"""
+Кэш готовых JSON-ответов читающих эндпоинтов целей/шагов (байты тела + нужные заголовки).
+Ключ — пользователь, его data_version и путь с query string, поэтому после любой записи
+(bump_data_version) старые записи уже недостижимы, даже в кэшах других воркеров.
+Вдобавок bump_data_version сразу удаляет записи пользователя, чтобы они не занимали место.
+
+Бэкенды (RESPONSE_CACHE_BACKEND):
+- "memory" — LRU в памяти процесса с ограничением по суммарному размеру тел;
+- "sql" — таблица response_cache_entries, общая для всех воркеров gunicorn;
+- "none" — кэш выключен;
+- "пакет.модуль:фабрика" — свой бэкенд (например, Redis): фабрика принимает max_bytes
+  и возвращает объект с методами get/set/invalidate_user/clear/size_bytes и атрибутом name.
+"""
+import hashlib
+import importlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import request, current_app
+
+from config.settings import RESPONSE_CACHE_BACKEND, RESPONSE_CACHE_MAX_BYTES
+from extensions import db
+from models.response_cache_model import ResponseCacheEntry
+from utils.pagination import NEXT_CURSOR_HEADER
+
+logger = logging.getLogger(__name__)
+
+# Заголовки ответа, которые сохраняются вместе с телом
+CACHED_HEADERS = (NEXT_CURSOR_HEADER,)
+
+
+class MemoryResponseBackend:
+    """
+    LRU в памяти процесса; вытесняет самые давно использованные записи,
+    пока суммарный размер тел не станет меньше max_bytes.
+    """
+    name = "memory"
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # key -> (user_id, body, headers)
+        self._user_keys = {}            # user_id -> set(key)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def set(self, key, user_id, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (user_id, body, headers)
+            self._user_keys.setdefault(user_id, set()).add(key)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id, body, _ = entry
+        self._bytes -= len(body)
+        keys = self._user_keys.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+            self._bytes = 0
+
+    def size_bytes(self):
+        return self._bytes
+
+
+class SqlResponseBackend:
+    """
+    Кэш в таблице response_cache_entries через отдельное соединение (вне транзакции запроса).
+    last_used_at обновляется не чаще раза в TOUCH_INTERVAL, чтобы чтение из кэша
+    почти никогда не превращалось в запись; раз в PRUNE_EVERY записей вытесняются
+    самые давно использованные строки сверх max_bytes.
+    """
+    name = "sql"
+    PRUNE_EVERY = 100
+    TOUCH_INTERVAL = timedelta(minutes=1)
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        table = ResponseCacheEntry.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(table.c.body, table.c.headers).where(table.c.key == key)
+            ).first()
+            if row is None:
+                return None
+            conn.execute(
+                table.update()
+                .where(table.c.key == key, table.c.last_used_at < now - self.TOUCH_INTERVAL)
+                .values(last_used_at=now)
+            )
+        return row.body, json.loads(row.headers)
+
+    def set(self, key, user_id, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        table = ResponseCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key))
+            conn.execute(table.insert().values(
+                key=key,
+                user_id=user_id,
+                body=body,
+                headers=json.dumps(headers),
+                size=len(body),
+                last_used_at=datetime.utcnow()
+            ))
+
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        table = ResponseCacheEntry.__table__
+        with db.engine.begin() as conn:
+            rows = conn.execute(
+                db.select(table.c.key, table.c.size).order_by(table.c.last_used_at.desc())
+            )
+            total, evict = 0, []
+            for key, size in rows:
+                total += size
+                if total > self.max_bytes:
+                    evict.append(key)
+            for start in range(0, len(evict), 500):
+                conn.execute(table.delete().where(table.c.key.in_(evict[start:start + 500])))
+
+    def invalidate_user(self, user_id):
+        table = ResponseCacheEntry.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.user_id == user_id))
+
+    def clear(self):
+        with db.engine.begin() as conn:
+            conn.execute(ResponseCacheEntry.__table__.delete())
+
+    def size_bytes(self):
+        table = ResponseCacheEntry.__table__
+        with db.engine.connect() as conn:
+            return conn.execute(db.select(db.func.coalesce(db.func.sum(table.c.size), 0))).scalar()
+
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    @staticmethod
+    def make_key(user_id, version, path):
+        return hashlib.sha256(f"{user_id}:{version}:{path}".encode("utf-8")).hexdigest()
+
+    def lookup(self, user_id, version):
+        """
+        Кэшированный ответ на текущий запрос или None.
+        """
+        if self.backend is None:
+            return None
+        try:
+            cached = self.backend.get(self.make_key(user_id, version, request.full_path))
+        except Exception:
+            logger.exception("Response cache lookup failed")
+            cached = None
+        if cached is None:
+            self.misses += 1
+            return None
+
+        body, headers = cached
+        self.hits += 1
+        self.bytes_saved += len(body)
+        response = current_app.response_class(body, status=200, mimetype="application/json")
+        response.headers.update(headers)
+        return response
+
+    def store(self, user_id, version, response):
+        if self.backend is None:
+            return
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        try:
+            self.backend.set(
+                self.make_key(user_id, version, request.full_path),
+                user_id,
+                response.get_data(),
+                headers
+            )
+        except Exception:
+            logger.exception("Response cache store failed")
+
+    def invalidate_user(self, user_id):
+        if self.backend is None:
+            return
+        try:
+            self.backend.invalidate_user(user_id)
+        except Exception:
+            # Не страшно: ключи версионированы, старые записи всё равно недостижимы
+            logger.exception("Response cache invalidation failed")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "bytes_stored": self.backend.size_bytes() if self.backend else 0,
+        }
+
+
+def _make_backend(name):
+    if name == "memory":
+        return MemoryResponseBackend(RESPONSE_CACHE_MAX_BYTES)
+    if name == "sql":
+        return SqlResponseBackend(RESPONSE_CACHE_MAX_BYTES)
+    if ":" in name:
+        module_name, factory_name = name.split(":", 1)
+        return getattr(importlib.import_module(module_name), factory_name)(RESPONSE_CACHE_MAX_BYTES)
+    return None
+
+
+response_cache = ResponseCache(_make_backend(RESPONSE_CACHE_BACKEND))
@@ -0,0 +1,211 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from extensions import db
+from models.goal_model import Goal
+from models.step_model import Step
+from utils.day_load import get_day_load, bump_day_loads, to_day
+
+
+class DayLoadCalendar:
+    """
+    Календарь загрузки пользователя в памяти: { date: tasks_count } + быстрый поиск
+    ближайшего дня, где задач меньше max_tasks. Загружается одним запросом к day_loads,
+    дальше все размещения шагов идут без обращения к БД и сразу учитываются.
+    """
+
+    def __init__(self, loads, max_tasks):
+        self.loads = Counter(loads)
+        self.max_tasks = max_tasks
+        self.added = Counter()
+        # Для заполненных дней — ссылка "куда прыгать дальше" (со сжатием путей),
+        # чтобы серия заполненных дней не проходилась заново при каждом размещении.
+        self._skip = {}
+
+    @classmethod
+    def load(cls, user_id, start, max_tasks):
+        return cls(get_day_load(user_id, start=start), max_tasks)
+
+    def _is_full(self, day):
+        return self.loads.get(day, 0) >= self.max_tasks
+
+    def next_free(self, day):
+        """
+        Ближайший день начиная с day, где ещё есть место.
+        """
+        day = to_day(day)
+        path = []
+        while self._is_full(day):
+            path.append(day)
+            day = self._skip.get(day, day + timedelta(days=1))
+        for full_day in path:
+            self._skip[full_day] = day
+        return day
+
+    def release(self, day):
+        """
+        Убирает одну задачу с дня day (задача переносится).
+        """
+        day = to_day(day)
+        if day is None:
+            return
+        was_full = self._is_full(day)
+        self.loads[day] -= 1
+        self.added[day] -= 1
+        if was_full and not self._is_full(day):
+            # день освободился — ранее сжатые переходы через него больше не верны
+            self._skip.clear()
+
+    def place(self, day):
+        """
+        Ставит задачу на ближайший свободный день начиная с day и возвращает этот день.
+        """
+        free_day = self.next_free(day)
+        self.loads[free_day] += 1
+        self.added[free_day] += 1
+        return free_day
+
+
+def _parse_update(update):
+    try:
+        task_id = int(update.get("task_id"))
+        new_date = datetime.fromisoformat(update.get("new_date")).date()
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return task_id, new_date
+
+
+def apply_reschedule_updates(user_id, updates):
+    """
+    Применяет список {"task_id", "new_date"} к шагам пользователя:
+    1) одним запросом достаёт все упомянутые шаги пользователя (проверка владения — в SQL);
+    2) один раз загружает календарь и разрешает конфликты в памяти — каждая задача
+       ставится на полностью свободный день, и уже перенесённые задачи учитываются следующими;
+    3) пишет все новые даты одним bulk UPDATE.
+    Чужие/несуществующие шаги и некорректные даты пропускаются.
+    Возвращает список {"task_id", "new_date"} реально перенесённых шагов. Коммит — на вызывающем.
+    """
+    parsed = [p for p in (_parse_update(u) for u in updates if isinstance(u, dict)) if p]
+    if not parsed:
+        return []
+
+    task_ids = {task_id for task_id, _ in parsed}
+    rows = db.session.query(Step.id, Step.date).join(Goal, Step.goal_id == Goal.id).filter(
+        Goal.user_id == user_id,
+        Step.id.in_(task_ids)
+    ).all()
+    current_dates = {step_id: to_day(date) for step_id, date in rows}
+    if not current_dates:
+        return []
+
+    known_days = [d for d in current_dates.values() if d] + [d for _, d in parsed]
+    calendar = DayLoadCalendar.load(user_id, start=min(known_days), max_tasks=1)
+
+    new_dates = {}
+    for task_id, proposed in parsed:
+        if task_id not in current_dates:
+            continue
+        calendar.release(current_dates[task_id])
+        free_day = calendar.place(proposed)
+        current_dates[task_id] = free_day
+        new_dates[task_id] = free_day
+
+    db.session.execute(db.update(Step), [
+        {"id": task_id, "date": datetime.combine(day, datetime.min.time())}
+        for task_id, day in new_dates.items()
+    ])
+    bump_day_loads(user_id, calendar.added)
+
+    return [
+        {"task_id": task_id, "new_date": day.isoformat()}
+        for task_id, day in new_dates.items()
+    ]
+
+
+# Дальше этого горизонта локальный сдвиг не считаем — такой запрос отдаём GPT
+LOCAL_SHIFT_HORIZON_DAYS = 3 * 365
+
+
+def _final_dates(tasks, updates):
+    final = {task_id: to_day(date) for task_id, date in tasks}
+    for parsed in (_parse_update(u) for u in updates if isinstance(u, dict)):
+        if parsed and parsed[0] in final:
+            final[parsed[0]] = parsed[1]
+    return final
+
+
+def range_shift_violations(tasks, updates, busy_start, busy_end):
+    """
+    Проверяет результат переноса для режима диапазона и возвращает список нарушений:
+    - ни одна задача не осталась внутри [busy_start..busy_end];
+    - задачи двигаются только вперёд;
+    - порядок задач сохраняется;
+    - две задачи не оказываются на одном дне.
+    tasks — [(task_id, datetime)] задач начиная с busy_start, updates — [{"task_id", "new_date"}].
+    """
+    shifted = sorted(
+        (to_day(date), task_id) for task_id, date in tasks
+        if date is not None and to_day(date) >= busy_start
+    )
+    final = _final_dates([(task_id, day) for day, task_id in shifted], updates)
+
+    violations = []
+    seen_days = {}
+    previous = None
+    for old_day, task_id in shifted:
+        new_day = final[task_id]
+        if busy_start <= new_day <= busy_end:
+            violations.append(f"task {task_id} stays inside busy period on {new_day.isoformat()}")
+        if new_day < old_day:
+            violations.append(f"task {task_id} moved backwards to {new_day.isoformat()}")
+        if previous is not None and new_day < previous:
+            violations.append(f"task {task_id} changed its order relative to previous task")
+        if new_day in seen_days:
+            violations.append(f"tasks {seen_days[new_day]} and {task_id} share {new_day.isoformat()}")
+        seen_days[new_day] = task_id
+        previous = new_day
+    return violations
+
+
+def plan_range_shift(tasks, busy_start, busy_end):
+    """
+    Локальный перенос задач из периода занятости [busy_start..busy_end].
+    Все задачи начиная с busy_start сдвигаются на одно и то же смещение, так что первая
+    из них встаёт на busy_end + 1 день, а интервалы между задачами сохраняются.
+    Если две задачи попадают на один день, только следующая из них сдвигается на первый
+    день после предыдущей; остальные задачи сохраняют общее смещение.
+
+    tasks — [(task_id, datetime)]. Возвращает updates [{"task_id", "new_date"}]
+    в порядке убывания новой даты (так их можно применять без ложных конфликтов
+    со старыми датами ещё не перенесённых задач) или None, если запрос локально
+    не решается и его нужно отдать GPT.
+    """
+    if busy_end <= busy_start:
+        return None
+
+    shifted = sorted(
+        (to_day(date), task_id) for task_id, date in tasks
+        if date is not None and to_day(date) >= busy_start
+    )
+    if not shifted:
+        return None
+    if not any(busy_start <= day <= busy_end for day, _ in shifted):
+        return []
+
+    offset = (busy_end - shifted[0][0]).days + 1
+    planned = []
+    last_day = None
+    for old_day, task_id in shifted:
+        new_day = old_day + timedelta(days=offset)
+        if last_day is not None and new_day <= last_day:
+            new_day = last_day + timedelta(days=1)
+        planned.append({"task_id": task_id, "new_date": new_day.isoformat()})
+        last_day = new_day
+
+    if (last_day - busy_end).days > LOCAL_SHIFT_HORIZON_DAYS:
+        return None
+
+    planned.reverse()
+    if range_shift_violations([(t, d) for d, t in shifted], planned, busy_start, busy_end):
+        return None
+    return planned
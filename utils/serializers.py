@@ -0,0 +1,129 @@
+"""
+Сериализация целей и шагов в JSON прямо из строк Core-выборок, без ORM-объектов.
+
+Поля описаны один раз (GOAL_FIELDS, STEP_FIELDS: имя в ответе -> SQL-колонка).
+row_serializer(stmt) заранее, по выбранным колонкам, решает, какие значения — даты
+(isoformat), а какие копируются как есть, поэтому строка превращается в dict без проверки
+типа каждого значения. Поля цели, повторяющиеся в каждом шаге (goal_name, color), в запрос
+шагов не выбираются, а берутся у уже выбранной цели (см. STEP_PARENT_FIELDS).
+
+json_response кодирует тело через orjson, если он установлен и FAST_JSON включён,
+иначе — обычным JSON-провайдером Flask.
+"""
+from operator import itemgetter
+
+from flask import current_app
+
+from config.settings import FAST_JSON
+from extensions import db
+from models.goal_model import Goal
+from models.step_model import Step
+
+try:
+    import orjson
+except ImportError:  # необязательная зависимость
+    orjson = None
+
+GOAL_FIELDS = {
+    "id": Goal.id,
+    "title": Goal.title,
+    "description": Goal.description,
+    "color": Goal.color,
+    "progress": Goal.progress,
+    "created_at": Goal.created_at,
+    "updated_at": Goal.updated_at,
+}
+STEP_FIELDS = {
+    "id": Step.id,
+    "goal_id": Step.goal_id,
+    "goal_name": Goal.title,
+    "color": Goal.color,
+    "title": Step.title,
+    "description": Step.description,
+    "status": Step.status,
+    "date": Step.date,
+    "created_at": Step.created_at,
+    "updated_at": Step.updated_at,
+}
+# Поля шага, которые одинаковы у всех шагов цели и берутся из строки цели
+STEP_PARENT_FIELDS = {
+    "goal_name": Goal.title,
+    "color": Goal.color,
+}
+_PARENT_PREFIX = "_parent_"
+
+
+def split_step_fields(step_fields):
+    """
+    (поля, которые выбираются из строк шагов; поля, которые берутся у цели).
+    """
+    own = [name for name in step_fields if name not in STEP_PARENT_FIELDS]
+    inherited = [name for name in step_fields if name in STEP_PARENT_FIELDS]
+    return own, inherited
+
+
+def parent_columns(inherited):
+    """
+    Скрытые колонки для выборки целей, из которых потом собираются поля шагов.
+    """
+    return [STEP_PARENT_FIELDS[name].label(_PARENT_PREFIX + name) for name in inherited]
+
+
+def parent_values(goal_row, inherited):
+    """
+    Поля шага из строки цели, выбранной вместе с parent_columns(inherited).
+    """
+    return {name: getattr(goal_row, _PARENT_PREFIX + name) for name in inherited}
+
+
+def row_serializer(stmt):
+    """
+    Функция (row, parent=None) -> dict для строк выборки stmt.
+    Служебные колонки (с префиксом "_") пропускаются, DateTime-колонки переводятся в isoformat,
+    parent (например, parent_values цели) дописывается в каждый dict.
+    """
+    names, indexes, dates = [], [], []
+    for index, column in enumerate(stmt.selected_columns):
+        if column.key.startswith("_"):
+            continue
+        names.append(column.key)
+        indexes.append(index)
+        if isinstance(column.type, db.DateTime):
+            dates.append(column.key)
+
+    names = tuple(names)
+    if len(indexes) == 1:
+        only = indexes[0]
+        pick = lambda row: (row[only],)  # noqa: E731 — itemgetter с одним индексом вернёт не кортеж
+    else:
+        pick = itemgetter(*indexes) if indexes else (lambda row: ())
+
+    def serialize(row, parent=None):
+        data = dict(zip(names, pick(row)))
+        for name in dates:
+            value = data[name]
+            if value is not None:
+                data[name] = value.isoformat()
+        if parent:
+            data.update(parent)
+        return data
+
+    return serialize
+
+
+def serialize_rows(stmt, rows, parent=None):
+    serialize = row_serializer(stmt)
+    return [serialize(row, parent) for row in rows]
+
+
+def dumps(body):
+    """
+    JSON-байты тела ответа.
+    """
+    if orjson is not None and FAST_JSON:
+        return orjson.dumps(body)
+    return current_app.json.dumps(body).encode("utf-8")
+
+
+def json_response(body, status=200):
+    return current_app.response_class(dumps(body), status=status, mimetype="application/json")
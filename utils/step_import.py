@@ -0,0 +1,290 @@
+"""
+Массовое добавление шагов к цели (импорт календаря).
+Сначала разбираются и проверяются все события, затем шаги вставляются кусками по
+IMPORT_CHUNK_SIZE многострочным INSERT ... RETURNING (один запрос на кусок вместо
+INSERT + flush на каждый шаг), а загрузка дней, счётчики цели и версия данных
+обновляются один раз на весь импорт.
+
+Потоковый импорт (.ics или NDJSON) читает тело построчно и держит в памяти не больше
+одного куска. У каждого события есть import_key — хэш UID из .ics или даты и описания;
+уникальный индекс (goal_id, import_key) и ON CONFLICT DO NOTHING пропускают события,
+уже импортированные в цель.
+"""
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime, timezone
+
+from dateutil.parser import isoparse
+
+from extensions import db
+from models.step_model import Step
+from utils.data_version import bump_data_version
+from utils.day_load import bump_day_loads, count_days, dialect_insert
+from utils.goal_counters import bump_step_counters
+
+IMPORT_CHUNK_SIZE = 1000
+IMPORT_STEP_TITLE = "Импорт IOS календарь"
+
+
+class StepImportError(ValueError):
+    """Некорректное тело импорта — отвечаем 400."""
+
+
+def parse_event_date(value):
+    """
+    Дата события из ISO-строки; нераспознанная дата — шаг без даты.
+    Дата со смещением ("…Z", "+03:00") приводится к наивному UTC, как "Z" в parse_ics_date:
+    Step.date хранится без часового пояса.
+    """
+    if not value:
+        return None
+    try:
+        parsed = isoparse(value)
+    except (ValueError, TypeError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_import_events(events):
+    """
+    Список {"description", "date"} из событий запроса. События без описания пропускаются.
+    """
+    if not isinstance(events, list) or not events:
+        raise StepImportError("No steps data provided")
+    parsed = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise StepImportError(f"Step #{index} must be an object")
+        description = event.get('description')
+        if not isinstance(description, str) or not description.strip():
+            continue
+        parsed.append({"description": description.strip(), "date": parse_event_date(event.get('date'))})
+    return parsed
+
+
+def insert_steps(goal_id, events, title=IMPORT_STEP_TITLE):
+    """
+    Вставляет шаги кусками и возвращает [(id, событие)] в порядке events.
+    Счётчики и загрузку дней не трогает (см. import_steps).
+    """
+    # Postgres не обещает, что RETURNING вернёт id в порядке VALUES (а SERIAL при параллельных
+    # вставках может выдать их не по порядку), поэтому там просим SQLAlchemy сопоставить строки
+    # с параметрами. На SQLite sort_by_parameter_order откатывается к INSERT на каждую строку,
+    # но id одного INSERT выдаются по порядку VALUES — там достаточно отсортировать их.
+    ordered = db.session.get_bind().dialect.name == 'postgresql'
+    stmt = db.insert(Step).returning(Step.id, sort_by_parameter_order=ordered)
+    created = []
+    for start in range(0, len(events), IMPORT_CHUNK_SIZE):
+        chunk = events[start:start + IMPORT_CHUNK_SIZE]
+        rows = [
+            {"goal_id": goal_id, "title": title, "description": event["description"], "date": event["date"]}
+            for event in chunk
+        ]
+        ids = db.session.scalars(stmt, rows).all()
+        if not ordered:
+            ids.sort()
+        created.extend(zip(ids, chunk))
+    return created
+
+
+def import_steps(user_id, goal_id, events, title=IMPORT_STEP_TITLE):
+    """
+    Вставляет разобранные события шагами цели и один раз обновляет загрузку дней,
+    счётчики цели и версию данных. Коммит — на вызывающем.
+    """
+    created = insert_steps(goal_id, events, title)
+    bump_day_loads(user_id, count_days(event["date"] for _, event in created))
+    bump_step_counters(goal_id, total=len(created))
+    bump_data_version(user_id)
+    return created
+
+
+def import_key(description, date, uid=None):
+    """
+    Ключ события для дедупликации: UID календаря, если он есть, иначе дата + описание.
+    """
+    source = f"uid:{uid}" if uid else f"{date.isoformat() if date else ''}|{description}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _make_event(description, date, uid=None):
+    """
+    Событие для import_event_stream или None, если у него нет описания.
+    """
+    if not isinstance(description, str) or not description.strip():
+        return None
+    description = description.strip()
+    return {"description": description, "date": date, "import_key": import_key(description, date, uid)}
+
+
+def _decode_lines(lines):
+    for number, line in enumerate(lines, 1):
+        try:
+            yield number, line.decode("utf-8").rstrip("\r\n")
+        except UnicodeDecodeError:
+            raise StepImportError(f"Line {number}: body must be UTF-8")
+
+
+def iter_ndjson_events(lines):
+    """
+    События из NDJSON: по объекту {"description", "date", "uid"?} на строку.
+    Строка с битым JSON или не объектом — None (считается в invalid), импорт идёт дальше;
+    400 только для тела не в UTF-8.
+    """
+    for _, line in _decode_lines(lines):
+        if not line.strip():
+            continue
+        try:
+            event = json.loads(line)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            yield None
+            continue
+        uid = event.get('uid')
+        yield _make_event(event.get('description'), parse_event_date(event.get('date')), str(uid) if uid else None)
+
+
+def _unfold_ics(lines):
+    """
+    Логические строки .ics: строка, начинающаяся с пробела или табуляции, продолжает предыдущую.
+    """
+    pending = None
+    for _, line in _decode_lines(lines):
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending:
+        yield pending
+
+
+def _split_ics_property(line):
+    """
+    "DTSTART;TZID=Europe/Moscow:20250322T100000" -> ("DTSTART", "20250322T100000").
+    Двоеточие внутри параметров в кавычках не считается разделителем.
+    """
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char == ':' and not quoted:
+            return line[:index].split(';', 1)[0].upper(), line[index + 1:]
+    return line.upper(), ""
+
+
+def _unescape_ics_text(value):
+    result, chars = [], iter(value)
+    for char in chars:
+        if char == "\\":
+            char = next(chars, "")
+            char = "\n" if char in ("n", "N") else char
+        result.append(char)
+    return "".join(result)
+
+
+def parse_ics_date(value):
+    """
+    DTSTART: "20250322" (весь день), "20250322T100000" (местное время, TZID не учитывается)
+    или "20250322T100000Z" (UTC). Нераспознанная дата — шаг без даты.
+    """
+    value = (value or "").strip()
+    try:
+        if len(value) == 8:
+            return datetime.strptime(value, "%Y%m%d")
+        return datetime.strptime(value.rstrip("Zz"), "%Y%m%dT%H%M%S")
+    except ValueError:
+        return None
+
+
+def iter_ics_events(lines):
+    """
+    События VEVENT из .ics: SUMMARY -> описание шага, DTSTART -> дата, UID -> ключ дедупликации.
+    Свойства вложенных компонентов (VALARM и т.п.) игнорируются.
+    """
+    event, nested = None, 0
+    for line in _unfold_ics(lines):
+        name, value = _split_ics_property(line)
+        if name == "BEGIN":
+            if value.upper() == "VEVENT" and event is None:
+                event = {}
+            elif event is not None:
+                nested += 1
+        elif name == "END" and event is not None:
+            if nested:
+                nested -= 1
+            elif value.upper() == "VEVENT":
+                yield _make_event(
+                    _unescape_ics_text(event.get("SUMMARY", "")),
+                    parse_ics_date(event.get("DTSTART")),
+                    event.get("UID")
+                )
+                event = None
+        elif event is not None and not nested and name in ("SUMMARY", "DTSTART", "UID"):
+            event.setdefault(name, value)
+
+
+# Content-Type тела потокового импорта -> разбор построчно
+IMPORT_PARSERS = {
+    "text/calendar": iter_ics_events,
+    "application/x-ndjson": iter_ndjson_events,
+    "application/ndjson": iter_ndjson_events,
+}
+
+
+def _insert_new_steps(goal_id, events, title):
+    """
+    Вставляет кусок событий, пропуская уже импортированные. Возвращает даты вставленных шагов.
+    """
+    stmt = dialect_insert(Step.__table__)
+    stmt = stmt.on_conflict_do_nothing(index_elements=[Step.goal_id, Step.import_key]).returning(Step.date)
+    rows = [
+        {
+            "goal_id": goal_id,
+            "title": title,
+            "description": event["description"],
+            "date": event["date"],
+            "import_key": event["import_key"]
+        }
+        for event in events
+    ]
+    return db.session.scalars(stmt, rows).all()
+
+
+def import_event_stream(user_id, goal_id, events, title=IMPORT_STEP_TITLE):
+    """
+    Потоковый импорт: events — итератор событий (None — событие без описания или некорректная строка).
+    Загрузка дней, счётчики цели и версия данных обновляются один раз в конце. Коммит — на вызывающем.
+    Возвращает {"inserted", "skipped" (уже были в цели), "invalid" (без описания или некорректные)}.
+    """
+    counts = Counter(inserted=0, skipped=0, invalid=0)
+    days = Counter()
+    chunk = []
+
+    def flush():
+        dates = _insert_new_steps(goal_id, chunk, title)
+        counts["inserted"] += len(dates)
+        counts["skipped"] += len(chunk) - len(dates)
+        days.update(count_days(dates))
+        chunk.clear()
+
+    for event in events:
+        if event is None:
+            counts["invalid"] += 1
+            continue
+        chunk.append(event)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+    if counts["inserted"]:
+        bump_day_loads(user_id, days)
+        bump_step_counters(goal_id, total=counts["inserted"])
+        bump_data_version(user_id)
+    return dict(counts)